@@ -15,6 +15,8 @@ setup(
     test_suite    = 'nose.collector',
     scripts       = [
         'bin/svjgenprod-batch',
-        'bin/svjgenprod-setupfwlite'
+        'bin/svjgenprod-setupfwlite',
+        'bin/svjgenprod-merge',
+        'bin/svjgenprod-benchmark-compression',
         ],
     )
@@ -17,6 +17,10 @@ SVJ_TOP_DIR = osp.abspath(osp.dirname(__file__))
 # Default seed used for lhe generation and fullsim train
 SVJ_SEED = 1001
 
+# Seeds for the cmsRun shards of this job, allocated at submission
+# (svjgenprod-batch --nshards); None if not given
+SVJ_SHARD_SEEDS = None
+
 # Input files directory for this package
 SVJ_INPUT_DIR = osp.join(SVJ_TOP_DIR, 'input')
 
@@ -30,6 +34,12 @@ RUN_GRIDPACK_DIR = '/tmp/svj/rungridpack'
 RUN_FULLSIM_DIR = '/tmp/svj/runfullsim'
 SVJ_OUTPUT_DIR = '/tmp/svj/output'
 
+# sqlite database with the MadGraph cross sections of built gridpacks
+SVJ_XSEC_DB = '/tmp/svj/xsecs.sqlite'
+
+# sqlite ledger of all seeds handed out by svjgenprod.seeds
+SVJ_SEED_LEDGER = '/tmp/svj/seeds.sqlite'
+
 # Assume running locally by default
 # This variable will be set to True if using the svjgenprod-batch script
 BATCH_MODE = False
@@ -39,24 +49,33 @@ BATCH_MODE = False
 SVJ_TARBALL = None
 
 # Overwrite global vars based on environment variables
-import environment
+from . import environment
 environment.read_environment()
 
 
 #____________________________________________________________________
 # Package imports
 
-import utils
-from .config import Config
-from semanager import SEManager
+from . import utils
+from . import compression
+from .config import Config, SampleSpec
+from .semanager import SEManager
+from . import ufomodel
 from .gridpackgenerator import GridpackGenerator
+from . import lhetools
+from . import catalog
+from . import xsecdb
+from . import seeds
+from . import pileup
+from . import merging
 from .lhemaker import LHEMaker
-import calc_dark_params as cdp
+from . import calc_dark_params as cdp
 
 from .gensimfragment import GenSimFragment
 from .fullsimbase import FullSimRunnerBase
-import fullsimrunners
+from . import fullsimrunners
+from . import scheduler
 
-import condor.jdlfile
-import condor.shfile
+from . import condor
+from .condor import jdlfile, shfile
 
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, time, zlib, glob, uuid
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        logger.error(
+            'numpy is not installed; install it with \'pip install numpy\' '
+            'to use the sample catalog.'
+            )
+        raise ImportError('No module named numpy')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow, pyarrow.parquet
+    except ImportError:
+        logger.error(
+            'pyarrow is not installed; install it with \'pip install pyarrow\' '
+            'or use a .npz catalog file.'
+            )
+        raise
+    return pyarrow
+
+
+# One row per artifact (gridpack, lhe file, root file of a stage, ...).
+# Rows with stage 'point' only register a physics point of the scan.
+# alpha_d is stored as a string, as it may be 'peak', 'low' or 'high'.
+# A missing n_f (e.g. for gridpacks and LHE files) is stored as -1.
+CATALOG_COLUMNS = [
+    ('point_key',    'U40'),
+    ('process_type', 'U10'),
+    ('year',         'i4'),
+    ('m_med',        'i4'),
+    ('m_d',          'i4'),
+    ('n_f',          'i4'),
+    ('r_inv',        'f8'),
+    ('alpha_d',      'U16'),
+    ('stage',        'U16'),
+    ('path',         'U512'),
+    ('checksum',     'U8'),
+    ('size',         'i8'),
+    ('n_events',     'i8'),
+    ('seed',         'i8'),
+    ('xsec',         'f8'),
+    ('xsec_error',   'f8'),
+    ('wall_time',    'f8'),
+    ('timestamp',    'f8'),
+    ]
+
+POINT_COLUMNS = [ 'process_type', 'year', 'm_med', 'm_d', 'n_f', 'r_inv', 'alpha_d' ]
+
+
+def get_default_catalog_file():
+    return osp.join(svjgenprod.SVJ_OUTPUT_DIR, 'catalog.npz')
+
+
+def file_checksum(path, blocksize=1024*1024):
+    """
+    adler32 checksum of a file as 8 hex characters (the checksum type the
+    CMS data management and xrootd tools report)
+    """
+    checksum = 1
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block: break
+            checksum = zlib.adler32(block, checksum)
+    return '{0:08x}'.format(checksum & 0xffffffff)
+
+
+def empty_table(n=0):
+    _require_numpy()
+    table = np.zeros(n, dtype=CATALOG_COLUMNS)
+    for column in [ 'n_f', 'size', 'n_events', 'seed' ]:
+        table[column] = -1
+    for column in [ 'xsec', 'xsec_error', 'wall_time' ]:
+        table[column] = np.nan
+    return table
+
+
+def make_row(
+        spec, stage, path='',
+        local_file=None,
+        n_events=-1, seed=-1,
+        xsec=None, xsec_error=None,
+        wall_time=None,
+        ):
+    """
+    Returns a catalog row (structured array of length 1) for an artifact.
+    Size and checksum are computed from local_file, which defaults to path
+    if that is an existing local file (not for e.g. /store/... paths).
+    """
+    row = empty_table(1)
+    row['point_key'] = spec.digest()
+    for column in POINT_COLUMNS:
+        value = getattr(spec, column)
+        if not(value is None): row[column] = value
+    row['stage'] = stage
+    row['path'] = path
+    row['n_events'] = n_events
+    row['seed'] = seed
+    if not(xsec is None): row['xsec'] = xsec
+    if not(xsec_error is None): row['xsec_error'] = xsec_error
+    if not(wall_time is None): row['wall_time'] = wall_time
+    row['timestamp'] = time.time()
+    if local_file is None and path and osp.isfile(path):
+        local_file = path
+    if not(local_file is None):
+        row['size'] = os.stat(local_file).st_size
+        row['checksum'] = file_checksum(local_file)
+    return row
+
+
+# New rows are written as small fragments next to the catalog, without
+# reading or locking the catalog itself; read_catalog merges them and
+# compact_catalog folds them into the catalog file.
+
+def get_fragment_dir(catalog_file):
+    return catalog_file + '.d'
+
+
+def list_fragments(catalog_file):
+    """
+    Returns the fragment files of a catalog, oldest first
+    """
+    return sorted(glob.glob(osp.join(get_fragment_dir(catalog_file), '*.npz')))
+
+
+def _narrow(table):
+    """
+    Shrinks the string columns to their longest value before writing, so e.g.
+    short paths do not take the full 512 characters on disk
+    """
+    dtype = []
+    for name, column_type in CATALOG_COLUMNS:
+        if column_type.startswith('U'):
+            width = int(np.char.str_len(table[name]).max()) if table.size else 0
+            column_type = 'U{0}'.format(max(1, width))
+        dtype.append((name, column_type))
+    return table.astype(dtype)
+
+
+def _deduplicate(table):
+    """
+    Keeps only the last row per stage and path; rows with an empty path
+    (points) are kept per stage and point_key
+    """
+    if not table.size: return table
+    keys = np.char.add(np.char.add(table['stage'], '|'), np.where(table['path'] == '', table['point_key'], table['path']))
+    _, last_reversed = np.unique(keys[::-1], return_index=True)
+    return table[np.sort(table.size - 1 - last_reversed)]
+
+
+def _read_file(catalog_file):
+    if catalog_file.endswith('.parquet'):
+        pyarrow = _require_pyarrow()
+        parquet_table = pyarrow.parquet.read_table(catalog_file)
+        table = empty_table(parquet_table.num_rows)
+        for column in parquet_table.column_names:
+            table[column] = parquet_table.column(column).to_pylist()
+        return table
+    with np.load(catalog_file) as npz:
+        return npz['catalog'].astype(empty_table().dtype)
+
+
+def _read_catalog_and_fragments(catalog_file, fragments):
+    tables = [ _read_file(catalog_file) if osp.isfile(catalog_file) else empty_table() ]
+    tables.extend(_read_file(fragment) for fragment in fragments)
+    return _deduplicate(np.concatenate(tables))
+
+
+def read_catalog(catalog_file=None):
+    """
+    Reads the catalog table, including the rows that are not yet compacted;
+    returns an empty table if there is nothing
+    """
+    _require_numpy()
+    if catalog_file is None: catalog_file = get_default_catalog_file()
+    # Locked so compact_catalog cannot remove fragments halfway
+    with svjgenprod.utils.file_lock(catalog_file + '.lock'):
+        return _read_catalog_and_fragments(catalog_file, list_fragments(catalog_file))
+
+
+def write_catalog(table, catalog_file=None):
+    """
+    Writes the catalog to a temporary file and renames it, so readers never
+    see a partially written catalog
+    """
+    _require_numpy()
+    if catalog_file is None: catalog_file = get_default_catalog_file()
+    svjgenprod.utils.create_directory(osp.dirname(osp.abspath(catalog_file)))
+    tmp_file = '{0}.tmp{1}'.format(catalog_file, os.getpid())
+    if catalog_file.endswith('.parquet'):
+        pyarrow = _require_pyarrow()
+        parquet_table = pyarrow.table({ name : table[name] for name in table.dtype.names })
+        pyarrow.parquet.write_table(parquet_table, tmp_file)
+    else:
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, catalog=_narrow(table))
+    os.rename(tmp_file, catalog_file)
+
+
+def update_catalog(rows, catalog_file=None):
+    """
+    Adds rows to the catalog; existing rows with the same stage and path are
+    replaced. The rows go into a new fragment file, so concurrent jobs never
+    wait for each other and the cost does not grow with the catalog.
+    Returns the rows.
+    """
+    if catalog_file is None: catalog_file = get_default_catalog_file()
+    if isinstance(rows, (list, tuple)): rows = np.concatenate(rows)
+    fragment_dir = get_fragment_dir(catalog_file)
+    svjgenprod.utils.create_directory(fragment_dir)
+    # Named after the time, so list_fragments returns them in order
+    fragment = osp.join(fragment_dir, '{0:017.6f}_{1}.npz'.format(time.time(), uuid.uuid4().hex))
+    tmp_file = fragment[:-len('.npz')] + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, catalog=_narrow(rows))
+    os.rename(tmp_file, fragment)
+    logger.info('Recorded {0} row(s) in catalog {1}'.format(rows.size, catalog_file))
+    return rows
+
+
+def compact_catalog(catalog_file=None):
+    """
+    Folds the fragments into the catalog file and removes them; run it now
+    and then, e.g. after a batch of jobs finished. Returns the table.
+    """
+    _require_numpy()
+    if catalog_file is None: catalog_file = get_default_catalog_file()
+    with svjgenprod.utils.file_lock(catalog_file + '.lock'):
+        fragments = list_fragments(catalog_file)
+        table = _read_catalog_and_fragments(catalog_file, fragments)
+        if fragments:
+            write_catalog(table, catalog_file)
+            for fragment in fragments: os.remove(fragment)
+    logger.info('Compacted {0} fragments into catalog {1}'.format(len(fragments), catalog_file))
+    return table
+
+
+def add_points(specs, catalog_file=None):
+    """
+    Registers the physics points of a scan, so missing() can report points
+    for which nothing was produced yet
+    """
+    return update_catalog([ make_row(spec, 'point') for spec in specs ], catalog_file)
+
+
+def record_artifact(spec, stage, path, catalog_file=None, **kwargs):
+    """
+    Records one produced file; kwargs are passed to make_row
+    """
+    return update_catalog(make_row(spec, stage, path, **kwargs), catalog_file)
+
+
+def _as_stored(table, column, values):
+    """
+    Converts query values the same way make_row stores them, e.g. alpha_d=0.2
+    or '0.20' to the stored string '0.2'
+    """
+    if column in POINT_COLUMNS:
+        values = [ svjgenprod.config.canonical_field_value(column, v) for v in values ]
+        values = [ -1 if v is None else v for v in values ]
+    stored = np.zeros(len(values), dtype=table.dtype[column])
+    stored[:] = values
+    return stored
+
+
+def select(table, **criteria):
+    """
+    Returns a boolean mask for the rows matching all criteria. A criterion is
+    either a value or a list/tuple of allowed values, e.g.
+    `select(table, year=2018, m_med=[1000, 2000], stage='AOD_step2')`
+    """
+    mask = np.ones(table.size, dtype=bool)
+    for column, value in criteria.items():
+        if isinstance(value, (list, tuple, set, np.ndarray)):
+            mask &= np.in1d(table[column], _as_stored(table, column, list(value)))
+        else:
+            mask &= (table[column] == _as_stored(table, column, [value])[0])
+    return mask
+
+
+def points(table, **criteria):
+    """
+    Returns one row per physics point among the rows matching the criteria
+    """
+    selected = table[select(table, **criteria)]
+    _, first = np.unique(selected['point_key'], return_index=True)
+    return selected[np.sort(first)]
+
+
+def missing(table, stage, **criteria):
+    """
+    Returns one row per physics point (matching the criteria) that has no
+    artifact of the given stage, e.g. `missing(table, 'AOD_step2', year=2018)`
+    """
+    candidates = points(table, **criteria)
+    done = table['point_key'][table['stage'] == stage]
+    return candidates[~np.in1d(candidates['point_key'], done)]
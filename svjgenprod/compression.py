@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, time, gzip, subprocess, shutil
+try:
+    from shutil import which as find_executable
+except ImportError:
+    # Python 2
+    from distutils.spawn import find_executable
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+
+# Known tarball extensions and the compression program that goes with them
+TARBALL_COMPRESSIONS = {
+    '.tar.xz'  : 'xz',
+    '.tar.zst' : 'zstd',
+    }
+
+
+def get_tarball_extension(tarball):
+    """
+    Returns the compressed-tarball extension of `tarball`, or raises if unknown
+    """
+    for ext in TARBALL_COMPRESSIONS:
+        if tarball.endswith(ext):
+            return ext
+    raise ValueError(
+        'Unexpected file extension for tarball {0}; known extensions: {1}'
+        .format(tarball, ', '.join(sorted(TARBALL_COMPRESSIONS)))
+        )
+
+
+def get_tarball_compression(tarball):
+    return TARBALL_COMPRESSIONS[get_tarball_extension(tarball)]
+
+
+def strip_tarball_extension(tarball):
+    return tarball[:-len(get_tarball_extension(tarball))]
+
+
+def check_program(program):
+    if find_executable(program) is None:
+        raise OSError(
+            'Program \'{0}\' is not available; cannot (de)compress {0} files'
+            .format(program)
+            )
+
+
+def compress_cmd(compression, threads=0, level=None):
+    """
+    Returns the command (as a string) that compresses stdin to stdout.
+    threads=0 lets the program use all available cores.
+    """
+    check_program(compression)
+    cmd = [ compression, '-c', '-T{0}'.format(threads) ]
+    if not(level is None):
+        if compression == 'zstd' and level > 19: cmd.append('--ultra')
+        cmd.append('-{0}'.format(level))
+    return ' '.join(cmd)
+
+
+def decompress_cmd(compression, threads=0):
+    """
+    Returns the command (as a string) that decompresses stdin to stdout
+    """
+    check_program(compression)
+    return '{0} -d -c -T{1}'.format(compression, threads)
+
+
+def get_index_file(tarball):
+    return tarball + '.index'
+
+
+def read_tarball_index(tarball):
+    """
+    Returns the list of members of a tarball from its .index sidecar,
+    or None if there is no sidecar
+    """
+    index_file = get_index_file(tarball)
+    if not osp.isfile(index_file):
+        return None
+    with open(index_file, 'r') as f:
+        return [ line.rstrip('\n') for line in f if line.strip() ]
+
+
+def extract_tarball(tarball, dst, threads=0, dry=False):
+    """
+    Extracts a .tar.xz or .tar.zst tarball into dst, decompressing with
+    multiple threads (tar itself would decompress single-threaded)
+    """
+    compression = get_tarball_compression(tarball)
+    logger.warning('Extracting {0} tarball {1} into {2}'.format(compression, tarball, dst))
+    cmds = [
+        'set -o pipefail',
+        '{0} < {1} | tar xf - --directory {2}'.format(
+            decompress_cmd(compression, threads), tarball, dst
+            ),
+        ]
+    svjgenprod.utils.run_multiple_commands(cmds, dry=dry)
+
+
+def repack_tarball(
+        tarball,
+        compression='zstd',
+        threads=0,
+        level=None,
+        dst=None,
+        remove_original=False,
+        write_index=True,
+        dry=False,
+        ):
+    """
+    Recompresses a tarball (typically a single-threaded .tar.xz produced by
+    genproductions) with a multi-threaded compressor.
+    The tarball is decompressed once to a plain .tar, which is used both to
+    write the .index sidecar (list of members) and as input for the compressor.
+    Returns the path to the repacked tarball.
+    """
+    src_ext = get_tarball_extension(tarball)
+    dst_ext = [ ext for ext, c in TARBALL_COMPRESSIONS.items() if c == compression ]
+    if not dst_ext:
+        raise ValueError('Unknown compression {0}'.format(compression))
+    dst_ext = dst_ext[0]
+    if dst is None:
+        dst = tarball[:-len(src_ext)] + dst_ext
+    dst = osp.abspath(dst)
+    plain_tar = dst[:-len(dst_ext)] + '.tar.repack'
+    tmp_dst = dst + '.repack'
+
+    logger.warning(
+        'Repacking {0} ==> {1} ({2}, threads={3}, level={4})'
+        .format(tarball, dst, compression, threads, level)
+        )
+    cmds = [
+        'set -o pipefail',
+        '{0} < {1} > {2}'.format(decompress_cmd(get_tarball_compression(tarball), threads), tarball, plain_tar),
+        ]
+    if write_index:
+        cmds.append('tar tf {0} > {1}'.format(plain_tar, get_index_file(dst)))
+    cmds.extend([
+        '{0} < {1} > {2}'.format(compress_cmd(compression, threads, level), plain_tar, tmp_dst),
+        'rm {0}'.format(plain_tar),
+        # Only now overwrite dst, which may be the same file as the source
+        'mv {0} {1}'.format(tmp_dst, dst),
+        ])
+    try:
+        svjgenprod.utils.run_multiple_commands(cmds, dry=dry)
+    except Exception:
+        for leftover in [ plain_tar, tmp_dst ]:
+            if osp.isfile(leftover): svjgenprod.utils.remove_file(leftover)
+        raise
+
+    if remove_original and not dry and osp.abspath(tarball) != dst:
+        svjgenprod.utils.remove_file(tarball)
+    return dst
+
+
+def benchmark_tarball_compression(
+        tarball,
+        compressions=('xz', 'zstd'),
+        threads=0,
+        workdir=None,
+        cleanup=True,
+        ):
+    """
+    Repacks `tarball` in every requested compression and times the repacking
+    and the extraction. Returns a list of dicts with keys compression, size
+    (bytes), compress_time and decompress_time (seconds), and logs a table.
+    """
+    if workdir is None:
+        workdir = osp.join(svjgenprod.RUN_GRIDPACK_DIR, 'benchmark_compression')
+    svjgenprod.utils.create_directory(workdir, force=True)
+    basename = osp.basename(strip_tarball_extension(tarball))
+
+    results = []
+    for compression in compressions:
+        dst_ext = [ ext for ext, c in TARBALL_COMPRESSIONS.items() if c == compression ][0]
+        repacked = osp.join(workdir, basename + dst_ext)
+        t0 = time.time()
+        repack_tarball(tarball, compression, threads=threads, dst=repacked, write_index=False)
+        compress_time = time.time() - t0
+
+        extract_dir = osp.join(workdir, basename + '_' + compression)
+        svjgenprod.utils.create_directory(extract_dir, force=True)
+        t0 = time.time()
+        extract_tarball(repacked, extract_dir, threads=threads)
+        decompress_time = time.time() - t0
+
+        results.append(dict(
+            compression = compression,
+            size = os.stat(repacked).st_size,
+            compress_time = compress_time,
+            decompress_time = decompress_time,
+            ))
+        if cleanup:
+            svjgenprod.utils.remove_dir(extract_dir)
+            svjgenprod.utils.remove_file(repacked)
+
+    table = [ '{0:<8} {1:>14} {2:>14} {3:>16}'.format('format', 'size (MB)', 'compress (s)', 'decompress (s)') ]
+    for r in results:
+        table.append(
+            '{compression:<8} {size_mb:>14.2f} {compress_time:>14.2f} {decompress_time:>16.2f}'
+            .format(size_mb = r['size'] / 1024.**2, **r)
+            )
+    logger.info('Compression benchmark for {0}:\n{1}'.format(tarball, '\n'.join(table)))
+    return results
+
+
+#____________________________________________________________________
+# Transparent reading and writing of (compressed) files such as .lhe(.gz/.zst)
+
+FILE_COMPRESSIONS = {
+    '.gz'  : 'gzip',
+    '.zst' : 'zstd',
+    }
+
+
+def get_file_compression(filename):
+    """
+    Returns 'gzip' or 'zstd' based on the extension, or None for uncompressed files
+    """
+    for ext, compression in FILE_COMPRESSIONS.items():
+        if filename.endswith(ext):
+            return compression
+    return None
+
+
+def get_compression_extension(compression):
+    for ext, c in FILE_COMPRESSIONS.items():
+        if c == compression: return ext
+    raise ValueError('Unknown compression {0}'.format(compression))
+
+
+def strip_compression_extension(filename):
+    compression = get_file_compression(filename)
+    if compression is None: return filename
+    return filename[:-len(get_compression_extension(compression))]
+
+
+class PipeFile(object):
+    """
+    File-like object that reads from or writes to a file through a
+    (de)compression program running in a subprocess, e.g. `zstd -d -c`.
+    Only sequential access is supported; seek only moves forward.
+    """
+    def __init__(self, cmd, filename, mode='rb'):
+        super(PipeFile, self).__init__()
+        if not mode in ['rb', 'wb']:
+            raise ValueError('Only modes \'rb\' and \'wb\' are supported, not {0}'.format(mode))
+        self.filename = filename
+        self.mode = mode
+        self.cmd = cmd
+        self._pos = 0
+        self._eof = False
+        if mode == 'rb':
+            self._fileobj = open(filename, 'rb')
+            self._proc = subprocess.Popen(cmd, stdin=self._fileobj, stdout=subprocess.PIPE)
+            self._stream = self._proc.stdout
+        else:
+            self._fileobj = open(filename, 'wb')
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=self._fileobj)
+            self._stream = self._proc.stdin
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def read(self, size=-1):
+        data = self._stream.read() if size < 0 else self._stream.read(size)
+        if size < 0 or len(data) < size: self._eof = True
+        self._pos += len(data)
+        return data
+
+    def readline(self):
+        line = self._stream.readline()
+        if not line: self._eof = True
+        self._pos += len(line)
+        return line
+
+    def write(self, data):
+        self._stream.write(data)
+        self._pos += len(data)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence != 0 or offset < self._pos:
+            raise IOError('{0} only supports seeking forward'.format(self.__class__.__name__))
+        while self._pos < offset:
+            if not self.read(min(1024*1024, offset - self._pos)):
+                raise IOError('Cannot seek to {0} in {1}; file is too short'.format(offset, self.filename))
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self._stream.close()
+        returncode = self._proc.wait()
+        self._fileobj.close()
+        # A reader that stops before the end of the file makes the decompressor exit on SIGPIPE
+        if returncode != 0 and not (self.mode == 'rb' and not self._eof):
+            raise subprocess.CalledProcessError(returncode, ' '.join(self.cmd))
+
+
+def open_file(filename, mode='rb', threads=0, level=None):
+    """
+    Opens a plain, .gz or .zst file in binary mode ('rb' or 'wb'), (de)compressing
+    transparently. gzip uses pigz when available, zstd needs the zstd program;
+    both use `threads` threads (0 means all cores) where the program supports it.
+    """
+    compression = get_file_compression(filename)
+    if compression is None:
+        return open(filename, mode)
+    elif compression == 'zstd':
+        if mode == 'rb':
+            return PipeFile(decompress_cmd('zstd', threads).split(), filename, mode)
+        return PipeFile(compress_cmd('zstd', threads, level).split(), filename, mode)
+    elif compression == 'gzip':
+        if find_executable('pigz') is None:
+            if mode == 'rb': return gzip.open(filename, mode)
+            return gzip.open(filename, mode, 6 if level is None else level)
+        threads_option = [] if threads == 0 else [ '-p', str(threads) ]
+        if mode == 'rb':
+            return PipeFile([ 'pigz', '-d', '-c' ] + threads_option, filename, mode)
+        return PipeFile(
+            [ 'pigz', '-c' ] + threads_option + ([] if level is None else [ '-{0}'.format(level) ]),
+            filename, mode
+            )
+
+
+def decompress_file(src, dst=None, threads=0):
+    """
+    Decompresses a .gz or .zst file to dst (default: src without the extension)
+    """
+    if dst is None: dst = strip_compression_extension(src)
+    logger.info('Decompressing {0} ==> {1}'.format(src, dst))
+    with open_file(src, 'rb', threads=threads) as f_in, open(dst, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out, 1024*1024)
+    return dst
@@ -40,7 +40,7 @@ class JDLBase(object):
     def parse(self):
         self.subparse()
         jdl = []
-        for key, value in self.options.iteritems():
+        for key, value in self.options.items():
             if key == 'environment':
                 jdl.append('environment = "{0}"'.format(self.parse_environment()))
             else:
@@ -52,7 +52,7 @@ class JDLBase(object):
 
 
     def parse_environment(self):
-        env_str = [ '{0}=\'{1}\''.format(key, value) for key, value in self.environment.iteritems() ]
+        env_str = [ '{0}=\'{1}\''.format(key, value) for key, value in self.environment.items() ]
         return ' '.join(env_str)
 
 
@@ -75,6 +75,12 @@ class JDLStandard(JDLBase):
         self.python_file = osp.abspath(python_file)
         self.n_jobs = n_jobs
         self.n_events_per_job = n_events_per_job
+        # Explicit seed per job (e.g. from svjgenprod.seeds.allocate_seeds);
+        # None uses starting_seed + i
+        self.seeds = None
+        # Per job a list of seeds for its cmsRun shards (see svjgenprod-batch
+        # --nshards), passed as the second argument; None passes none
+        self.shard_seeds = None
         self.environment['SVJ_NEVENTS'] = n_events_per_job
         self.environment['SVJ_BATCH_MODE'] = 'lpc'
 
@@ -102,8 +108,22 @@ class JDLStandard(JDLBase):
         self.options['log']    = '{0}_$(Cluster)_$(Process).log'.format(python_basename)
 
         # Queue one job per seed
-        seeds = [ str(self.starting_seed + i) for i in range(self.n_jobs) ]
-        self.queue = 'queue 1 arguments in {0}'.format(', '.join(seeds))
+        if self.seeds is None:
+            seeds = [ str(self.starting_seed + i) for i in range(self.n_jobs) ]
+        else:
+            if len(self.seeds) != self.n_jobs:
+                raise ValueError('Got {0} seeds for {1} jobs'.format(len(self.seeds), self.n_jobs))
+            seeds = [ str(seed) for seed in self.seeds ]
+        if self.shard_seeds is None:
+            self.queue = 'queue 1 arguments in {0}'.format(', '.join(seeds))
+            return
+        if len(self.shard_seeds) != self.n_jobs:
+            raise ValueError('Got shard seeds for {0} jobs instead of {1}'.format(len(self.shard_seeds), self.n_jobs))
+        # One line of arguments per job: the job seed and the comma-separated shard seeds
+        self.queue = 'queue arguments from (\n{0}\n)'.format('\n'.join(
+            '{0} {1}'.format(seed, ','.join(str(s) for s in shard_seeds))
+            for seed, shard_seeds in zip(seeds, self.shard_seeds)
+            ))
 
 
     def parse_infiles(self):
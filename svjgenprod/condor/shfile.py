@@ -95,6 +95,8 @@ class SHStandard(SHBase):
         echo('pwd:      $(pwd)')
         sh.append('export SVJ_SEED=$1')
         echo('seed:     ${SVJ_SEED}')
+        sh.append('if [ -n "$2" ]; then export SVJ_SHARD_SEEDS=$2; fi')
+        echo('shard seeds: ${SVJ_SHARD_SEEDS}')
 
         sh.extend(self.clone())
 
@@ -2,10 +2,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
-import logging, pprint
-from ConfigParser import ConfigParser
+import os.path as osp
+import logging, pprint, os, itertools, numbers, hashlib
+try:
+    from ConfigParser import ConfigParser
+except ImportError:
+    # Python 3
+    from configparser import ConfigParser
 logger = logging.getLogger('root')
 
+try:
+    from itertools import izip as _zip
+except ImportError:
+    # Python 3
+    _zip = zip
+
+# Parsed config files, keyed by (class, absolute path, mtime, section)
+_LOAD_CACHE = {}
+
 
 class Config(dict):
     """docstring for Config"""
@@ -25,12 +39,13 @@ class Config(dict):
         configp.read(config_file)
         config = dict(configp.items(section))
         # Unfortunately ConfigParser does not do typing
-        config['year']         = configp[section].getint('year')
-        config['alpha_d']      = configp[section].getfloat('alpha_d')
-        config['m_med']        = configp[section].getint('m_med')
-        config['m_d']          = configp[section].getint('m_d')
-        config['n_f']          = configp[section].getint('n_f')
-        config['r_inv']        = configp[section].getfloat('r_inv')
+        # (section proxies like configp[section] only exist in Python 3)
+        config['year']         = configp.getint(section, 'year')
+        config['alpha_d']      = configp.getfloat(section, 'alpha_d')
+        config['m_med']        = configp.getint(section, 'm_med')
+        config['m_d']          = configp.getint(section, 'm_d')
+        config['n_f']          = configp.getint(section, 'n_f')
+        config['r_inv']        = configp.getfloat(section, 'r_inv')
         return cls(**config)
 
     @classmethod
@@ -50,6 +65,77 @@ class Config(dict):
         inst.yaml_file = yaml_file
         return inst
 
+    @classmethod
+    def load(cls, config_file, section='default'):
+        """
+        Initializes from a .yaml or config file. The parsed file is memoized on
+        its path and modification time, so repeated loads of the same file
+        (e.g. by every runner in a job) parse it only once.
+        Returns a copy, so callers can modify it freely.
+        """
+        path = osp.abspath(config_file)
+        key = (cls, path, os.stat(path).st_mtime, section)
+        cached = _LOAD_CACHE.get(key)
+        if cached is None:
+            # Drop entries of older versions of the file
+            for stale_key in [ k for k in _LOAD_CACHE if k[1] == path ]:
+                del _LOAD_CACHE[stale_key]
+            if path.endswith('.yaml'):
+                cached = cls.from_yaml(config_file)
+            else:
+                cached = cls.from_file(config_file, section)
+            _LOAD_CACHE[key] = cached
+        else:
+            logger.debug('Using previously loaded config {0}'.format(path))
+        return cached.copy()
+
+    def copy(self):
+        """
+        Copies the parameters and attributes (tags, yaml_file, ...) without
+        going through __init__
+        """
+        new = self.__class__.__new__(self.__class__)
+        dict.update(new, self)
+        new.__dict__.update(self.__dict__)
+        new.tags = list(self.tags)
+        return new
+
+    def expand(self, scan_spec, mode='product', check=True):
+        """
+        Lazily yields a Config per point of a parameter scan, using the
+        parameters of this Config for everything that is not scanned.
+
+        scan_spec maps parameter names to iterables of values, e.g.
+        `{'m_med' : [1000, 2000], 'r_inv' : [0.3, 0.5]}`, or is a list of
+        (name, values) pairs to fix the ordering of the scan.
+        mode='product' yields the Cartesian product of the values,
+        mode='zip' yields the i-th value of every parameter together.
+        If check is True, basic_checks is run on every point.
+        """
+        if isinstance(scan_spec, dict):
+            scan_spec = [ (key, scan_spec[key]) for key in sorted(scan_spec) ]
+        keys = [ key for key, values in scan_spec ]
+        values = [ values for key, values in scan_spec ]
+
+        if mode == 'product':
+            points = itertools.product(*values)
+        elif mode == 'zip':
+            lengths = set(len(v) for v in values if hasattr(v, '__len__'))
+            if len(lengths) > 1:
+                raise ValueError(
+                    'Cannot zip scan parameters {0} of different lengths {1}'
+                    .format(keys, sorted(lengths))
+                    )
+            points = _zip(*values)
+        else:
+            raise ValueError('Unknown scan mode {0}; use \'product\' or \'zip\''.format(mode))
+
+        for point in points:
+            config = self.copy()
+            dict.update(config, _zip(keys, point))
+            if check: config.basic_checks()
+            yield config
+
     @classmethod
     def flexible_init(cls, config):
         """
@@ -60,10 +146,7 @@ class Config(dict):
         elif isinstance(config, dict):
             return cls(config)
         elif osp.isfile(config):
-            if config.endswith('.yaml'):
-                return cls.from_yaml(config)
-            else:
-                return cls.from_file(config)
+            return cls.load(config)
         else:
             raise TypeError(
                 'config parameter should be either a Config instance, '
@@ -92,23 +175,191 @@ class Config(dict):
 
 
     def get_model_name(self):
-        channel = self['process_type'][0]
-        if channel == 's':
-            med_type = 'Zp'
-        elif channel == 't':
-            med_type = 'Phi'
-        else:
-            raise NotImplementedError(
-                'Channel {0} not implemented'.format(channel)
-                )
+        return get_model_name(
+            self['process_type'], self['year'], self['m_med'], self['m_d'],
+            self['r_inv'], self['alpha_d']
+            )
 
-        model_name = 'SVJ_{channel}_{year}_m{med}{m_med}_mDQ{m_d}_rinv{rinv}_aD{alphad}'.format(
-            rinv   = str(self['r_inv']).replace('.', 'p'),
-            alphad = str(self['alpha_d']).replace('.', 'p'),
-            channel = self['process_type'][0],
-            med    = med_type,
-            year   = self['year'],
-            m_med  = self['m_med'],
-            m_d    = self['m_d'],
+    def get_gridpack_key(self):
+        return get_gridpack_key(self['process_type'], self['year'], self['m_med'], self['m_d'])
+
+    def to_spec(self):
+        return SampleSpec.from_config(self)
+
+
+def get_mediator_type(process_type):
+    channel = process_type[0]
+    if channel == 's':
+        return 'Zp'
+    elif channel == 't':
+        return 'Phi'
+    else:
+        raise NotImplementedError(
+            'Channel {0} not implemented'.format(channel)
             )
-        return model_name
+
+
+def get_model_name(process_type, year, m_med, m_d, r_inv, alpha_d):
+    model_name = 'SVJ_{channel}_{year}_m{med}{m_med}_mDQ{m_d}_rinv{rinv}_aD{alphad}'.format(
+        rinv   = str(r_inv).replace('.', 'p'),
+        alphad = str(alpha_d).replace('.', 'p'),
+        channel = process_type[0],
+        med    = get_mediator_type(process_type),
+        year   = year,
+        m_med  = m_med,
+        m_d    = m_d,
+        )
+    return model_name
+
+
+def get_gridpack_key(process_type, year, m_med, m_d):
+    """
+    Only the channel, year and masses enter the MadGraph gridpack;
+    points that differ only in n_f, r_inv or alpha_d share it
+    """
+    return 'SVJ_{channel}_{year}_m{med}{m_med}_mDQ{m_d}'.format(
+        channel = process_type[0],
+        med     = get_mediator_type(process_type),
+        year    = _canonical_int(year),
+        m_med   = _canonical_int(m_med),
+        m_d     = _canonical_int(m_d),
+        )
+
+
+try:
+    _string_types = (str, unicode)
+except NameError:
+    # Python 3
+    _string_types = (str,)
+
+
+def _canonical_int(value):
+    if isinstance(value, _string_types):
+        return int(value)
+    elif isinstance(value, numbers.Integral):
+        return int(value)
+    elif isinstance(value, numbers.Real) and float(value).is_integer():
+        return int(value)
+    raise TypeError('Expected an integer, got {0!r} of type {1}'.format(value, type(value)))
+
+
+def _canonical_optional_int(value):
+    return None if value is None else _canonical_int(value)
+
+
+def _canonical_float(value):
+    if isinstance(value, (numbers.Real,) + _string_types):
+        return float(value)
+    raise TypeError('Expected a number, got {0!r} of type {1}'.format(value, type(value)))
+
+
+def _canonical_alpha_d(value):
+    """
+    alpha_d is either a number or a named scheme like 'peak'; numbers (also
+    numeric strings like '0.2') become floats, names become str
+    """
+    try:
+        return _canonical_float(value)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, _string_types):
+        return str(value)
+    raise TypeError('Unsupported alpha_d {0!r} of type {1}'.format(value, type(value)))
+
+
+# One type per SampleSpec field, so equal physics points given as e.g. numpy
+# scalars, py2 unicode or strings compare, hash and digest equally
+_CANONICALIZERS = {
+    'process_type' : str,
+    'year'         : _canonical_int,
+    'm_med'        : _canonical_int,
+    'm_d'          : _canonical_int,
+    'n_f'          : _canonical_optional_int,
+    'r_inv'        : _canonical_float,
+    'alpha_d'      : _canonical_alpha_d,
+    }
+
+
+def canonical_field_value(name, value):
+    """
+    Returns value in the canonical type of SampleSpec field name
+    """
+    return _CANONICALIZERS[name](value)
+
+
+class SampleSpec(object):
+    """
+    Immutable, hashable record of the physics parameters of a sample.
+    Much smaller than a Config (no per-instance dict), so it can be used for
+    large scans and directly as a key for caches and deduplication.
+    n_f may be None, as gridpack and LHE configs do not need it.
+    """
+
+    __slots__ = ( 'process_type', 'year', 'm_med', 'm_d', 'n_f', 'r_inv', 'alpha_d' )
+
+    def __init__(self, process_type, year, m_med, m_d, n_f, r_inv, alpha_d):
+        for name, value in _zip(self.__slots__, (process_type, year, m_med, m_d, n_f, r_inv, alpha_d)):
+            object.__setattr__(self, name, _CANONICALIZERS[name](value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{0} is immutable'.format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{0} is immutable'.format(self.__class__.__name__))
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, SampleSpec) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not(self == other)
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __reduce__(self):
+        return (self.__class__, self.values())
+
+    def __repr__(self):
+        return '{0}({1})'.format(
+            self.__class__.__name__,
+            ', '.join('{0}={1!r}'.format(name, getattr(self, name)) for name in self.__slots__)
+            )
+
+    def digest(self):
+        """
+        Hash that is stable across processes and Python versions (the builtin
+        hash of strings is randomized per process), for on-disk keys
+        """
+        return hashlib.sha1(repr(self.values()).encode()).hexdigest()
+
+    def replace(self, **kwargs):
+        values = dict(_zip(self.__slots__, self.values()))
+        values.update(kwargs)
+        return self.__class__(**values)
+
+    @property
+    def model_name(self):
+        return get_model_name(self.process_type, self.year, self.m_med, self.m_d, self.r_inv, self.alpha_d)
+
+    @property
+    def gridpack_key(self):
+        return get_gridpack_key(self.process_type, self.year, self.m_med, self.m_d)
+
+    @classmethod
+    def from_config(cls, config):
+        values = dict((name, config[name]) for name in cls.__slots__ if name != 'n_f')
+        values['n_f'] = config.get('n_f')
+        return cls(**values)
+
+    def to_config(self, **kwargs):
+        """
+        Returns a Config with the parameters of this spec; kwargs are added
+        as extra (non-physics) parameters, e.g. n_events
+        """
+        config = Config(_zip(self.__slots__, self.values()))
+        if self.n_f is None: del config['n_f']
+        config.update(kwargs)
+        return config
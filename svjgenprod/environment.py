@@ -20,6 +20,10 @@ def read_environment():
             )
         set_seed(env['SVJ_SEED'])
 
+    if env.get('SVJ_SHARD_SEEDS'):
+        svjgenprod.SVJ_SHARD_SEEDS = [ int(seed) for seed in env['SVJ_SHARD_SEEDS'].split(',') ]
+        logger.info('Taking shard seeds from SVJ_SHARD_SEEDS: {0}'.format(svjgenprod.SVJ_SHARD_SEEDS))
+
     # Path to the genproductions repo installation
     try:
         svjgenprod.MG_GENPROD_DIR = env['MG_GENPROD_DIR']
@@ -29,6 +33,12 @@ def read_environment():
             'Install the CMSSW genproductions package if you want to generate tarballs.'
             )
 
+    if 'SVJ_XSEC_DB' in env:
+        svjgenprod.SVJ_XSEC_DB = env['SVJ_XSEC_DB']
+
+    if 'SVJ_SEED_LEDGER' in env:
+        svjgenprod.SVJ_SEED_LEDGER = env['SVJ_SEED_LEDGER']
+
     if 'SVJ_BATCH_MODE' in env:
         batch_mode = env['SVJ_BATCH_MODE'].rstrip().lower()
         if batch_mode == 'lpc':
@@ -2,19 +2,33 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
-import os, shutil, sys, glob, subprocess, re, logging
+import os, shutil, sys, glob, subprocess, re, logging, time, hashlib, shlex, uuid
 import os.path as osp
 from time import strftime
+from multiprocessing.pool import ThreadPool
 
 import svjgenprod
 logger = logging.getLogger('root')
 
 
+def get_customisation_block(customisations):
+    """
+    Joins customisation snippets into the block that is appended to a cfg
+    """
+    return (
+        '\n\n# ---- Customisations added by svjgenprod ----\n'
+        + '\n'.join(c.rstrip('\n') + '\n' for c in customisations)
+        + '# ---- End of customisations ----\n'
+        )
+
+
 #____________________________________________________________________
 class FullSimRunnerBase(object):
     """Abstract class to subclass specific runners from"""
 
     seed = svjgenprod.SVJ_SEED
+    # Tool to merge the outputs of event-range shards (see svjgenprod.merging)
+    merge_tool = 'edmCopyPickMerge'
     _create_workdir_called = False
     _force_renew_workdir = False
 
@@ -42,14 +56,82 @@ class FullSimRunnerBase(object):
         self.fullsim_dir = svjgenprod.RUN_FULLSIM_DIR
         self.workdir = osp.join(self.fullsim_dir, self.run_name)
         self.pileup_filelist_basename = 'pileup_filelist_{0}.txt'.format(self.year)
+        # Number of pileup files to give to the job (see svjgenprod.pileup);
+        # None uses the full pileup file list
+        self.n_pileup_files = None
+        # Directories under which premix files may be available as local files
+        self.pileup_local_prefixes = []
+        # If set, remote pileup files are copied here before cmsRun starts
+        self.pileup_prefetch_dir = None
+        # If set, every job gets its own balanced group of pileup files out of
+        # pileup_n_jobs groups (needs the pileup index, see svjgenprod.pileup)
+        self.pileup_n_jobs = None
+        self.pileup_job_index = None
+        # Node-level cache of premix files (see svjgenprod.pileup.PileupCache);
+        # cache hits are read locally, up to pileup_cache_fetch_limit misses are
+        # fetched into the cache in the background
+        self.pileup_cache_dir = None
+        self.pileup_cache_size_gb = 100.
+        self.pileup_cache_fetch_limit = 10
+        self._pileup_fetch_thread = None
+        self._pileup_cache = None
 
         self.in_file = osp.abspath(in_file)
         self.n_events = n_events
+        self.update_paths()
+        # Catalog (.npz or .parquet) in which copy_to_output/move_to_output/stageout
+        # record the output file; None means no catalog (see svjgenprod.catalog)
+        self.catalog_file = None
+        self.cmsrun_time = None
+        # Directory with cfg templates from earlier cmsDriver.py calls; if set,
+        # cmsDriver.py only runs for option combinations not seen before
+        self.cmsdriver_cache_dir = None
+        # Run cmsDriver.py and cmsRun directly with a captured `cmsenv` environment,
+        # instead of in a new shell that sources cmsset and runs scramv1 each time
+        self.reuse_cmssw_env = True
+        # Resources claimed by this runner in svjgenprod.scheduler; cmsDriver.py
+        # gets --nThreads n_cores (divided over the shards)
+        self.n_cores = 1
+        self.memory_gb = 2.5
+        # Split the events over n_shards cmsRun processes that run in parallel
+        # and merge their outputs; uses all cores also for stages that do not
+        # multithread well (e.g. GEN-SIM in CMSSW_7_1_X)
+        self.n_shards = 1
+        # Seeds for the shards, e.g. allocated at submission by svjgenprod-batch
+        # --nshards; None gets them as described in get_shard_seeds
+        self.shard_seeds = svjgenprod.SVJ_SHARD_SEEDS
+        # Sample key for shard seeds that are not given (see svjgenprod.seeds);
+        # None uses the digest of the sample spec
+        self.seed_key = None
+
+    def update_paths(self):
+        """
+        Sets the paths that depend on the workdir and seed; call again after
+        changing either of them
+        """
         self.cfg_file_basename = '{0}_{1}_N{2}_seed{3}.py'.format(self.model_name, self.substage, self.n_events, self.seed)
         self.cfg_file = osp.join(self.get_cmssw_src(), self.cfg_file_basename)
         self.out_root_file_basename = '{0}_{1}_N{2}_seed{3}.root'.format(self.model_name, self.substage, self.n_events, self.seed)
         self.out_root_file = osp.join(self.get_cmssw_src(), self.out_root_file_basename)
 
+    def make_workdir_unique(self):
+        """
+        Moves this runner to its own workdir, so several runners of the same
+        model can run at the same time on one node
+        """
+        self.workdir = osp.join(
+            self.fullsim_dir,
+            '{0}_seed{1}_{2}'.format(self.run_name, self.seed, uuid.uuid4().hex[:8])
+            )
+        self.update_paths()
+        logger.info('Using unique workdir {0}'.format(self.workdir))
+
+    def get_lock_file(self):
+        """
+        Lock file for operations on the CMSSW area, which may be shared with other processes
+        """
+        return osp.join(self.workdir, '.{0}.lock'.format(self.cmssw_version))
+
     def create_workdir(self, dry=False):
         """
         Creates the directory in which the CMSSW(s) are set up
@@ -62,18 +144,40 @@ class FullSimRunnerBase(object):
 
     def setup_cmssw(self):
         self.create_workdir()
-        svjgenprod.utils.setup_cmssw(self.workdir, self.cmssw_version, self.arch)
+        with svjgenprod.utils.file_lock(self.get_lock_file()):
+            svjgenprod.utils.setup_cmssw(self.workdir, self.cmssw_version, self.arch)
 
     def copy_pileup_filelist(self):
-        file_list = os.path.join(svjgenprod.SVJ_INPUT_DIR, 'pileupfilelists', self.pileup_filelist_basename)
-        logger.info('Copying pileup_filelist {0} to workdir'.format(file_list))
-        shutil.copy(file_list, osp.join(self.workdir, osp.basename(file_list)))
+        if self.n_pileup_files is None and self.pileup_n_jobs is None and self.pileup_cache_dir is None:
+            file_list = os.path.join(svjgenprod.SVJ_INPUT_DIR, 'pileupfilelists', self.pileup_filelist_basename)
+            logger.info('Copying pileup_filelist {0} to workdir'.format(file_list))
+            shutil.copy(file_list, osp.join(self.workdir, osp.basename(file_list)))
+            return
+        job_index = self.pileup_job_index
+        if job_index is None and not(self.pileup_n_jobs is None):
+            job_index = int(os.environ['CONDOR_PROCESS_ID']) if svjgenprod.BATCH_MODE else 0
+        entries = svjgenprod.pileup.plan_pileup(
+            self.year, self.n_pileup_files, self.seed,
+            local_prefixes = self.pileup_local_prefixes,
+            prefetch_dir = self.pileup_prefetch_dir,
+            job_index = job_index,
+            n_jobs = self.pileup_n_jobs,
+            )
+        if not(self.pileup_cache_dir is None):
+            cache = svjgenprod.pileup.PileupCache(self.pileup_cache_dir, self.pileup_cache_size_gb)
+            # The cached files stay pinned until cmsRun is done with them
+            entries, misses = cache.rewrite_filelist(entries)
+            self._pileup_cache = cache
+            if misses and self.pileup_cache_fetch_limit > 0:
+                self._pileup_fetch_thread = cache.fetch_in_background(misses[:self.pileup_cache_fetch_limit])
+        svjgenprod.pileup.write_pileup_filelist(entries, osp.join(self.workdir, self.pileup_filelist_basename))
 
     def get_cmssw_src(self, stage=None):
         return osp.join(self.workdir, self.cmssw_version, 'src')
 
     def compile_cmssw(self):
-        svjgenprod.utils.compile_cmssw_src(self.get_cmssw_src(), self.arch)
+        with svjgenprod.utils.file_lock(self.get_lock_file()):
+            svjgenprod.utils.compile_cmssw_src(self.get_cmssw_src(), self.arch)
 
     def source_cmssw_cmds(self, cmssw_src=None):
         """
@@ -92,66 +196,256 @@ class FullSimRunnerBase(object):
     def get_cmsdriver_cmd(self):
         raise NotImplementedError('Use this method only in a subclass')
 
+    def get_n_threads(self):
+        """
+        Threads per cmsRun process: the n_cores claimed by this runner, divided
+        over the shards
+        """
+        return max(1, self.n_cores // max(1, self.n_shards))
+
+    def get_threaded_cmsdriver_cmd(self):
+        """
+        get_cmsdriver_cmd with --nThreads set to get_n_threads
+        """
+        cmd = self.get_cmsdriver_cmd()
+        n_threads = self.get_n_threads()
+        if n_threads == 1: return cmd
+        if type(cmd) is str: return cmd + ' --nThreads {0}'.format(n_threads)
+        return list(cmd) + [ '--nThreads {0}'.format(n_threads) ]
+
     def cmsdriver(self):
-        cmds = self.source_cmssw_cmds()
-        cmds.append(self.get_cmsdriver_cmd())
-        svjgenprod.utils.run_multiple_commands(cmds)
+        if not(self.cmsdriver_cache_dir is None) and self.cmsdriver_from_cache():
+            return
+        self.run_in_cmssw(self.get_threaded_cmsdriver_cmd())
+        if not(self.cmsdriver_cache_dir is None):
+            self.cmsdriver_to_cache()
 
-    def edit_cmsdriver_output(self):
+    def get_cmsdriver_substitutions(self):
         """
-        Overwrite this method in case edits need to made to the .cfg output
-        of the cmsDriver command before doing cmsRun
+        Returns (placeholder, value) pairs for the per-job values in the cmsDriver
+        command and its cfg; cached cfgs store the placeholders
         """
-        pass
+        return [
+            ('@SVJ_IN_FILE@', self.in_file),
+            ('@SVJ_OUT_FILE@', self.out_root_file_basename),
+            ('@SVJ_CFG_FILE@', self.cfg_file_basename),
+            ('@SVJ_PILEUP_FILELIST@', osp.join(self.workdir, self.pileup_filelist_basename)),
+            ]
+
+    def get_cmsdriver_cache_inputs(self):
+        """
+        Returns files whose contents end up in the cfg, and hence go into the cache key
+        """
+        cmd = self.get_threaded_cmsdriver_cmd()
+        if not(type(cmd) is str): cmd = ' '.join(cmd)
+        if '--pileup_input' in cmd:
+            # cmsDriver.py copies the pileup file names into the cfg
+            return [ osp.join(self.workdir, self.pileup_filelist_basename) ]
+        return []
+
+    def get_cmsdriver_cache_key(self):
+        """
+        Hash of the release, the cmsDriver command without per-job values, and
+        the contents of the files that are read by cmsDriver.py
+        """
+        cmd = self.get_threaded_cmsdriver_cmd()
+        if not(type(cmd) is str): cmd = ' '.join(cmd)
+        for placeholder, value in self.get_cmsdriver_substitutions():
+            cmd = cmd.replace(value, placeholder)
+        cmd = re.sub(r'-n \d+', '-n @SVJ_N_EVENTS@', cmd)
+        key = hashlib.sha1()
+        key.update('{0} {1} {2}'.format(self.cmssw_version, self.arch, cmd).encode())
+        for input_file in self.get_cmsdriver_cache_inputs():
+            with open(input_file, 'rb') as f:
+                key.update(f.read())
+        return key.hexdigest()
+
+    def get_cmsdriver_cache_file(self):
+        return osp.join(
+            self.cmsdriver_cache_dir,
+            '{0}_{1}_{2}_cfg.py'.format(self.substage, self.year, self.get_cmsdriver_cache_key())
+            )
+
+    def cmsdriver_from_cache(self):
+        """
+        Instantiates the cfg from a cached template; returns False if there is none
+        """
+        cache_file = self.get_cmsdriver_cache_file()
+        if not osp.isfile(cache_file):
+            logger.info('No cached cmsDriver cfg {0}'.format(cache_file))
+            return False
+        logger.info('Creating {0} from cached cmsDriver cfg {1}'.format(self.cfg_file, cache_file))
+        with open(cache_file, 'r') as f:
+            contents = f.read()
+        for placeholder, value in self.get_cmsdriver_substitutions():
+            contents = contents.replace(placeholder, value)
+        contents = contents.replace('@SVJ_N_EVENTS@', str(self.n_events))
+        with open(self.cfg_file, 'w') as f:
+            f.write(contents)
+        return True
+
+    def cmsdriver_to_cache(self):
+        """
+        Stores the cfg generated by cmsDriver.py as a template, with the per-job
+        values replaced by placeholders
+        """
+        with open(self.cfg_file, 'r') as f:
+            contents = f.read()
+        for placeholder, value in self.get_cmsdriver_substitutions():
+            contents = contents.replace(value, placeholder)
+        contents, n_replaced = re.subn(
+            r'(process\.maxEvents = cms\.untracked\.PSet\(\s*input = cms\.untracked\.int32\()(\d+)(\))',
+            r'\g<1>@SVJ_N_EVENTS@\g<3>',
+            contents
+            )
+        if n_replaced != 1:
+            logger.warning('Could not find process.maxEvents in {0}; not caching it'.format(self.cfg_file))
+            return
+        # Also the command line options in the header of the cfg
+        contents = re.sub(r'(?m)^(#.*)-n \d+', r'\g<1>-n @SVJ_N_EVENTS@', contents)
+        cache_file = self.get_cmsdriver_cache_file()
+        logger.info('Caching cmsDriver cfg as {0}'.format(cache_file))
+        svjgenprod.utils.create_directory(self.cmsdriver_cache_dir)
+        tmp_file = '{0}.tmp{1}'.format(cache_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            f.write(contents)
+        os.rename(tmp_file, cache_file)
 
-    def edit_cmsdriver_rnd_service(self):
+    def get_customisations(self):
         """
-        Opens the config file generated by cmsDriver, and adds a few lines to
-        ensure the rng is reset properly
+        Returns the list of python snippets that are appended to the cfg
+        generated by cmsDriver.py. Subclasses extend this list to customise the
+        process. The snippets run after the process is fully defined, so they
+        operate on the process object instead of on the text of the cfg, which
+        differs between CMSSW versions.
         """
-        logger.warning('Trying to add rnd service lines to cfg - fragile code')
-        contents = self._get_cmsdriver_output()
-        rnd_lines = (
+        return [ self.get_rnd_service_customisation() ]
+
+    def get_rnd_service_customisation(self):
+        return (
             '# reset all random numbers to ensure statistically distinct but reproducible jobs\n'
             'from IOMC.RandomEngine.RandomServiceHelper import RandomNumberServiceHelper\n'
             'randHelper = RandomNumberServiceHelper(process.RandomNumberGeneratorService)\n'
             'randHelper.resetSeeds({0})\n'
             .format(self.seed)
             )
-        contents, n_repl_made = re.subn(
-            r'\nprocess\.maxEvents',
-            '\n' + rnd_lines + '\nprocess.maxEvents',
-            contents,
-            count = 1
-            )
-        if n_repl_made == 0:
-            raise ValueError(
-                'Cannot add the rnd service lines to the cfg: regex substitution failed'
-                )
-        self._overwrite_cmsdriver_output(contents)
+
+    def apply_customisations(self, dry=False):
+        """
+        Appends all customisations to the cfg file in a single block
+        """
+        customisations = self.get_customisations()
+        logger.info('Appending {0} customisations to {1}'.format(len(customisations), self.cfg_file))
+        block = get_customisation_block(customisations)
+        if not dry:
+            with open(self.cfg_file, 'a') as f:
+                f.write(block)
+        return block
+
+    def get_cmssw_env(self):
+        return svjgenprod.utils.get_cmssw_environment(self.get_cmssw_src(), self.arch)
+
+    def run_in_cmssw(self, cmd):
+        """
+        Runs cmd (a string or a list of strings that are joined) in the CMSSW src dir
+        """
+        if not(type(cmd) is str): cmd = ' '.join(cmd)
+        if not self.reuse_cmssw_env:
+            svjgenprod.utils.run_multiple_commands(self.source_cmssw_cmds() + [ cmd ])
+            return
+        # Passing cwd instead of chdir'ing keeps this usable from several threads
+        svjgenprod.utils.run_command(shlex.split(cmd), env=self.get_cmssw_env(), cwd=self.get_cmssw_src())
 
     def cmsrun(self):
-        cmds = self.source_cmssw_cmds()
-        cmds.append('cmsRun {0}'.format(self.cfg_file_basename))
-        svjgenprod.utils.run_multiple_commands(cmds)
+        t0 = time.time()
+        try:
+            if self.n_shards > 1:
+                self.cmsrun_shards()
+            else:
+                self.run_in_cmssw('cmsRun {0}'.format(self.cfg_file_basename))
+        finally:
+            if not(self._pileup_cache is None): self._pileup_cache.unpin_all()
+        self.cmsrun_time = time.time() - t0
 
-    def full_chain(self):
-        self.setup_cmssw()
-        self.cmsdriver()
-        self.edit_cmsdriver_output()
-        self.edit_cmsdriver_rnd_service()
-        self.cmsrun()
+    def get_event_ranges(self):
+        """
+        Returns a (skip_events, n_events) pair per shard
+        """
+        n_shards = max(1, min(self.n_shards, self.n_events))
+        n_per_shard, remainder = divmod(self.n_events, n_shards)
+        ranges = []
+        skip_events = 0
+        for i_shard in range(n_shards):
+            n_events = n_per_shard + (1 if i_shard < remainder else 0)
+            ranges.append((skip_events, n_events))
+            skip_events += n_events
+        return ranges
 
-    def _get_cmsdriver_output(self):
-        logger.info('Reading {0}'.format(self.cfg_file))
+    def get_shard_seeds(self, n_shards):
+        """
+        Returns one seed per shard: self.shard_seeds if given, else seeds
+        allocated in the seed ledger when running locally. A batch job cannot
+        reach the ledger of the submitter, so there they are derived from the
+        (unique) job seed instead.
+        """
+        if not(self.shard_seeds is None):
+            if len(self.shard_seeds) < n_shards:
+                raise ValueError('Got {0} shard seeds for {1} shards'.format(len(self.shard_seeds), n_shards))
+            return list(self.shard_seeds[:n_shards])
+        seed_key = self.config.to_spec().digest() if self.seed_key is None else self.seed_key
+        if svjgenprod.BATCH_MODE:
+            logger.warning('No shard seeds given; deriving them from job seed {0}'.format(self.seed))
+            return [ svjgenprod.seeds.derive_seed(seed_key, self.substage, self.seed, i_shard) for i_shard in range(n_shards) ]
+        return svjgenprod.seeds.allocate_seeds(seed_key, self.substage, 1, n_shards)[0]
+
+    def get_shard_customisation(self, skip_events, n_events, seed, out_file):
+        return (
+            '# process only the events of this shard, with its own seeds and output file\n'
+            'process.source.skipEvents = cms.untracked.uint32({0})\n'
+            'process.maxEvents.input = cms.untracked.int32({1})\n'
+            'from IOMC.RandomEngine.RandomServiceHelper import RandomNumberServiceHelper\n'
+            'RandomNumberServiceHelper(process.RandomNumberGeneratorService).resetSeeds({2})\n'
+            'for name in process.outputModules:\n'
+            '    getattr(process, name).fileName = cms.untracked.string(\'file:{3}\')\n'
+            .format(skip_events, n_events, seed, out_file)
+            )
+
+    def cmsrun_shards(self):
+        """
+        Runs the cfg as n_shards cmsRun processes over consecutive event ranges
+        and merges their outputs into out_root_file
+        """
         with open(self.cfg_file, 'r') as f:
             contents = f.read()
-        return contents
+        cfg_files = []
+        out_files = []
+        event_ranges = self.get_event_ranges()
+        shard_seeds = self.get_shard_seeds(len(event_ranges))
+        for i_shard, (skip_events, n_events) in enumerate(event_ranges):
+            cfg_file = '{0}_shard{1}.py'.format(osp.splitext(self.cfg_file)[0], i_shard)
+            out_file = '{0}_shard{1}.root'.format(osp.splitext(self.out_root_file)[0], i_shard)
+            with open(cfg_file, 'w') as f:
+                f.write(contents)
+                f.write(get_customisation_block([
+                    self.get_shard_customisation(skip_events, n_events, shard_seeds[i_shard], out_file)
+                    ]))
+            cfg_files.append(cfg_file)
+            out_files.append(out_file)
+        logger.info('Running {0} cmsRun shards of {1}'.format(len(cfg_files), self.cfg_file))
+        pool = ThreadPool(len(cfg_files))
+        try:
+            pool.map(lambda cfg_file: self.run_in_cmssw('cmsRun {0}'.format(osp.basename(cfg_file))), cfg_files)
+        finally:
+            pool.close()
+        self.run_in_cmssw(svjgenprod.merging.get_merge_cmd(out_files, self.out_root_file, self.merge_tool))
+        for path in cfg_files + out_files:
+            os.remove(path)
 
-    def _overwrite_cmsdriver_output(self, contents):
-        logger.warning('Overwriting {0}'.format(self.cfg_file))
-        with open(self.cfg_file, 'w') as f:
-            f.write(contents)
+    def full_chain(self):
+        self.setup_cmssw()
+        self.cmsdriver()
+        self.apply_customisations()
+        self.cmsrun()
 
     def copy_to_output(self, output_dir=None, dry=False):
         if output_dir is None: output_dir = svjgenprod.SVJ_OUTPUT_DIR
@@ -160,6 +454,7 @@ class FullSimRunnerBase(object):
         logger.info('Copying {0} ==> {1}'.format(self.out_root_file, dst))
         if not dry:
             shutil.copyfile(self.out_root_file, dst)
+            self.record_in_catalog(dst)
 
     def move_to_output(self, output_dir=None, dry=False):
         if output_dir is None: output_dir = svjgenprod.SVJ_OUTPUT_DIR
@@ -168,6 +463,7 @@ class FullSimRunnerBase(object):
         logger.info('Moving {0} ==> {1}'.format(self.out_root_file, dst))
         if not dry:
             shutil.move(self.out_root_file, dst)
+            self.record_in_catalog(dst)
 
     def stageout(self, stageout_directory=None):
         """
@@ -195,4 +491,25 @@ class FullSimRunnerBase(object):
         dst = osp.join(stageout_directory, 'N{0}{1}_seed{2}.root'.format(self.n_events, condor_process_id, self.seed))
         semanager = svjgenprod.SEManager()
         semanager.copy_to_se(self.out_root_file, dst, create_parent_directory=True)
+        self.record_in_catalog(dst, local_file=self.out_root_file)
+
+    def get_merge_runner(self, directory, target_size_gb=2.):
+        """
+        Returns a MergeRunner for the staged-out outputs of this stage in
+        directory, using the merge tool and CMSSW environment of this runner
+        """
+        runner = svjgenprod.merging.MergeRunner(directory, target_size_gb, self.merge_tool)
+        if self.reuse_cmssw_env: runner.env = self.get_cmssw_env()
+        return runner
+
+    def record_in_catalog(self, path, local_file=None):
+        if self.catalog_file is None: return
+        svjgenprod.catalog.record_artifact(
+            self.config.to_spec(), self.substage, path,
+            catalog_file = self.catalog_file,
+            local_file = local_file,
+            n_events = self.n_events,
+            seed = self.seed,
+            wall_time = self.cmsrun_time,
+            )
 
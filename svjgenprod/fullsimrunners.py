@@ -16,6 +16,7 @@ class FullSimRunnerGenSim(svjgenprod.FullSimRunnerBase):
 
     stage = 'gensim'
     substage = 'GEN_SIM'
+    gensimfragment_basename = 'SVJGenSimFragment.py'
 
     @classmethod
     def subclass_per_year(cls):
@@ -25,73 +26,83 @@ class FullSimRunnerGenSim(svjgenprod.FullSimRunnerBase):
             2018: FullSimRunnerGenSim2018,
             }
 
-    def __init__(self, *args, **kwargs):
-        super(FullSimRunnerGenSim, self).__init__(*args, **kwargs)
-        self.gensimfragment_basename = 'SVJGenSimFragment.py'
+    def update_paths(self):
+        super(FullSimRunnerGenSim, self).update_paths()
         self.gensimfragment_dir = osp.join(self.get_cmssw_src(), 'Configuration/GenProduction/python')
         self.gensimfragment_file = osp.join(self.gensimfragment_dir, self.gensimfragment_basename)
 
     def full_chain(self):
         self.setup_cmssw()
         self.add_gensimfragment()
+        self.decompress_in_file()
         self.cmsdriver()
-        self.edit_cmsdriver_output()
-        self.edit_cmsdriver_rnd_service()
+        self.apply_customisations()
         self.cmsrun()
 
+    def decompress_in_file(self):
+        """
+        CMSSW cannot read compressed .lhe files; decompress .lhe.gz/.lhe.zst
+        input into the workdir and use that as the input file instead
+        """
+        if svjgenprod.compression.get_file_compression(self.in_file) is None: return
+        self.create_workdir()
+        dst = osp.join(
+            self.workdir,
+            osp.basename(svjgenprod.compression.strip_compression_extension(self.in_file))
+            )
+        # The workdir may be shared with other runners (see
+        # svjgenprod.scheduler.run_runners); decompress to a temporary file and
+        # rename it under the lock, so no runner reads a partially written file
+        tmp_dst = '{0}.tmp{1}'.format(dst, os.getpid())
+        with svjgenprod.utils.file_lock(self.get_lock_file()):
+            svjgenprod.compression.decompress_file(self.in_file, tmp_dst)
+            os.rename(tmp_dst, dst)
+        self.in_file = dst
+
     def add_gensimfragment(self):
         """
         Creates the gensimfragment
         """
         svjgenprod.utils.create_directory(self.gensimfragment_dir)
         gensimfragment = svjgenprod.GenSimFragment(self.config)
-        gensimfragment.to_file(self.gensimfragment_file)
+        # Same as in decompress_in_file; the CMSSW area may be shared
+        tmp_file = '{0}.tmp{1}'.format(self.gensimfragment_file, os.getpid())
+        with svjgenprod.utils.file_lock(self.get_lock_file()):
+            gensimfragment.to_file(tmp_file)
+            os.rename(tmp_file, self.gensimfragment_file)
         self.compile_cmssw()
 
-    def edit_cmsdriver_output(self):
-        """
-        Takes the cfg file generated by cmsDriver.py, edits some lines, and re-saves
-        Based on simple string replacement, somewhat fragile code
-        """
-        logger.warning('Doing dangerous replacements on {0}; fragile code!'.format(self.cfg_file))
-
-        contents = self._get_cmsdriver_output()
-
-        def replace_exactly_once(string, to_replace, replace_by):
-            if not to_replace in string:
-                raise ValueError('Substring "{0}" not found'.format(string))
-            return string.replace(to_replace, replace_by, 1)
-
-        # Add to CMSSW config in case stringent hadronisation cuts remove all events from a job
-        contents = replace_exactly_once(contents,
-            'process.options = cms.untracked.PSet(\n',
-            ( 
-                'process.options = cms.untracked.PSet(\n'
-                '    SkipEvent = cms.untracked.vstring(\'ProductNotFound\'),\n'
-                )
-            )
-
-        # Add to CMSSW config to ensure Z2 and dark quark filters are used
-        contents = replace_exactly_once(contents,
-            'seq = process.generator',
-            'seq = (process.generator + process.darkhadronZ2filter + process.darkquarkFilter)'
-            )
-
-        logger.warning('EXTREMELY FRAGILE: Editing %s to keep gen jets', self.cfg_file)
-        contents += (
-            '\n\nfor particle in ["genParticlesForJetsNoMuNoNu","genParticlesForJetsNoNu","genCandidatesForMET","genParticlesForMETAllVisible"]:\n'
-            '    if hasattr(process, particle): getattr(process, particle).ignoreParticleIDs.extend([51,52,53])\n'
-            'if hasattr(process,"recoGenJets") and hasattr(process,"recoAllGenJetsNoNu"):\n'
-            '    process.recoGenJets += process.recoAllGenJetsNoNu\n'
-            'if hasattr(process,\'genJetParticles\') and hasattr(process,\'genParticlesForJetsNoNu\'):\n'
-            '    process.genJetParticles += process.genParticlesForJetsNoNu\n'
-            '    process.RAWSIMEventContent.outputCommands.extend([\n'
-            '        \'keep *_genParticlesForJets_*_*\',\n'
-            '        \'keep *_genParticlesForJetsNoNu_*_*\',\n'
-            '        ])\n'
-            )
-
-        self._overwrite_cmsdriver_output(contents)
+    def get_cmsdriver_cache_inputs(self):
+        # The fragment is copied into the cfg
+        return super(FullSimRunnerGenSim, self).get_cmsdriver_cache_inputs() + [ self.gensimfragment_file ]
+
+    def get_customisations(self):
+        customisations = super(FullSimRunnerGenSim, self).get_customisations()
+        customisations.extend([
+            # In case stringent hadronisation cuts remove all events from a job
+            'process.options.SkipEvent = cms.untracked.vstring(\'ProductNotFound\')\n',
+            # Ensure the Z2 and dark quark filters run right after the generator
+            (
+                'process.svjGeneratorAndFilters = cms.Sequence(process.generator + process.darkhadronZ2filter + process.darkquarkFilter)\n'
+                'for path in process.paths:\n'
+                '    if path in [\'lhe_step\']: continue\n'
+                '    getattr(process, path).replace(process.generator, process.svjGeneratorAndFilters)\n'
+                ),
+            # Keep the dark hadrons out of the gen jets and MET
+            (
+                'for particle in ["genParticlesForJetsNoMuNoNu","genParticlesForJetsNoNu","genCandidatesForMET","genParticlesForMETAllVisible"]:\n'
+                '    if hasattr(process, particle): getattr(process, particle).ignoreParticleIDs.extend([51,52,53])\n'
+                'if hasattr(process,"recoGenJets") and hasattr(process,"recoAllGenJetsNoNu"):\n'
+                '    process.recoGenJets += process.recoAllGenJetsNoNu\n'
+                'if hasattr(process,\'genJetParticles\') and hasattr(process,\'genParticlesForJetsNoNu\'):\n'
+                '    process.genJetParticles += process.genParticlesForJetsNoNu\n'
+                '    process.RAWSIMEventContent.outputCommands.extend([\n'
+                '        \'keep *_genParticlesForJets_*_*\',\n'
+                '        \'keep *_genParticlesForJetsNoNu_*_*\',\n'
+                '        ])\n'
+                ),
+            ])
+        return customisations
 
 
 class FullSimRunnerGenSim2016(FullSimRunnerGenSim):
@@ -243,7 +254,7 @@ class FullSimRunnerAOD(svjgenprod.FullSimRunnerBase):
         self.setup_cmssw()
         self.copy_pileup_filelist()
         self.cmsdriver()
-        self.edit_cmsdriver_rnd_service()
+        self.apply_customisations()
         self.cmsrun()
 
 
@@ -379,6 +390,7 @@ class FullSimRunnerMiniAOD2018(FullSimRunnerMiniAOD):
 class FullSimRunnerNanoAOD(svjgenprod.FullSimRunnerBase):
     stage = 'nano'
     substage = 'NanoAOD'
+    merge_tool = 'haddnano.py'
     @classmethod
     def subclass_per_year(cls):
         return {
@@ -387,15 +399,10 @@ class FullSimRunnerNanoAOD(svjgenprod.FullSimRunnerBase):
         2018: FullSimRunnerNanoAOD2018,
         }
 
-    def edit_cmsdriver_output(self):
-        """
-        Takes the cfg file generated by cmsDriver.py, edits some lines, and re-saves
-        Based on simple string replacement, somewhat fragile code
-        """
-        logger.warning('Changing default NanoAOD sequence to omit the RivetProducer')
-        contents = self._get_cmsdriver_output()
-        contents += '\n'.join([
-            '\n\n# EDITTED FOR SVJ: Change default NanoAOD sequence to skip the RivetProducer',
+    def get_customisations(self):
+        customisations = super(FullSimRunnerNanoAOD, self).get_customisations()
+        # Change default NanoAOD sequence to skip the RivetProducer
+        customisations.append('\n'.join([
             'process.particleLevelSequence = cms.Sequence(',
             '    process.mergedGenParticles',
             '    + process.genParticles2HepMC',
@@ -404,8 +411,8 @@ class FullSimRunnerNanoAOD(svjgenprod.FullSimRunnerBase):
             '    + process.genParticles2HepMCHiggsVtx',
             '    )',
             'process.particleLevelTables = cms.Sequence(process.rivetLeptonTable + process.rivetMetTable)',
-            ])
-        self._overwrite_cmsdriver_output(contents)
+            ]))
+        return customisations
 
 class FullSimRunnerNanoAOD2016(FullSimRunnerNanoAOD):
     cmssw_version = 'CMSSW_9_4_4'
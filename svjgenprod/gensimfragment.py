@@ -73,7 +73,11 @@ class GenSimFragment(object):
 
 
     def get_xsec(self):
-        if self.process_type.startswith('s'):
+        # Prefer the cross section recorded when the gridpack was built
+        from_db = svjgenprod.xsecdb.get_xsec(self.config)
+        if not(from_db is None):
+            self.x_sec = from_db[0]
+        elif self.process_type.startswith('s'):
             self.x_sec = svjgenprod.utils.crosssection_from_file(
                 osp.join(svjgenprod.SVJ_INPUT_DIR, 'xsecs_s-channel.txt'),
                 self.m_med
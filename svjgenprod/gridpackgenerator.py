@@ -2,10 +2,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
-import os, shutil, sys, glob, subprocess, logging
+import os, shutil, sys, glob, subprocess, logging, time
 import os.path as osp
 from string import Template
-from distutils.dir_util import copy_tree
+try:
+    from distutils.dir_util import copy_tree
+except ImportError:
+    # distutils was removed in Python 3.12
+    def copy_tree(src, dst):
+        shutil.copytree(src, dst, dirs_exist_ok=True)
 from time import strftime
 
 logger = logging.getLogger('root')
@@ -26,6 +31,15 @@ class GridpackGenerator(object):
         self.force_renew_input_dir = True
         self.force_renew_gridpack_dir = True
         self.cleanup_gp_generation_dir = True
+        # Hardlink the unchanged UFO files from a shared template instead of copying them
+        self.link_template_model = True
+        # Set to 'xz' or 'zstd' to repack the produced gridpack with multi-threaded compression
+        self.repack_compression = None
+        self.repack_threads = 0
+        # Catalog (.npz or .parquet) in which copy_to_output/move_to_output record
+        # the gridpack; None means no catalog (see svjgenprod.catalog)
+        self.catalog_file = None
+        self.compile_time = None
         self.mg_model_dir = svjgenprod.MG_MODEL_DIR
         self.mg_input_dir = svjgenprod.MG_INPUT_DIR
         self.mg_genprod_dir = svjgenprod.MG_GENPROD_DIR
@@ -81,36 +95,108 @@ class GridpackGenerator(object):
         self.setup_model_dir()
         self.setup_input_dir()
         self.compile_gridpack()
+        self.store_xsec()
+        if not(self.repack_compression is None):
+            self.repack_gridpack()
 
     def setup_model_dir(self):
         self.create_model_dir()
         self.write_param_card()
 
+    @staticmethod
+    def setup_model_dirs(generators):
+        """
+        Sets up the model dirs of many GridpackGenerators (e.g. a mass scan) at once.
+        The param cards of all points that share a template model are written
+        in one vectorized pass, rather than one UFO evaluation per point.
+        """
+        per_template = {}
+        for generator in generators:
+            generator.create_model_dir()
+            per_template.setdefault(generator.template_model_dir, []).append(generator)
+
+        for template_model_dir, generators in per_template.items():
+            placeholders = svjgenprod.ufomodel.get_template_placeholders(template_model_dir)
+            overrides = {}
+            for placeholder, attr in [ ('mediator_mass', 'm_med'), ('dark_quark_mass', 'm_d') ]:
+                for name in placeholders.get(placeholder, []):
+                    overrides[name] = [ getattr(g, attr) for g in generators ]
+            # All points share the structure; the first model dir is as good as any
+            model = svjgenprod.ufomodel.load_model(generators[0].new_model_dir)
+            model.write_param_cards(
+                [ osp.join(g.new_model_dir, 'param_card.dat') for g in generators ],
+                overrides
+                )
+
+    # Model files that are filled in per physics point; all other files are
+    # identical for every point and can be shared
+    parametrised_model_files = [ 'parameters.py', 'param_card.dat' ]
+
+    def get_shared_template_model_dir(self):
+        """
+        Returns a read-only copy of the template model dir inside mg_model_dir,
+        creating it if needed. Being on the same device as the per-point model
+        dirs, its files can be hardlinked rather than copied.
+        The directory name contains a hash of the template, so changes to the
+        template create a new shared copy.
+        """
+        exclude = self.parametrised_model_files + [ '*.pyc', '__pycache__' ]
+        template_hash = svjgenprod.utils.hash_directory(self.template_model_dir, exclude=exclude)
+        shared_dir = osp.join(
+            self.mg_model_dir, '.templates',
+            '{0}_{1}'.format(osp.basename(self.template_model_dir), template_hash[:10])
+            )
+        if osp.isdir(shared_dir):
+            logger.info('Using existing shared template model {0}'.format(shared_dir))
+            return shared_dir
+        logger.info('Creating shared template model {0}'.format(shared_dir))
+        # Build in a temporary dir and rename, so concurrent generators never see a partial copy
+        tmp_dir = svjgenprod.utils.make_inode_unique(shared_dir + '_tmp')
+        svjgenprod.utils.create_directory(tmp_dir)
+        for root, dirs, files in os.walk(self.template_model_dir):
+            dirs[:] = [ d for d in dirs if d != '__pycache__' ]
+            for name in files:
+                if name in self.parametrised_model_files or name.endswith('.pyc'): continue
+                dst = osp.join(tmp_dir, osp.relpath(osp.join(root, name), self.template_model_dir))
+                if not osp.isdir(osp.dirname(dst)): os.makedirs(osp.dirname(dst))
+                shutil.copyfile(osp.join(root, name), dst)
+                # Read-only, so an accidental in-place edit cannot change every linked model dir
+                os.chmod(dst, 0o444)
+        try:
+            os.rename(tmp_dir, shared_dir)
+        except OSError:
+            if not osp.isdir(shared_dir): raise
+            logger.info('Shared template model was created concurrently; using that one')
+            shutil.rmtree(tmp_dir)
+        return shared_dir
+
     def create_model_dir(self):
         created = svjgenprod.utils.create_directory(self.new_model_dir, force=self.force_renew_model_dir)
         if not created:
             logger.info('Not re-copying in template files')
             return
-        # Copy model files to new directory and change relevant parameters according to config
-        logger.info('Copying template model: {0} to {1}'.format(self.template_model_dir, self.new_model_dir))
-        copy_tree(self.template_model_dir, self.new_model_dir)
-        # Read the parameters file (containing the dark particle masses) in the new model directory
-        with open(os.path.join(self.new_model_dir, 'parameters.py'), 'r+') as f:
+        if self.link_template_model:
+            svjgenprod.utils.link_tree(
+                self.get_shared_template_model_dir(), self.new_model_dir,
+                exclude = self.parametrised_model_files
+                )
+        else:
+            logger.info('Copying template model: {0} to {1}'.format(self.template_model_dir, self.new_model_dir))
+            copy_tree(self.template_model_dir, self.new_model_dir)
+        # Fill the placeholders for the dark particle masses in the parameters file
+        with open(osp.join(self.template_model_dir, 'parameters.py'), 'r') as f:
             old_params = Template(f.read())
-            # Fill placeholders with values chosen by user
-            new_params = old_params.substitute(dark_quark_mass=str(self.m_d), mediator_mass=str(self.m_med))
-            f.seek(0)
-            f.truncate()
+        new_params = old_params.substitute(dark_quark_mass=str(self.m_d), mediator_mass=str(self.m_med))
+        with open(osp.join(self.new_model_dir, 'parameters.py'), 'w') as f:
             f.write(new_params)
         logger.info('New parameters written in model files!')
 
     def write_param_card(self):
         logger.info('Writing param_card.dat')
-        # Use the write_param_card.py module that is in the newly created model_dir
-        sys.path.append(self.new_model_dir)
-        from write_param_card import ParamCardWriter
+        # Use the write_param_card.py module that is in the newly created model_dir,
+        # imported in isolation so other points in the same process do not interfere
         param_card_file = osp.join(self.new_model_dir, 'param_card.dat')
-        ParamCardWriter(param_card_file, generic=True)
+        svjgenprod.ufomodel.write_param_card(self.new_model_dir, param_card_file)
         logger.info('Done writing param_card.dat')
 
     def setup_input_dir(self):
@@ -186,7 +272,9 @@ class GridpackGenerator(object):
                 input_cards_dir_relative,
                 ]
             try:
+                t0 = time.time()
                 svjgenprod.utils.run_command(cmd, env=env)
+                self.compile_time = time.time() - t0
                 if self.cleanup_gp_generation_dir:
                     logger.warning('Deleting %s', self.model_name)
                     shutil.rmtree(self.model_name)
@@ -202,9 +290,41 @@ class GridpackGenerator(object):
                     logger.warning('File {0} does not exist'.format(self.logfile))
                 raise
 
+    def repack_gridpack(self, compression=None, threads=None):
+        """
+        Recompresses the single-threaded .tar.xz gridpack(s) produced by
+        gridpack_generation.sh with a multi-threaded compressor, and writes
+        an .index sidecar listing the tarball members
+        """
+        if compression is None: compression = self.repack_compression
+        if threads is None: threads = self.repack_threads
+        tarballs = glob.glob(osp.join(self.mg_genprod_dir, self.model_name + '*.tar.xz'))
+        if not tarballs:
+            raise RuntimeError(
+                'No gridpack found to repack in {0} for {1}'
+                .format(self.mg_genprod_dir, self.model_name)
+                )
+        return [
+            svjgenprod.compression.repack_tarball(
+                tarball, compression, threads=threads, remove_original=True
+                )
+            for tarball in tarballs
+            ]
+
     def get_mg_crosssection(self):
         return svjgenprod.utils.get_mg_crosssection_from_logfile(self.logfile)
 
+    def store_xsec(self):
+        """
+        Records the MadGraph cross section of the new gridpack in the cross section database
+        """
+        try:
+            # Only the gridpack parameters are needed, so no full SampleSpec
+            # (which would need e.g. n_f)
+            svjgenprod.xsecdb.store_xsec_from_logfile(self.config, self.logfile)
+        except (ValueError, IOError):
+            logger.error('Could not store the cross section of {0}'.format(self.model_name))
+
     def _get_output_files_and_dirs(self):
         """
         Collects all files to be copied into a list, and makes a destination dir
@@ -239,6 +359,7 @@ class GridpackGenerator(object):
     def _transfer_to_output(self, move=False, output_dir=None, dry=False):
         srcs = self._get_output_files_and_dirs()
         output_dir = self._make_output_directory(output_dir)
+        tarballs = []
         for src in srcs:
             dst = osp.join(output_dir, osp.basename(src))
             if move:
@@ -252,6 +373,25 @@ class GridpackGenerator(object):
             if src.endswith('.log'):
                 logger.info('Log file now in {0}'.format(dst))
                 self.logfile = osp.abspath(dst)
+            elif any(src.endswith(ext) for ext in svjgenprod.compression.TARBALL_COMPRESSIONS):
+                tarballs.append(osp.abspath(dst))
+        if not dry:
+            for tarball in tarballs:
+                self.record_in_catalog(tarball)
+
+    def record_in_catalog(self, tarball):
+        if self.catalog_file is None: return
+        try:
+            xsec = self.get_mg_crosssection()
+        except (ValueError, IOError, AttributeError):
+            logger.warning('No cross section available for {0}'.format(tarball))
+            xsec = None
+        svjgenprod.catalog.record_artifact(
+            self.config.to_spec(), 'gridpack', tarball,
+            catalog_file = self.catalog_file,
+            xsec = xsec,
+            wall_time = self.compile_time,
+            )
 
 
     def copy_to_output(self, output_dir=None, dry=False):
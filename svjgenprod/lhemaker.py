@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
-import os, shutil, sys, glob, subprocess, re, logging
+import os, shutil, sys, glob, subprocess, re, logging, time
 import os.path as osp
 from time import strftime
 
@@ -34,6 +34,21 @@ class LHEMaker(object):
 
         self.log_file = osp.join(osp.dirname(self.tarball), self.model_name + '.log')
         self.force_renew_tarball = True
+        # 0 means use all available cores
+        self.decompression_threads = 0
+        # Write a sidecar with the byte offsets of the events (needs numpy)
+        self.write_lhe_index = False
+        # Set to 'gzip' or 'zstd' to write the output .lhe file compressed
+        self.lhe_compression = None
+        self.compression_threads = 0
+        # Check the event count and closing tag of the generated .lhe file
+        self.validate_lhe_output = True
+        # Write a physics summary (.summary.json and .summary.npz) of the output (needs numpy)
+        self.write_lhe_summary = False
+        # Catalog (.npz or .parquet) in which copy_to_output/move_to_output record
+        # the output file; None means no catalog (see svjgenprod.catalog)
+        self.catalog_file = None
+        self.generation_time = None
 
     def get_process_type(self):
         match = re.match(r'\w+?_(\w)', osp.basename(self.tarball))
@@ -52,19 +67,11 @@ class LHEMaker(object):
 
     def get_mg_cross_section(self):
         """Gets the madgraph cross section from the log file that was created when creating the gridpack"""
-        with open(self.log_file) as f:
-            match = re.search(r'(?<=Cross-section :   )(\d*.\d+)', f.read())
-            if not match:
-                raise ValueError(
-                    'Could not determine cross section from log_file {0}'.format(self.log_file)
-                    )
-        xs = match.group(1)
-        logger.info('Found cross section {0} from log_file'.format(xs))
-        return xs
+        return svjgenprod.utils.get_mg_crosssection_from_logfile(self.log_file)
 
     def extract_and_run_tarball(self):
         copied_tarball = osp.join(self.run_gridpack_dir, osp.basename(self.tarball))
-        extracted_tarball = copied_tarball.replace('.tar.xz', '')
+        extracted_tarball = svjgenprod.compression.strip_tarball_extension(copied_tarball)
         self.copy_tarball(copied_tarball)
         self.extract_tarball(copied_tarball, dst = extracted_tarball)
         self.run_lhe_generation(extracted_tarball)
@@ -73,6 +80,10 @@ class LHEMaker(object):
         def copy():
             logger.warning('Copying {0} ==> {1}'.format(self.tarball, dst))
             shutil.copyfile(self.tarball, dst)
+            # Keep the index sidecar (if any) next to the copy, so extract_tarball can check it
+            index_file = svjgenprod.compression.get_index_file(self.tarball)
+            if osp.isfile(index_file):
+                shutil.copyfile(index_file, svjgenprod.compression.get_index_file(dst))
         svjgenprod.utils.create_directory(osp.dirname(dst))
         if osp.isfile(dst):
             if self.force_renew_tarball:
@@ -86,15 +97,22 @@ class LHEMaker(object):
         return dst
 
     def extract_tarball(self, tarball, dst=None):
-        if not tarball.endswith('.tar.xz'):
-            raise ValueError('Unexpected file extension for tarball {0}'.format(tarball))
-        if dst is None: dst = tarball.replace('.tar.xz', '')
+        """
+        Extracts a .tar.xz or .tar.zst gridpack using multi-threaded decompression
+        """
+        if dst is None: dst = svjgenprod.compression.strip_tarball_extension(tarball)
+
+        # If the gridpack was repacked with an index, check it before spending time on extraction
+        members = svjgenprod.compression.read_tarball_index(tarball)
+        if not(members is None) and not any(osp.basename(m) == 'runcmsgrid.sh' for m in members):
+            raise RuntimeError(
+                'Index of {0} does not list \'runcmsgrid.sh\''
+                .format(tarball)
+                )
 
         newly_created = svjgenprod.utils.create_directory(dst, force=self.force_renew_tarball)
         if newly_created:
-            logger.warning('Extracting tarball')
-            cmd = [ 'tar', 'xf', tarball, '--directory', dst ]
-            svjgenprod.utils.run_command(cmd)
+            svjgenprod.compression.extract_tarball(tarball, dst, threads=self.decompression_threads)
             logger.info('Done extracting tarball')
 
         return dst
@@ -105,26 +123,81 @@ class LHEMaker(object):
                 'File \'runcmsgrid.sh\' does not exist in {0}'
                 .format(extracted_tarball)
                 )
+        t0 = time.time()
         with svjgenprod.utils.switchdir(extracted_tarball):
             cmd = [ 'bash', 'runcmsgrid.sh', str(self.n_events), str(self.seed) ]
             svjgenprod.utils.run_command(cmd)
-        self.out_lhe_file = osp.join(extracted_tarball, 'cmsgrid_final.lhe')
-        self.replace_pids(self.out_lhe_file)
+        self.generation_time = time.time() - t0
+        lhe_file = osp.join(extracted_tarball, 'cmsgrid_final.lhe')
+        if self.validate_lhe_output:
+            svjgenprod.lhetools.validate_lhe(lhe_file, self.n_events)
+        self.out_lhe_file = self.replace_pids(lhe_file)
+        if self.write_lhe_summary:
+            self.summarize_lhe()
+
+    def summarize_lhe(self):
+        """
+        Writes event count, weight sum, mediator mass and dark quark multiplicity
+        histograms next to the output .lhe file
+        """
+        if self.process_type.startswith('s'):
+            mediator_pids = [ 4900023 ]
+            dark_quark_pids = [ 4900101 ]
+        else:
+            raise NotImplementedError
+        return svjgenprod.lhetools.summarize_lhe(
+            self.out_lhe_file, mediator_pids=mediator_pids, dark_quark_pids=dark_quark_pids
+            )
 
     def replace_pids(self, lhe_file):
-        logger.info('Going to replace pids. Opening {0} and reading contents'.format(lhe_file))
-        with open(lhe_file, 'r') as f:
-            contents = f.read()
-        def replace(contents, src, dst):
-            logger.info('Replacing "{0}" ==> "{1}"'.format(src, dst))
-            return contents.replace(src, dst)
+        """
+        Streams through the .lhe file replacing the pids, and optionally
+        records the byte offsets of the events in an index sidecar.
+        If self.lhe_compression is set, the output is written compressed
+        (as <lhe_file>.gz or <lhe_file>.zst) and the uncompressed file is removed.
+        Returns the path to the output file.
+        """
         if self.config['process_type'].startswith('s'):
-            contents = replace(contents, '5000521', '4900101')
+            replacements = [ (b'5000521', b'4900101') ]
         else:
             raise NotImplementedError
-        logger.warning('Overwriting {0} with replacements'.format(lhe_file))
-        with open(lhe_file, 'w') as f:
-            f.write(contents)
+        for src, dst in replacements:
+            logger.info('Replacing "{0}" ==> "{1}"'.format(src.decode(), dst.decode()))
+
+        if self.lhe_compression is None:
+            out_file = lhe_file
+            tmp_file = lhe_file + '.tmp'
+        else:
+            out_file = lhe_file + svjgenprod.compression.get_compression_extension(self.lhe_compression)
+            tmp_file = out_file
+        offsets = []
+        end_of_events = None
+        offset = 0
+        logger.info('Going to replace pids in {0}'.format(lhe_file))
+        f_out = svjgenprod.compression.open_file(tmp_file, 'wb', threads=self.compression_threads)
+        with open(lhe_file, 'rb') as f_in, f_out:
+            for line in f_in:
+                for src, dst in replacements:
+                    line = line.replace(src, dst)
+                if self.write_lhe_index:
+                    stripped = line.lstrip()
+                    if stripped.startswith(b'<event'):
+                        offsets.append(offset)
+                    elif stripped.startswith(b'</event>'):
+                        end_of_events = offset + len(line)
+                f_out.write(line)
+                offset += len(line)
+        if self.lhe_compression is None:
+            logger.warning('Overwriting {0} with replacements'.format(lhe_file))
+            os.rename(tmp_file, lhe_file)
+        else:
+            logger.info('Wrote {0}; removing uncompressed {1}'.format(out_file, lhe_file))
+            os.remove(lhe_file)
+
+        if self.write_lhe_index:
+            if offsets: offsets.append(end_of_events)
+            svjgenprod.lhetools.write_index(out_file, offsets)
+        return out_file
 
     def _get_dst(self, output_dir, dry):
         """
@@ -137,15 +210,41 @@ class LHEMaker(object):
             output_dir,
             'lhe_{0}_N{1}_seed{2}.lhe'.format(self.model_name, self.n_events, self.seed)
             )
+        # Keep the compression extension of the output file, if any
+        dst += self.out_lhe_file[len(svjgenprod.compression.strip_compression_extension(self.out_lhe_file)):]
         return dst
 
+    def _get_sidecars(self, dst):
+        """
+        Returns (src, dst) pairs for the sidecar files that go along with the .lhe file
+        """
+        sidecars = zip(
+            [ svjgenprod.lhetools.get_index_file(self.out_lhe_file) ] + list(svjgenprod.lhetools.get_summary_files(self.out_lhe_file)),
+            [ svjgenprod.lhetools.get_index_file(dst) ] + list(svjgenprod.lhetools.get_summary_files(dst))
+            )
+        return [ (src, dst) for src, dst in sidecars if osp.isfile(src) ]
+
     def copy_to_output(self, output_dir=None, dry=False):
         dst = self._get_dst(output_dir, dry)
-        logger.info('Copying {0} ==> {1}'.format(self.out_lhe_file, dst))
-        if not dry: shutil.copyfile(self.out_lhe_file, dst)
+        for src_file, dst_file in [ (self.out_lhe_file, dst) ] + self._get_sidecars(dst):
+            logger.info('Copying {0} ==> {1}'.format(src_file, dst_file))
+            if not dry: shutil.copyfile(src_file, dst_file)
+        if not dry: self.record_in_catalog(dst)
 
     def move_to_output(self, output_dir=None, dry=False):
         dst = self._get_dst(output_dir, dry)
-        logger.info('Moving {0} ==> {1}'.format(self.out_lhe_file, dst))
-        if not dry: shutil.move(self.out_lhe_file, dst)
+        for src_file, dst_file in [ (self.out_lhe_file, dst) ] + self._get_sidecars(dst):
+            logger.info('Moving {0} ==> {1}'.format(src_file, dst_file))
+            if not dry: shutil.move(src_file, dst_file)
+        if not dry: self.record_in_catalog(dst)
+
+    def record_in_catalog(self, lhe_file):
+        if self.catalog_file is None: return
+        svjgenprod.catalog.record_artifact(
+            self.config.to_spec(), 'lhe', lhe_file,
+            catalog_file = self.catalog_file,
+            n_events = self.n_events,
+            seed = self.seed,
+            wall_time = self.generation_time,
+            )
 
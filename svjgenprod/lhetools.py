@@ -0,0 +1,656 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, math, mmap, json
+from multiprocessing.pool import ThreadPool
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        logger.error(
+            'numpy is not installed; install it with \'pip install numpy\' '
+            'to use LHE event index files.'
+            )
+        raise ImportError('No module named numpy')
+
+
+class LHEInit(object):
+    """
+    The <init> block of an LHE file: the beam line, one line per process
+    (XSECUP, XERRUP, XMAXUP, LPRUP), and any further lines kept verbatim
+    """
+    def __init__(self, beam, processes, extra=None):
+        super(LHEInit, self).__init__()
+        self.beam = beam
+        self.processes = processes
+        self.extra = [] if extra is None else extra
+
+    @classmethod
+    def from_lines(cls, lines):
+        lines = [ l.decode('utf-8') if isinstance(l, bytes) else l for l in lines ]
+        lines = [ l for l in lines if l.strip() ]
+        beam = lines[0].split()
+        n_processes = int(beam[9])
+        processes = []
+        for line in lines[1:1+n_processes]:
+            xsecup, xerrup, xmaxup, lprup = line.split()[:4]
+            processes.append([ float(xsecup), float(xerrup), float(xmaxup), int(lprup) ])
+        return cls(beam, processes, [ l.rstrip('\n') for l in lines[1+n_processes:] ])
+
+    def get_process(self, lprup):
+        for process in self.processes:
+            if process[3] == lprup: return process
+        raise KeyError('No process {0} in <init> block'.format(lprup))
+
+    def to_string(self):
+        self.beam[9] = str(len(self.processes))
+        lines = [ '<init>', ' ' + ' '.join(self.beam) ]
+        for xsecup, xerrup, xmaxup, lprup in self.processes:
+            lines.append(' {0:.7e} {1:.7e} {2:.7e} {3}'.format(xsecup, xerrup, xmaxup, lprup))
+        lines.extend(self.extra)
+        lines.append('</init>')
+        return '\n'.join(lines) + '\n'
+
+
+class LHEScan(object):
+    """
+    Result of a single streaming pass over an LHE file.
+    offsets has n_events+1 entries: the byte offset of every <event> tag, and
+    as last entry the offset right after the last </event> line, so that
+    events k..k+n span bytes offsets[k] to offsets[k+n].
+    """
+    def __init__(self, lhe_file, header, init, offsets, process_ids, weights):
+        super(LHEScan, self).__init__()
+        self.lhe_file = lhe_file
+        self.header = header
+        self.init = init
+        self.offsets = offsets
+        self.process_ids = process_ids
+        self.weights = weights
+
+    @property
+    def n_events(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def weight_sums(self, start=0, stop=None):
+        """
+        Returns a dict process id -> sum of weights, for events start:stop
+        """
+        sums = {}
+        for process_id, weight in zip(self.process_ids[start:stop], self.weights[start:stop]):
+            sums[process_id] = sums.get(process_id, 0.) + weight
+        return sums
+
+
+def scan_lhe(lhe_file):
+    """
+    Streams through an LHE file once, collecting the header, the <init> block,
+    and per event the byte offset, process id and weight
+    """
+    logger.info('Scanning {0}'.format(lhe_file))
+    header = []
+    init_lines = None
+    offsets = []
+    process_ids = []
+    weights = []
+    end_of_events = None
+    in_init = False
+    expect_event_info = False
+
+    offset = 0
+    with svjgenprod.compression.open_file(lhe_file, 'rb') as f:
+        for line in f:
+            stripped = line.lstrip()
+            if expect_event_info:
+                info = stripped.split()
+                process_ids.append(int(info[1]))
+                weights.append(float(info[2]))
+                expect_event_info = False
+            elif stripped.startswith(b'<event'):
+                offsets.append(offset)
+                expect_event_info = True
+            elif stripped.startswith(b'</event>'):
+                end_of_events = offset + len(line)
+            elif init_lines is None:
+                if stripped.startswith(b'<init>'):
+                    init_lines = []
+                    in_init = True
+                else:
+                    header.append(line)
+            elif in_init:
+                if stripped.startswith(b'</init>'):
+                    in_init = False
+                else:
+                    init_lines.append(line)
+            offset += len(line)
+
+    if init_lines is None:
+        raise ValueError('No <init> block found in {0}'.format(lhe_file))
+    if offsets and end_of_events is None:
+        raise ValueError('No closing </event> tag found in {0}'.format(lhe_file))
+    if offsets: offsets.append(end_of_events)
+    logger.info('Found {0} events in {1}'.format(len(process_ids), lhe_file))
+    return LHEScan(
+        lhe_file, b''.join(header), LHEInit.from_lines(init_lines),
+        offsets, process_ids, weights
+        )
+
+
+def _copy_range(src, dst, start, end, blocksize=1024*1024):
+    """
+    Copies bytes start:end of the open file src to the open file dst
+    """
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = src.read(min(blocksize, remaining))
+        if not block:
+            raise IOError('Unexpected end of file while copying byte range {0}:{1}'.format(start, end))
+        dst.write(block)
+        remaining -= len(block)
+
+
+def _write_lhe(out_file, header, init, ranges):
+    """
+    Writes header, <init> block and the event byte ranges [(lhe_file, start, end), ...].
+    Byte offsets always refer to the uncompressed contents; for compressed
+    input files the skipped part is decompressed and discarded.
+    """
+    with svjgenprod.compression.open_file(out_file, 'wb') as out:
+        out.write(header)
+        out.write(init.to_string().encode('utf-8'))
+        for lhe_file, start, end in ranges:
+            with svjgenprod.compression.open_file(lhe_file, 'rb') as src:
+                _copy_range(src, out, start, end)
+        out.write(b'</LesHouchesEvents>\n')
+    return out_file
+
+
+def merge_lhe(lhe_files, out_file, n_threads=4):
+    """
+    Merges LHE files (e.g. the lhe_{model}_N{n}_seed{seed}.lhe outputs of
+    several LHEMaker jobs) into one, streaming the events.
+    The header is taken from the first file. Weights are assumed normalized as
+    'average' (event_norm in the run cards of this package), so per process
+    XSECUP becomes the summed weight over the total number of events, XERRUP
+    the event-weighted combination of the input errors, and XMAXUP the maximum.
+    """
+    if not lhe_files:
+        raise ValueError('No LHE files to merge')
+    pool = ThreadPool(n_threads)
+    try:
+        scans = pool.map(scan_lhe, lhe_files)
+    finally:
+        pool.close()
+
+    n_events = sum(scan.n_events for scan in scans)
+    if n_events == 0:
+        raise ValueError('No events in any of the LHE files to merge')
+    weight_sums = {}
+    squared_errors = {}
+    xmaxups = {}
+    for scan in scans:
+        if scan.init.beam[:8] != scans[0].init.beam[:8]:
+            raise ValueError(
+                'Incompatible beams in {0} and {1}'
+                .format(scan.lhe_file, scans[0].lhe_file)
+                )
+        for process_id, weight_sum in scan.weight_sums().items():
+            weight_sums[process_id] = weight_sums.get(process_id, 0.) + weight_sum
+        for xsecup, xerrup, xmaxup, lprup in scan.init.processes:
+            squared_errors[lprup] = squared_errors.get(lprup, 0.) + (scan.n_events * xerrup)**2
+            xmaxups[lprup] = max(xmaxups.get(lprup, 0.), xmaxup)
+
+    init = LHEInit(list(scans[0].init.beam), [], scans[0].init.extra)
+    for lprup in sorted(set(xmaxups) | set(weight_sums)):
+        init.processes.append([
+            weight_sums.get(lprup, 0.) / n_events,
+            math.sqrt(squared_errors.get(lprup, 0.)) / n_events,
+            xmaxups.get(lprup, 0.),
+            lprup
+            ])
+
+    logger.info('Merging {0} events from {1} files into {2}'.format(n_events, len(lhe_files), out_file))
+    ranges = [ (scan.lhe_file, scan.offsets[0], scan.offsets[-1]) for scan in scans if scan.n_events > 0 ]
+    return _write_lhe(out_file, scans[0].header, init, ranges)
+
+
+def split_lhe(lhe_file, n_events_per_chunk, out_files=None, scan=None, n_threads=4):
+    """
+    Splits an LHE file into chunks of n_events_per_chunk events (the last
+    chunk may be smaller), e.g. to feed several FullSimRunnerGenSim jobs.
+    Pass a previously obtained LHEScan as `scan` to skip scanning the file;
+    if not given and the file has an event index sidecar, the index is used.
+    Every chunk gets its own <init> block, with XSECUP recomputed from the
+    weights in the chunk and XERRUP scaled with the number of events.
+    The chunks are written in parallel, one writer per chunk.
+    Returns the list of written files.
+    """
+    if scan is None:
+        compressed = not(svjgenprod.compression.get_file_compression(lhe_file) is None)
+        if osp.isfile(get_index_file(lhe_file)) and not compressed:
+            with LHEIndexedReader(lhe_file) as reader:
+                scan = reader.scan()
+        else:
+            scan = scan_lhe(lhe_file)
+    if n_events_per_chunk <= 0:
+        raise ValueError('n_events_per_chunk should be positive')
+    starts = list(range(0, scan.n_events, n_events_per_chunk))
+    if out_files is None:
+        base = svjgenprod.compression.strip_compression_extension(lhe_file)
+        ext = lhe_file[len(base):]
+        if base.endswith('.lhe'): base = base[:-len('.lhe')]
+        out_files = [ '{0}_chunk{1}.lhe{2}'.format(base, i, ext) for i in range(len(starts)) ]
+    elif len(out_files) != len(starts):
+        raise ValueError(
+            'Got {0} output files, but {1} events split in chunks of {2} gives {3} chunks'
+            .format(len(out_files), scan.n_events, n_events_per_chunk, len(starts))
+            )
+
+    def write_chunk(i):
+        start = starts[i]
+        stop = min(start + n_events_per_chunk, scan.n_events)
+        n = stop - start
+        weight_sums = scan.weight_sums(start, stop)
+        init = LHEInit(list(scan.init.beam), [], scan.init.extra)
+        for xsecup, xerrup, xmaxup, lprup in scan.init.processes:
+            init.processes.append([
+                weight_sums.get(lprup, 0.) / n,
+                xerrup * math.sqrt(float(scan.n_events) / n),
+                xmaxup,
+                lprup
+                ])
+        return _write_lhe(
+            out_files[i], scan.header, init,
+            [ (lhe_file, scan.offsets[start], scan.offsets[stop]) ]
+            )
+
+    logger.info('Splitting {0} events of {1} into {2} chunks'.format(scan.n_events, lhe_file, len(starts)))
+    pool = ThreadPool(n_threads)
+    try:
+        return pool.map(write_chunk, range(len(starts)))
+    finally:
+        pool.close()
+
+
+#____________________________________________________________________
+# Validation
+
+END_TAG = b'</LesHouchesEvents>'
+
+
+def _count_in_buffer(buf, tag, start=0, end=None):
+    """
+    Counts occurrences of tag in buf (bytes or mmap) using repeated find,
+    which is a memchr/memcmp scan in C and does not copy the buffer
+    """
+    if end is None: end = len(buf)
+    n = 0
+    i = buf.find(tag, start, end)
+    while i != -1:
+        n += 1
+        i = buf.find(tag, i + len(tag), end)
+    return n
+
+
+def count_lhe_events(lhe_file, blocksize=16*1024*1024):
+    """
+    Counts the <event ...> and </event> tags of an LHE file, and checks whether the
+    file ends with the closing </LesHouchesEvents> tag.
+    Plain files are memory mapped; compressed files are scanned in blocks.
+    Returns (n_opening_tags, n_closing_tags, has_end_tag).
+    """
+    # Also matches <event npLO=...> style tags
+    open_tag = b'<event'
+    close_tag = b'</event>'
+    if svjgenprod.compression.get_file_compression(lhe_file) is None:
+        with open(lhe_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0, 0, False
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                n_open = _count_in_buffer(mm, open_tag)
+                n_close = _count_in_buffer(mm, close_tag)
+                tail = mm[max(0, len(mm) - 1024):]
+            finally:
+                mm.close()
+    else:
+        # Keep the last len(tag)-1 bytes of the previous block so tags spanning
+        # two blocks are counted exactly once
+        overlap = max(len(open_tag), len(close_tag), len(END_TAG))
+        n_open = n_close = 0
+        tail = b''
+        with svjgenprod.compression.open_file(lhe_file, 'rb') as f:
+            while True:
+                block = f.read(blocksize)
+                if not block: break
+                buf = tail + block
+                # Only count tags that end inside the new block
+                n_open += _count_in_buffer(buf, open_tag, max(0, len(tail) - len(open_tag) + 1))
+                n_close += _count_in_buffer(buf, close_tag, max(0, len(tail) - len(close_tag) + 1))
+                tail = buf[-max(overlap, 1024):]
+    has_end_tag = tail.rstrip().endswith(END_TAG)
+    return n_open, n_close, has_end_tag
+
+
+def validate_lhe(lhe_file, n_events=None):
+    """
+    Checks that lhe_file is complete: it ends with </LesHouchesEvents>, every
+    <event> is closed, and (if given) it contains exactly n_events events.
+    Raises RuntimeError otherwise; returns the number of events.
+    """
+    if not osp.isfile(lhe_file):
+        raise RuntimeError('LHE file {0} does not exist'.format(lhe_file))
+    n_open, n_close, has_end_tag = count_lhe_events(lhe_file)
+    problems = []
+    if not has_end_tag:
+        problems.append('it does not end with {0}'.format(END_TAG.decode()))
+    if n_open != n_close:
+        problems.append('it has {0} <event> but {1} </event> tags'.format(n_open, n_close))
+    if not(n_events is None) and n_close != n_events:
+        problems.append('it has {0} events instead of the expected {1}'.format(n_close, n_events))
+    if problems:
+        raise RuntimeError(
+            'LHE file {0} is invalid (probably truncated): {1}'
+            .format(lhe_file, '; '.join(problems))
+            )
+    logger.info('Validated {0}: {1} events'.format(lhe_file, n_close))
+    return n_close
+
+
+#____________________________________________________________________
+# Event index sidecar files
+
+def get_index_file(lhe_file):
+    """
+    The index of a compressed file is shared with the uncompressed file; the
+    offsets refer to the uncompressed contents
+    """
+    return svjgenprod.compression.strip_compression_extension(lhe_file) + '.idx.npy'
+
+
+def write_index(lhe_file, offsets):
+    """
+    Writes the event byte offsets (n_events+1 entries, see LHEScan) to the
+    sidecar index file of lhe_file
+    """
+    _require_numpy()
+    index_file = get_index_file(lhe_file)
+    logger.info('Writing event index {0} ({1} events)'.format(index_file, len(offsets) - 1))
+    # np.save would append .npy to a name not ending in .npy; write via a file object
+    with open(index_file, 'wb') as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    return index_file
+
+
+def build_index(lhe_file):
+    """
+    Creates the sidecar index for an existing LHE file
+    """
+    return write_index(lhe_file, scan_lhe(lhe_file).offsets)
+
+
+def load_index(lhe_file, mmap_mode='r'):
+    _require_numpy()
+    return np.load(get_index_file(lhe_file), mmap_mode=mmap_mode)
+
+
+class LHEIndexedReader(object):
+    """
+    Random access to the events of an LHE file using its sidecar index.
+    The LHE file and the index are memory mapped, so accessing events k..k+n
+    does not parse (or even read) anything before them.
+    """
+    def __init__(self, lhe_file):
+        super(LHEIndexedReader, self).__init__()
+        if not(svjgenprod.compression.get_file_compression(lhe_file) is None):
+            raise ValueError(
+                'Random access to {0} is not possible; it is compressed. '
+                'Use scan_lhe/split_lhe, or decompress it first.'
+                .format(lhe_file)
+                )
+        self.lhe_file = lhe_file
+        self.offsets = load_index(lhe_file)
+        self._f = open(lhe_file, 'rb')
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.offsets) > 1 and self.offsets[-1] > len(self._mm):
+            self.close()
+            raise ValueError(
+                'Index {0} points beyond the end of {1}; the index is stale'
+                .format(get_index_file(lhe_file), lhe_file)
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    @property
+    def n_events(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def _check_range(self, start, stop):
+        if stop is None: stop = self.n_events
+        if not(0 <= start <= stop <= self.n_events):
+            raise IndexError(
+                'Event range {0}:{1} out of bounds for {2} events'
+                .format(start, stop, self.n_events)
+                )
+        return start, stop
+
+    def get_preamble(self):
+        """
+        Returns everything before the first event (header and <init> block) as bytes
+        """
+        end = int(self.offsets[0]) if self.n_events else self._mm.rfind(b'</LesHouchesEvents>')
+        return self._mm[:end]
+
+    def get_events_bytes(self, start, stop=None):
+        """
+        Returns the raw bytes of events start:stop
+        """
+        start, stop = self._check_range(start, stop)
+        if start == stop: return b''
+        return self._mm[int(self.offsets[start]):int(self.offsets[stop])]
+
+    def iter_events(self, start=0, stop=None):
+        """
+        Yields the raw bytes of the events start:stop one by one
+        """
+        start, stop = self._check_range(start, stop)
+        for i in range(start, stop):
+            yield self._mm[int(self.offsets[i]):int(self.offsets[i+1])]
+
+    def write_range(self, out_file, start, stop=None):
+        """
+        Writes a valid LHE file with only events start:stop; the <init> block is copied as is
+        """
+        start, stop = self._check_range(start, stop)
+        with svjgenprod.compression.open_file(out_file, 'wb') as out:
+            out.write(self.get_preamble())
+            out.write(self.get_events_bytes(start, stop))
+            out.write(b'</LesHouchesEvents>\n')
+        return out_file
+
+    def scan(self):
+        """
+        Returns an LHEScan built from the index; only the first line of
+        every event is read, to get the process id and weight
+        """
+        preamble = self.get_preamble().splitlines(True)
+        i_init = [ i for i, l in enumerate(preamble) if l.lstrip().startswith(b'<init>') ][0]
+        i_end_init = [ i for i, l in enumerate(preamble) if l.lstrip().startswith(b'</init>') ][0]
+        process_ids = []
+        weights = []
+        for offset in self.offsets[:-1]:
+            begin = self._mm.find(b'\n', int(offset)) + 1
+            info = self._mm[begin:self._mm.find(b'\n', begin)].split()
+            process_ids.append(int(info[1]))
+            weights.append(float(info[2]))
+        return LHEScan(
+            self.lhe_file, b''.join(preamble[:i_init]),
+            LHEInit.from_lines(preamble[i_init+1:i_end_init]),
+            [ int(o) for o in self.offsets ], process_ids, weights
+            )
+
+
+#____________________________________________________________________
+# Physics summary
+
+def get_summary_files(lhe_file):
+    """
+    Returns the paths of the .json and .npz summary files of lhe_file
+    """
+    base = svjgenprod.compression.strip_compression_extension(lhe_file)
+    return base + '.summary.json', base + '.summary.npz'
+
+
+def summarize_lhe(
+        lhe_file,
+        mediator_pids=(4900023,),
+        dark_quark_pids=(4900101,),
+        mass_bins=100,
+        write=True,
+        ):
+    """
+    Computes summary statistics of an LHE file in one streaming pass:
+    event count, weight sum, the mass of the (first) mediator per event,
+    and the number of dark quarks per event.
+    Per-particle work is limited to reading the pid; the mass is only parsed
+    for mediator lines. The per-event values are collected in numpy arrays,
+    from which the histograms are made.
+    If write is True, the summary is written as <lhe>.summary.json, and the
+    per-event arrays and histograms as <lhe>.summary.npz.
+    Returns the summary as a dict.
+    """
+    _require_numpy()
+    mediator_pids = set(str(abs(pid)).encode() for pid in mediator_pids)
+    dark_quark_pids = set(str(abs(pid)).encode() for pid in dark_quark_pids)
+
+    weights = []
+    mediator_masses = []
+    n_dark_quarks = []
+    init_lines = None
+    in_init = False
+    # -1: outside event, 0: expecting the event info line, >0: particle lines left,
+    # -2: past the particle lines of the current event
+    n_particles_left = -1
+    mediator_mass = np.nan
+    n_dark = 0
+
+    logger.info('Summarizing {0}'.format(lhe_file))
+    # Parsing all particle lines into an array with np.fromstring is slower
+    # than this loop: converting all 13 columns costs more than splitting off
+    # the pid, and the mass is only needed for the mediator lines
+    with svjgenprod.compression.open_file(lhe_file, 'rb') as f:
+        for line in f:
+            if n_particles_left > 0:
+                pid = line.split(None, 1)[0].lstrip(b'-')
+                if pid in dark_quark_pids:
+                    n_dark += 1
+                elif pid in mediator_pids and mediator_mass != mediator_mass:
+                    mediator_mass = float(line.split()[10])
+                n_particles_left -= 1
+                if n_particles_left == 0:
+                    mediator_masses.append(mediator_mass)
+                    n_dark_quarks.append(n_dark)
+                    # Skip optional blocks (e.g. <mgrwt>) until </event>
+                    n_particles_left = -2
+            elif n_particles_left == 0:
+                # Event info line
+                info = line.split()
+                n_particles_left = int(info[0])
+                weights.append(float(info[2]))
+                mediator_mass = np.nan
+                n_dark = 0
+                if n_particles_left == 0:
+                    mediator_masses.append(mediator_mass)
+                    n_dark_quarks.append(n_dark)
+                    n_particles_left = -2
+            elif in_init:
+                if line.lstrip().startswith(b'</init>'):
+                    in_init = False
+                else:
+                    init_lines.append(line)
+            else:
+                stripped = line.lstrip()
+                if stripped.startswith(b'<event'):
+                    n_particles_left = 0
+                elif stripped.startswith(b'<init>'):
+                    init_lines = []
+                    in_init = True
+            if line.lstrip().startswith(b'</event>'):
+                n_particles_left = -1
+
+    weights = np.array(weights, dtype=np.float64)
+    mediator_masses = np.array(mediator_masses, dtype=np.float64)
+    n_dark_quarks = np.array(n_dark_quarks, dtype=np.int32)
+    has_mediator = ~np.isnan(mediator_masses)
+
+    summary = {
+        'lhe_file': lhe_file,
+        'n_events': int(weights.size),
+        'weight_sum': float(weights.sum()),
+        'weight_mean': float(weights.mean()) if weights.size else 0.,
+        'n_events_with_mediator': int(has_mediator.sum()),
+        }
+    if init_lines:
+        init = LHEInit.from_lines(init_lines)
+        summary['xsec'] = sum(p[0] for p in init.processes)
+        summary['xsec_error'] = math.sqrt(sum(p[1]**2 for p in init.processes))
+
+    arrays = {
+        'weights': weights,
+        'mediator_mass': mediator_masses,
+        'n_dark_quarks': n_dark_quarks,
+        }
+    if has_mediator.any():
+        masses = mediator_masses[has_mediator]
+        counts, edges = np.histogram(masses, bins=mass_bins)
+        i_peak = int(np.argmax(counts))
+        summary['mediator_mass'] = {
+            'mean': float(masses.mean()),
+            'std': float(masses.std()),
+            'peak': float(0.5*(edges[i_peak] + edges[i_peak+1])),
+            'counts': counts.tolist(),
+            'edges': edges.tolist(),
+            }
+        arrays['mediator_mass_counts'] = counts
+        arrays['mediator_mass_edges'] = edges
+    multiplicity = np.bincount(n_dark_quarks) if n_dark_quarks.size else np.zeros(0, dtype=np.int64)
+    summary['dark_quark_multiplicity'] = multiplicity.tolist()
+    arrays['dark_quark_multiplicity'] = multiplicity
+
+    logger.info(
+        'Summary of {0}: {1} events, weight sum {2:.4g}, mediator mass peak {3}, '
+        'dark quark multiplicity {4}'
+        .format(
+            lhe_file, summary['n_events'], summary['weight_sum'],
+            summary['mediator_mass']['peak'] if 'mediator_mass' in summary else None,
+            summary['dark_quark_multiplicity']
+            )
+        )
+
+    if write:
+        json_file, npz_file = get_summary_files(lhe_file)
+        logger.info('Writing {0} and {1}'.format(json_file, npz_file))
+        with open(json_file, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        with open(npz_file, 'wb') as f:
+            np.savez(f, **arrays)
+    return summary
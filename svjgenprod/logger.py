@@ -1,4 +1,5 @@
 import logging
+import os.path as osp
 from .termcolor import colored
 
 
@@ -30,6 +31,8 @@ def setup_subprocess_logger(name=DEFAULT_SUBPROCESS_LOGGER_NAME):
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
     logger.addHandler(handler)
+    # In Python 3, getLogger('root') is the actual root logger; don't log lines twice
+    logger.propagate = False
     return logger
 
 
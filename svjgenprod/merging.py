@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, shutil, glob, fnmatch, hashlib, re, subprocess, tempfile
+from multiprocessing.pool import ThreadPool
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+
+# Tools to merge ROOT files; edmCopyPickMerge keeps the EDM metadata (runs,
+# lumis, provenance), haddnano.py handles the NanoAOD metadata trees
+MERGE_TOOLS = [ 'edmCopyPickMerge', 'haddnano.py', 'hadd' ]
+
+
+def is_remote(path):
+    return path.startswith('root://') or path.startswith('/store')
+
+
+def get_edm_path(path):
+    """
+    Local files need the file: prefix; root:// urls and /store lfns are passed as is
+    """
+    if is_remote(path): return path
+    return 'file:' + osp.abspath(path)
+
+
+def get_merge_cmd(input_files, output_file, tool='edmCopyPickMerge'):
+    """
+    Returns the command (list) that merges input_files into output_file
+    """
+    if tool == 'edmCopyPickMerge':
+        return [
+            'edmCopyPickMerge',
+            'outputFile={0}'.format(output_file),
+            'inputFiles={0}'.format(','.join(get_edm_path(f) for f in input_files)),
+            ]
+    elif tool == 'haddnano.py':
+        return [ 'haddnano.py', output_file ] + list(input_files)
+    elif tool == 'hadd':
+        return [ 'hadd', '-f', output_file ] + list(input_files)
+    raise ValueError('Unknown merge tool {0}; choose from {1}'.format(tool, MERGE_TOOLS))
+
+
+# Prints '<n> events' for a NanoAOD file (edmFileUtil cannot read those)
+_COUNT_NANO_EVENTS = (
+    'import sys, ROOT; '
+    'f = ROOT.TFile.Open(sys.argv[1]); '
+    'print(\'{0} events\'.format(f.Get(\'Events\').GetEntries()))'
+    )
+
+
+def get_count_events_cmd(tool='edmCopyPickMerge'):
+    """
+    Returns a command (list) that prints '<n> events' for a file appended to it
+    """
+    if tool == 'edmCopyPickMerge':
+        return [ 'edmFileUtil' ]
+    return [ 'python', '-c', _COUNT_NANO_EVENTS ]
+
+
+def count_events(root_file, count_cmd, env=None):
+    output = subprocess.check_output(count_cmd + [ root_file ], env=env, universal_newlines=True)
+    match = re.search(r'(\d+) events', output)
+    if not match:
+        raise ValueError('Could not read the number of events of {0} from:\n{1}'.format(root_file, output))
+    return int(match.group(1))
+
+
+def group_files(files, target_size):
+    """
+    Groups (path, size) pairs, in the given order, into groups whose summed
+    size stays below target_size. Files larger than target_size get their own group.
+    """
+    groups = []
+    group = []
+    group_size = 0
+    for path, size in files:
+        if group and group_size + size > target_size:
+            groups.append(group)
+            group = []
+            group_size = 0
+        group.append((path, size))
+        group_size += size
+    if group: groups.append(group)
+    return groups
+
+
+class MergeRunner(object):
+    """
+    Merges the small per-job output files in a directory (local or on the SE)
+    into files of about target_size_gb. Every merged file is checked to contain
+    the events of all its inputs before the inputs are removed.
+    The merge and count commands are run from PATH with env, so the tools
+    can be replaced by stubs.
+    """
+
+    def __init__(self, directory, target_size_gb=2., merge_tool='edmCopyPickMerge', pattern='*.root'):
+        super(MergeRunner, self).__init__()
+        self.directory = directory
+        self.target_size_gb = target_size_gb
+        self.merge_tool = merge_tool
+        self.pattern = pattern
+        # Merged files are written to a new temporary directory in here per run
+        self.workdir_parent = svjgenprod.RUN_FULLSIM_DIR
+        self.workdir = None
+        # Number of groups merged in parallel
+        self.n_threads = 4
+        # Environment for the merge and count commands, e.g. from
+        # svjgenprod.utils.get_cmssw_environment; None uses the current one
+        self.env = None
+        # Command that prints '<n> events' for a file; None picks one for merge_tool
+        self.count_cmd = None
+        self.semanager = svjgenprod.SEManager()
+
+    def list_files(self):
+        """
+        Returns (path, size) pairs of the files to merge, sorted by path
+        """
+        if is_remote(self.directory):
+            files = self.semanager.list_directory(self.directory)
+        else:
+            files = [ (path, os.stat(path).st_size) for path in glob.glob(osp.join(self.directory, '*')) ]
+        return sorted([ (path, size) for path, size in files if fnmatch.fnmatch(osp.basename(path), self.pattern) ])
+
+    def get_groups(self):
+        """
+        Returns the groups of files to merge; groups of one file are left as is
+        """
+        groups = group_files(self.list_files(), self.target_size_gb * 1024**3)
+        return [ [ path for path, size in group ] for group in groups if len(group) > 1 ]
+
+    def get_merged_basename(self, group):
+        # Named after the full paths of its inputs, so merging the same group
+        # twice gives the same file, and different groups never share a name
+        digest = hashlib.sha1(' '.join(group).encode()).hexdigest()
+        return 'merged_{0}.root'.format(digest[:10])
+
+    def count_events(self, root_file):
+        count_cmd = get_count_events_cmd(self.merge_tool) if self.count_cmd is None else self.count_cmd
+        return count_events(root_file, count_cmd, env=self.env)
+
+    def merge_group(self, group):
+        """
+        Merges one group, verifies the event count, and replaces the inputs by
+        the merged file. Returns the path of the merged file.
+        """
+        merged_file = osp.join(self.workdir, self.get_merged_basename(group))
+        n_events_in = sum(self.count_events(path) for path in group)
+        svjgenprod.utils.run_command(get_merge_cmd(group, merged_file, self.merge_tool), env=self.env)
+        n_events_out = self.count_events(merged_file)
+        if n_events_out != n_events_in:
+            raise RuntimeError(
+                '{0} has {1} events, but its {2} inputs have {3}; keeping the inputs'
+                .format(merged_file, n_events_out, len(group), n_events_in)
+                )
+        logger.info('Merged {0} files with {1} events into {2}'.format(len(group), n_events_out, merged_file))
+
+        # Put the merged file in place before removing the inputs, so a failure
+        # can leave duplicates but never lose events
+        dst = self.directory.rstrip('/') + '/' + osp.basename(merged_file)
+        if is_remote(self.directory):
+            size = os.stat(merged_file).st_size
+            self.semanager.copy_to_se(merged_file, dst, create_parent_directory=False)
+            remote_size = self.semanager.get_size(dst)
+            if remote_size != size:
+                raise RuntimeError(
+                    '{0} has size {1} on the SE instead of {2}; keeping the inputs'
+                    .format(dst, remote_size, size)
+                    )
+            os.remove(merged_file)
+            for path in group: self.semanager.remove(path)
+        else:
+            shutil.move(merged_file, dst)
+            for path in group: os.remove(path)
+        return dst
+
+    def run(self):
+        """
+        Merges all groups, n_threads at a time; returns the merged files
+        """
+        groups = self.get_groups()
+        logger.info(
+            'Merging {0} files in {1} into {2} files of up to {3} GB'
+            .format(sum(len(g) for g in groups), self.directory, len(groups), self.target_size_gb)
+            )
+        if not groups: return []
+        svjgenprod.utils.create_directory(self.workdir_parent)
+        self.workdir = tempfile.mkdtemp(prefix='merge_', dir=self.workdir_parent)
+        pool = ThreadPool(max(1, min(self.n_threads, len(groups))))
+        try:
+            return pool.map(self.merge_group, groups)
+        finally:
+            pool.close()
+            shutil.rmtree(self.workdir)
+
+    def full_chain(self):
+        return self.run()
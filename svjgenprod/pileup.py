@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, hashlib, subprocess, re, heapq, threading, fcntl
+from multiprocessing.pool import ThreadPool
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        logger.error(
+            'numpy is not installed; install it with \'pip install numpy\' '
+            'to use pileup file indices.'
+            )
+        raise ImportError('No module named numpy')
+
+
+# Redirector used to fetch premix files that are not available locally
+DEFAULT_REDIRECTOR = 'root://cmsxrootd.fnal.gov/'
+
+
+def get_pileup_filelist(year):
+    return osp.join(svjgenprod.SVJ_INPUT_DIR, 'pileupfilelists', 'pileup_filelist_{0}.txt'.format(year))
+
+
+def read_pileup_filelist(filelist):
+    with open(filelist, 'r') as f:
+        return [ line.strip() for line in f if line.strip() ]
+
+
+def write_pileup_filelist(entries, out_file):
+    logger.info('Writing pileup file list with {0} entries to {1}'.format(len(entries), out_file))
+    with open(out_file, 'w') as f:
+        f.write('\n'.join(entries) + '\n')
+
+
+#____________________________________________________________________
+# Index with the number of events and size of every premix file
+
+def get_pileup_index_file(filelist):
+    return osp.splitext(filelist)[0] + '.index.npz'
+
+
+def get_file_info(lfn, redirector=DEFAULT_REDIRECTOR):
+    """
+    Returns (n_events, size in bytes) of a ROOT file using edmFileUtil
+    (needs a CMSSW environment)
+    """
+    output = subprocess.check_output(
+        [ 'edmFileUtil', redirector.rstrip('/') + '/' + lfn ],
+        universal_newlines = True
+        )
+    match = re.search(r'(\d+) events, (\d+) bytes', output)
+    if not match:
+        raise ValueError('Could not parse edmFileUtil output for {0}:\n{1}'.format(lfn, output))
+    return int(match.group(1)), int(match.group(2))
+
+
+def build_pileup_index(filelist, n_threads=8, redirector=DEFAULT_REDIRECTOR):
+    """
+    Queries the event count and size of every file in a pileup file list and
+    stores them (aligned with the lines of the list) in <filelist>.index.npz.
+    Meant to be run once, offline, in a CMSSW environment.
+    """
+    _require_numpy()
+    lfns = read_pileup_filelist(filelist)
+    logger.info('Building pileup index for {0} files of {1}'.format(len(lfns), filelist))
+    pool = ThreadPool(n_threads)
+    try:
+        infos = pool.map(lambda lfn: get_file_info(lfn, redirector), lfns)
+    finally:
+        pool.close()
+    index_file = get_pileup_index_file(filelist)
+    with open(index_file, 'wb') as f:
+        np.savez(
+            f,
+            n_events = np.array([ i[0] for i in infos ], dtype=np.int64),
+            size = np.array([ i[1] for i in infos ], dtype=np.int64),
+            )
+    logger.info('Wrote {0}'.format(index_file))
+    return index_file
+
+
+def load_pileup_index(filelist):
+    """
+    Returns (n_events, size) arrays aligned with the lines of filelist, or None
+    if there is no index
+    """
+    index_file = get_pileup_index_file(filelist)
+    if not osp.isfile(index_file): return None
+    _require_numpy()
+    with np.load(index_file) as npz:
+        return npz['n_events'], npz['size']
+
+
+def assign_pileup_files(n_events, n_jobs):
+    """
+    Divides files over n_jobs non-overlapping groups with (nearly) equal total
+    numbers of events: files are handed out largest first, each to the group
+    with the fewest events so far. Returns a list of n_jobs lists of file
+    indices. With more jobs than files the groups are reused round-robin.
+    The result only depends on n_events and n_jobs, so every job can compute
+    its own group.
+    """
+    n_groups = min(n_jobs, len(n_events))
+    if n_groups < n_jobs:
+        logger.warning(
+            'More jobs ({0}) than pileup files ({1}); jobs will share pileup files'
+            .format(n_jobs, len(n_events))
+            )
+    heap = [ (0, i_group) for i_group in range(n_groups) ]
+    groups = [ [] for i_group in range(n_groups) ]
+    # Sort on (-events, index) so ties are broken deterministically
+    for i_file in sorted(range(len(n_events)), key=lambda i: (-n_events[i], i)):
+        total, i_group = heapq.heappop(heap)
+        groups[i_group].append(i_file)
+        heapq.heappush(heap, (total + int(n_events[i_file]), i_group))
+    return [ sorted(groups[i_job % n_groups]) for i_job in range(n_jobs) ]
+
+
+def get_job_pileup_files(filelist, job_index, n_jobs):
+    """
+    Returns the lfns assigned to job job_index out of n_jobs, using the index
+    of filelist. Without an index all files are returned.
+    """
+    lfns = read_pileup_filelist(filelist)
+    index = load_pileup_index(filelist)
+    if index is None:
+        logger.warning('No pileup index for {0}; cannot balance pileup over jobs'.format(filelist))
+        return lfns
+    n_events, size = index
+    if len(n_events) != len(lfns):
+        raise ValueError(
+            'Pileup index {0} has {1} entries but {2} has {3} files; rebuild the index'
+            .format(get_pileup_index_file(filelist), len(n_events), filelist, len(lfns))
+            )
+    group = assign_pileup_files(n_events, n_jobs)[job_index]
+    logger.info(
+        'Job {0}/{1}: {2} pileup files with {3} events ({4:.1f} GB)'
+        .format(job_index, n_jobs, len(group), n_events[group].sum(), size[group].sum() / 1024.**3)
+        )
+    return [ lfns[i] for i in group ]
+
+
+#____________________________________________________________________
+# Per-job selection
+
+def _seeded_rank(seed, lfn):
+    """
+    Deterministic pseudo-random sort key of an lfn for a given seed; unlike
+    random.shuffle it does not depend on the Python version
+    """
+    return hashlib.sha1('{0}:{1}'.format(seed, lfn).encode()).hexdigest()
+
+
+def find_local_file(lfn, local_prefixes):
+    """
+    Returns the path of lfn under the first local prefix (e.g. a site mount like
+    /eos/uscms or a cache directory) where it exists, or None
+    """
+    for prefix in local_prefixes:
+        path = prefix.rstrip('/') + lfn
+        if osp.isfile(path): return path
+    return None
+
+
+def select_pileup_files(lfns, n_files, seed, local_prefixes=()):
+    """
+    Picks a deterministic, seed-dependent subset of n_files lfns.
+    Files available under one of the local_prefixes are preferred; within the
+    local and the remote files the order is pseudo-random per seed, so different
+    jobs use different files.
+    Returns a list of (lfn, local_path_or_None) tuples.
+    """
+    ranked = sorted(lfns, key=lambda lfn: _seeded_rank(seed, lfn))
+    local, remote = [], []
+    for lfn in ranked:
+        local_path = find_local_file(lfn, local_prefixes)
+        if local_path is None:
+            remote.append((lfn, None))
+        else:
+            local.append((lfn, local_path))
+            if len(local) == n_files: break
+    selected = (local + remote)[:n_files]
+    logger.info(
+        'Selected {0} pileup files for seed {1} ({2} local)'
+        .format(len(selected), seed, sum(not(p is None) for l, p in selected))
+        )
+    return selected
+
+
+def fetch_file(lfn, dst, redirector=DEFAULT_REDIRECTOR):
+    """
+    Copies lfn to dst with xrdcp; writes to a temporary file first so an
+    interrupted copy never looks like a complete file
+    """
+    tmp_dst = '{0}.part{1}'.format(dst, os.getpid())
+    svjgenprod.utils.create_directory(osp.dirname(dst))
+    cmd = [ 'xrdcp', '-s', '-f', redirector.rstrip('/') + '/' + lfn, tmp_dst ]
+    logger.info('Fetching {0} ==> {1}'.format(lfn, dst))
+    try:
+        subprocess.check_call(cmd)
+    except Exception:
+        if osp.isfile(tmp_dst): os.remove(tmp_dst)
+        raise
+    os.rename(tmp_dst, dst)
+    return dst
+
+
+def prefetch_files(lfns, dst_dir, n_threads=4, redirector=DEFAULT_REDIRECTOR):
+    """
+    Fetches lfns in parallel to dst_dir (keeping the lfn directory structure).
+    Returns a dict lfn -> local path; lfns that could not be fetched are left
+    out, so callers can fall back to reading them remotely.
+    """
+    def fetch(lfn):
+        dst = dst_dir.rstrip('/') + lfn
+        if osp.isfile(dst): return lfn, dst
+        try:
+            return lfn, fetch_file(lfn, dst, redirector)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning('Could not fetch {0}; will read it remotely ({1})'.format(lfn, e))
+            return lfn, None
+    pool = ThreadPool(max(1, min(n_threads, len(lfns))))
+    try:
+        results = pool.map(fetch, lfns)
+    finally:
+        pool.close()
+    return dict((lfn, path) for lfn, path in results if not(path is None))
+
+
+def plan_pileup(
+        year,
+        n_files,
+        seed,
+        local_prefixes=(),
+        prefetch_dir=None,
+        n_threads=4,
+        redirector=DEFAULT_REDIRECTOR,
+        job_index=None,
+        n_jobs=None,
+        ):
+    """
+    Returns the pileup file list entries for one job: n_files seed-dependent
+    files, as file: paths for local (or prefetched) files and lfns otherwise.
+    If job_index and n_jobs are given, the files are taken from the balanced,
+    non-overlapping group of this job (see assign_pileup_files); n_files=None
+    then uses the whole group.
+    If prefetch_dir is given, the selected remote files are copied there in
+    parallel before returning, so cmsRun does not stall on remote reads.
+    """
+    filelist = get_pileup_filelist(year)
+    if n_jobs is None:
+        lfns = read_pileup_filelist(filelist)
+    else:
+        lfns = get_job_pileup_files(filelist, job_index, n_jobs)
+    if n_files is None: n_files = len(lfns)
+    selected = select_pileup_files(lfns, n_files, seed, local_prefixes)
+    if not(prefetch_dir is None):
+        to_fetch = [ lfn for lfn, local_path in selected if local_path is None ]
+        fetched = prefetch_files(to_fetch, prefetch_dir, n_threads, redirector)
+        selected = [ (lfn, fetched.get(lfn, local_path)) for lfn, local_path in selected ]
+    return [ lfn if local_path is None else 'file:' + local_path for lfn, local_path in selected ]
+
+
+#____________________________________________________________________
+# Node-level cache of premix files
+
+def get_remote_checksum(lfn, redirector=DEFAULT_REDIRECTOR):
+    """
+    Returns the adler32 checksum of lfn as reported by the storage, e.g. '1a2b3c4d'
+    """
+    output = subprocess.check_output(
+        [ 'xrdfs', redirector.rstrip('/'), 'query', 'checksum', lfn ],
+        universal_newlines = True
+        )
+    algorithm, checksum = output.split()[:2]
+    if algorithm != 'adler32':
+        raise ValueError('Unexpected checksum type {0} for {1}'.format(algorithm, lfn))
+    return checksum.lower().zfill(8)
+
+
+class PileupCache(object):
+    """
+    Directory of premix files shared by the jobs on a node, stored under their
+    lfn (<cache_dir>/store/...). Files are fetched once, verified against the
+    adler32 checksum of the storage, and the least recently used files are
+    removed when the cache exceeds max_size_gb. A file's mtime is used as its
+    last-use time, since many scratch file systems are mounted noatime.
+    Files in use are pinned with a shared flock on the file itself, and are
+    never evicted while pinned.
+    """
+
+    lock_basename = '.svjgenprod_cache.lock'
+    # Fetches are serialized per lfn through a fixed set of lock files, so the
+    # number of lock files in the cache stays bounded
+    fetch_lock_dir = '.svjgenprod_fetch_locks'
+    n_fetch_locks = 64
+
+    def __init__(self, cache_dir, max_size_gb=100., redirector=DEFAULT_REDIRECTOR, verify_checksum=True):
+        super(PileupCache, self).__init__()
+        self.cache_dir = osp.abspath(cache_dir)
+        self.max_size = int(max_size_gb * 1024**3)
+        self.redirector = redirector
+        self.verify_checksum = verify_checksum
+        self.lock_file = osp.join(self.cache_dir, self.lock_basename)
+        # Open files of the pinned paths, keyed by path
+        self._pins = {}
+
+    def get_path(self, lfn):
+        return self.cache_dir + lfn
+
+    def get_fetch_lock_file(self, lfn):
+        i_lock = int(hashlib.sha1(lfn.encode()).hexdigest()[:8], 16) % self.n_fetch_locks
+        return osp.join(self.cache_dir, self.fetch_lock_dir, 'fetch{0:02d}.lock'.format(i_lock))
+
+    def lookup(self, lfn):
+        """
+        Returns the cached path of lfn (and marks it as used), or None
+        """
+        path = self.get_path(lfn)
+        if not osp.isfile(path): return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted in the meantime
+            return None
+        return path
+
+    def pin(self, lfn):
+        """
+        Like lookup, but also takes a shared flock on the cached file so evict
+        leaves it alone until unpin_all is called. Returns the path or None.
+        """
+        path = self.lookup(lfn)
+        if path is None: return None
+        if path in self._pins: return path
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            still_cached = os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+        except OSError:
+            still_cached = False
+        if not still_cached:
+            # Evicted between the lookup and the flock
+            f.close()
+            return None
+        self._pins[path] = f
+        return path
+
+    def unpin_all(self):
+        for f in self._pins.values():
+            f.close()
+        self._pins = {}
+
+    def fetch(self, lfn):
+        """
+        Fetches lfn into the cache (if no other job did so already) and returns its path
+        """
+        path = self.get_path(lfn)
+        # Two jobs never download the same file
+        with svjgenprod.utils.file_lock(self.get_fetch_lock_file(lfn)):
+            if osp.isfile(path): return self.lookup(lfn) or path
+            fetch_file(lfn, path, self.redirector)
+            if self.verify_checksum:
+                remote_checksum = get_remote_checksum(lfn, self.redirector)
+                local_checksum = svjgenprod.catalog.file_checksum(path)
+                if remote_checksum != local_checksum:
+                    os.remove(path)
+                    raise IOError(
+                        'Checksum mismatch for {0}: storage {1}, fetched {2}'
+                        .format(lfn, remote_checksum, local_checksum)
+                        )
+        self.evict()
+        return path
+
+    def _cached_files(self):
+        """
+        Returns a list of (mtime, size, path) of all complete files in the cache
+        """
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith('.lock') or '.part' in filename: continue
+                path = osp.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self):
+        """
+        Removes least recently used files that are not pinned until the cache
+        fits in max_size
+        """
+        with svjgenprod.utils.file_lock(self.lock_file):
+            files = sorted(self._cached_files())
+            total = sum(size for mtime, size, path in files)
+            for mtime, size, path in files:
+                if total <= self.max_size: break
+                try:
+                    with open(path, 'rb') as f:
+                        # Fails if any job (including this one) has the file pinned
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        logger.info('Evicting {0} from pileup cache'.format(path))
+                        os.remove(path)
+                except (IOError, OSError):
+                    logger.debug('Not evicting {0}: in use or already removed'.format(path))
+                    continue
+                total -= size
+        return total
+
+    def rewrite_filelist(self, entries):
+        """
+        Replaces lfns that are in the cache by file: paths, and pins those
+        files until unpin_all is called.
+        Returns the new entries and the list of lfns that were not in the cache.
+        """
+        new_entries = []
+        misses = []
+        for entry in entries:
+            path = None if entry.startswith('file:') else self.pin(entry)
+            if path is None:
+                new_entries.append(entry)
+                if not entry.startswith('file:'): misses.append(entry)
+            else:
+                new_entries.append('file:' + path)
+        logger.info(
+            'Pileup cache {0}: {1} hits, {2} misses'
+            .format(self.cache_dir, len(entries) - len(misses), len(misses))
+            )
+        return new_entries, misses
+
+    def fetch_in_background(self, lfns, n_threads=2):
+        """
+        Starts fetching lfns into the cache in a background thread (e.g. while
+        cmsRun reads them remotely), so later jobs on the node find them.
+        Returns the thread.
+        """
+        def fetch_all():
+            def fetch(lfn):
+                try:
+                    self.fetch(lfn)
+                except Exception as e:
+                    logger.warning('Background fetch of {0} failed: {1}'.format(lfn, e))
+            pool = ThreadPool(max(1, min(n_threads, len(lfns))))
+            try:
+                pool.map(fetch, lfns)
+            finally:
+                pool.close()
+        thread = threading.Thread(target=fetch_all)
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, time, multiprocessing
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+
+def get_available_memory_gb():
+    """
+    Returns MemAvailable from /proc/meminfo in GB, or None if it cannot be read
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / (1024.**2)
+    except IOError:
+        pass
+    return None
+
+
+def make_runners(Runner, configs, in_file, n_events, seeds=None):
+    """
+    Returns one runner per (config, seed), e.g. for GEN-SIM of 2016/2017/2018:
+    `make_runners(FullSimRunnerGenSim, config.expand({'year': [2016, 2017, 2018]}), in_files, 1000)`
+    in_file is either a path or a dict {year: path}.
+    """
+    if seeds is None: seeds = [ Runner.seed ]
+    runners = []
+    for config in configs:
+        config = svjgenprod.Config.flexible_init(config)
+        year_in_file = in_file[config['year']] if isinstance(in_file, dict) else in_file
+        for seed in seeds:
+            runner = Runner.for_year(config, year_in_file, n_events)
+            runner.seed = seed
+            runner.update_paths()
+            runners.append(runner)
+    return runners
+
+
+def _run(runner, method):
+    getattr(runner, method)()
+
+
+def run_runners(
+        runners,
+        n_cores=None, memory_gb=None,
+        method='full_chain',
+        unique_workdirs=True,
+        poll_interval=5.,
+        ):
+    """
+    Runs `method` of every runner in its own process, side by side as long as
+    the summed runner.n_cores and runner.memory_gb fit within n_cores (default:
+    all cores) and memory_gb (default: currently available memory).
+    Runners are started in the given order; a runner that exceeds the budget
+    on its own is started once nothing else is running.
+    With unique_workdirs=False runners of the same model share a workdir; the
+    files they write there are written under the workdir lock.
+    Raises RuntimeError after all runners finished if any of them failed.
+    """
+    if n_cores is None: n_cores = multiprocessing.cpu_count()
+    if memory_gb is None: memory_gb = get_available_memory_gb()
+    if unique_workdirs:
+        for runner in runners: runner.make_workdir_unique()
+    logger.info(
+        'Running {0} runners with a budget of {1} cores and {2} GB memory'
+        .format(len(runners), n_cores, memory_gb)
+        )
+
+    queue = list(runners)
+    running = []
+    failed = []
+    used_cores = 0
+    used_memory = 0.
+
+    while queue or running:
+        # Start as many queued runners as fit in the remaining budget
+        while queue:
+            runner = queue[0]
+            fits = (
+                used_cores + runner.n_cores <= n_cores
+                and (memory_gb is None or used_memory + runner.memory_gb <= memory_gb)
+                )
+            if not(fits or not running): break
+            queue.pop(0)
+            process = multiprocessing.Process(target=_run, args=(runner, method))
+            process.start()
+            logger.info(
+                'Started {0} (year {1}, seed {2}) in {3}, pid {4}'
+                .format(runner.__class__.__name__, runner.year, runner.seed, runner.workdir, process.pid)
+                )
+            running.append((runner, process))
+            used_cores += runner.n_cores
+            used_memory += runner.memory_gb
+
+        time.sleep(poll_interval)
+
+        for runner, process in running[:]:
+            if process.is_alive(): continue
+            process.join()
+            running.remove((runner, process))
+            used_cores -= runner.n_cores
+            used_memory -= runner.memory_gb
+            if process.exitcode == 0:
+                logger.info('Finished {0} in {1}'.format(runner.__class__.__name__, runner.workdir))
+            else:
+                logger.error(
+                    'Exit code {0} for {1} in {2}'
+                    .format(process.exitcode, runner.__class__.__name__, runner.workdir)
+                    )
+                failed.append(runner)
+
+    if failed:
+        raise RuntimeError(
+            '{0} of {1} runners failed: {2}'
+            .format(len(failed), len(runners), ', '.join(r.workdir for r in failed))
+            )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, sqlite3, hashlib, time
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+
+# Seeds are valid for both MadGraph and the CMSSW random number service
+MAX_SEED = 900000000
+
+# Every allocated seed is recorded once; the primary key guarantees that no
+# seed is handed out twice, also across submissions
+CREATE_TABLE = (
+    'CREATE TABLE IF NOT EXISTS seeds ('
+    ' seed INTEGER PRIMARY KEY,'
+    ' sample TEXT,'
+    ' stage TEXT,'
+    ' submission INTEGER,'
+    ' job INTEGER,'
+    ' shard INTEGER,'
+    ' timestamp REAL'
+    ')'
+    )
+
+# Max number of parameters in one sqlite query
+_QUERY_CHUNK = 900
+
+
+def derive_seed(sample, stage, job, shard=0, submission=0, attempt=0):
+    """
+    Deterministic seed in [1, MAX_SEED] for the counters (sample, stage, job,
+    shard, submission); attempt is raised to step past a collision
+    """
+    key = '{0}|{1}|{2}|{3}|{4}|{5}'.format(sample, stage, job, shard, submission, attempt)
+    return int(hashlib.sha1(key.encode()).hexdigest()[:15], 16) % MAX_SEED + 1
+
+
+def connect(db_file=None):
+    if db_file is None: db_file = svjgenprod.SVJ_SEED_LEDGER
+    svjgenprod.utils.create_directory(osp.dirname(osp.abspath(db_file)))
+    connection = sqlite3.connect(db_file, timeout=60.)
+    connection.execute(CREATE_TABLE)
+    return connection
+
+
+def _taken(connection, seeds):
+    """
+    Returns the subset of seeds that is already in the ledger
+    """
+    taken = set()
+    for i in range(0, len(seeds), _QUERY_CHUNK):
+        chunk = seeds[i:i+_QUERY_CHUNK]
+        taken.update(row[0] for row in connection.execute(
+            'SELECT seed FROM seeds WHERE seed IN ({0})'.format(','.join('?' * len(chunk))),
+            chunk
+            ))
+    return taken
+
+
+def allocate_seeds(sample, stage, n_jobs, n_shards=1, db_file=None):
+    """
+    Allocates seeds for a new submission of n_jobs jobs (with n_shards shards
+    each) of sample and stage, and records them in the ledger.
+    Every call is a new submission, so resubmitting the same sample gives new
+    seeds. Returns a list of n_jobs lists of n_shards seeds each.
+    """
+    connection = connect(db_file)
+    try:
+        # Lock the ledger for the whole allocation, so concurrent allocations
+        # cannot hand out the same submission number or seed
+        connection.isolation_level = None
+        connection.execute('BEGIN IMMEDIATE')
+        submission = connection.execute(
+            'SELECT COALESCE(MAX(submission) + 1, 0) FROM seeds WHERE sample = ? AND stage = ?',
+            (sample, stage)
+            ).fetchone()[0]
+
+        counters = [ (job, shard) for job in range(n_jobs) for shard in range(n_shards) ]
+        seeds = [ derive_seed(sample, stage, job, shard, submission) for job, shard in counters ]
+        taken = _taken(connection, seeds)
+        used = set()
+        for i, (job, shard) in enumerate(counters):
+            attempt = 0
+            while seeds[i] in taken or seeds[i] in used:
+                attempt += 1
+                seeds[i] = derive_seed(sample, stage, job, shard, submission, attempt)
+                taken.update(_taken(connection, [seeds[i]]))
+            used.add(seeds[i])
+
+        timestamp = time.time()
+        connection.executemany(
+            'INSERT INTO seeds VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ( (seed, sample, stage, submission, job, shard, timestamp) for seed, (job, shard) in zip(seeds, counters) )
+            )
+        connection.execute('COMMIT')
+    finally:
+        # Closing without COMMIT rolls back the allocation
+        connection.close()
+
+    logger.info(
+        'Allocated {0} seeds for submission {1} of {2} {3} in {4}'
+        .format(len(seeds), submission, sample, stage, db_file or svjgenprod.SVJ_SEED_LEDGER)
+        )
+    return [ seeds[i:i+n_shards] for i in range(0, len(seeds), n_shards) ]
+
+
+def get_seeds(sample, stage=None, db_file=None):
+    """
+    Returns the ledger records of sample (optionally only of stage) as dicts
+    """
+    query = 'SELECT * FROM seeds WHERE sample = ?'
+    args = [ sample ]
+    if not(stage is None):
+        query += ' AND stage = ?'
+        args.append(stage)
+    connection = connect(db_file)
+    try:
+        cursor = connection.execute(query + ' ORDER BY submission, job, shard', args)
+        columns = [ d[0] for d in cursor.description ]
+        return [ dict(zip(columns, row)) for row in cursor ]
+    finally:
+        connection.close()
@@ -107,3 +107,40 @@ class SEManager(object):
         cmd = [ 'xrdcp', '-s', src, dst ]
         svjgenprod.utils.run_command(cmd)
 
+
+    def list_directory(self, directory):
+        """
+        Returns a list of (path, size in bytes) for the files in a directory
+        on the SE; paths include the mgm
+        """
+        mgm, directory = self._safe_split_mgm(directory)
+        cmd = [ 'xrdfs', mgm, 'ls', '-l', directory ]
+        output = subprocess.check_output(cmd, universal_newlines=True)
+        files = []
+        for line in output.splitlines():
+            components = line.split()
+            # Directories start with 'd'; files have size and path as last fields
+            if len(components) < 2 or components[0].startswith('d'): continue
+            files.append((self._join_mgm_lfn(mgm, components[-1]), int(components[-2])))
+        return files
+
+    def get_size(self, path):
+        """
+        Returns the size in bytes of a file on the SE
+        """
+        mgm, lfn = self._safe_split_mgm(path)
+        cmd = [ 'xrdfs', mgm, 'stat', lfn ]
+        output = subprocess.check_output(cmd, universal_newlines=True)
+        match = re.search(r'Size:\s+(\d+)', output)
+        if not match:
+            raise ValueError('Could not read the size of {0} from:\n{1}'.format(path, output))
+        return int(match.group(1))
+
+    def remove(self, path):
+        """
+        Removes a file from the SE
+        """
+        mgm, lfn = self._safe_split_mgm(path)
+        logger.warning('Removing from SE: {0}'.format(self._join_mgm_lfn(mgm, lfn)))
+        cmd = [ 'xrdfs', mgm, 'rm', lfn ]
+        svjgenprod.utils.run_command(cmd)
@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, os, sys, glob, importlib, ast, cmath, functools, pickle
+from string import Template
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class isolated_model_import(object):
+    """
+    Temporarily makes the modules of a UFO model dir importable by their
+    top-level names (as the UFO files import each other: `from parameters
+    import all_parameters`).
+    On entering, previously imported modules with the same names (e.g. from
+    the model dir of another physics point) are hidden; on exiting, the model
+    modules are dropped and sys.path and sys.modules are restored. This way
+    every model dir is imported fresh, even when many are processed in the
+    same process.
+    """
+    def __init__(self, model_dir):
+        super(isolated_model_import, self).__init__()
+        self.model_dir = osp.abspath(model_dir)
+        self.module_names = [
+            osp.basename(f)[:-3] for f in glob.glob(osp.join(self.model_dir, '*.py'))
+            ]
+        self._hidden_modules = {}
+
+    def __enter__(self):
+        logger.debug('Isolated import of model dir {0}'.format(self.model_dir))
+        for name in self.module_names:
+            if name in sys.modules:
+                self._hidden_modules[name] = sys.modules.pop(name)
+        sys.path.insert(0, self.model_dir)
+        return self
+
+    def import_module(self, name):
+        return importlib.import_module(name)
+
+    def __exit__(self, type, value, traceback):
+        if self.model_dir in sys.path:
+            sys.path.remove(self.model_dir)
+        for name in self.module_names:
+            sys.modules.pop(name, None)
+        sys.modules.update(self._hidden_modules)
+        self._hidden_modules = {}
+
+
+def write_param_card(model_dir, param_card_file=None, use_cache=True):
+    """
+    Writes the param_card.dat of a model dir.
+    By default the (cached) pure-data model is used; with use_cache=False the
+    model's own write_param_card.py is imported in isolation instead.
+    """
+    if param_card_file is None: param_card_file = osp.join(model_dir, 'param_card.dat')
+    if use_cache:
+        return load_model(model_dir).write_param_card(param_card_file)
+    logger.info('Writing {0}'.format(param_card_file))
+    with isolated_model_import(model_dir) as model:
+        ParamCardWriter = model.import_module('write_param_card').ParamCardWriter
+        ParamCardWriter(param_card_file, generic=True)
+    return param_card_file
+
+
+#____________________________________________________________________
+# Compact, cacheable representation of a UFO model
+
+class UFORecord(object):
+    """
+    Base class for the lightweight UFO objects; only the fields listed in
+    __slots__ are stored, and pickling stores a plain tuple
+    """
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        super(UFORecord, self).__init__()
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(self.__class__.__name__, getattr(self, 'name', ''))
+
+
+class UFOParameter(UFORecord):
+    __slots__ = ('name', 'nature', 'type', 'value', 'texname', 'lhablock', 'lhacode')
+
+class UFOParticle(UFORecord):
+    # mass and width are parameter names
+    __slots__ = ('pdg_code', 'name', 'antiname', 'spin', 'color', 'mass', 'width', 'texname', 'antitexname', 'charge')
+
+class UFOCoupling(UFORecord):
+    __slots__ = ('name', 'value', 'order')
+
+class UFOVertex(UFORecord):
+    # particles, lorentz and couplings refer to other objects by name
+    __slots__ = ('name', 'particles', 'color', 'lorentz', 'couplings')
+
+class UFOFunction(UFORecord):
+    __slots__ = ('name', 'arguments', 'expression')
+
+    def to_callable(self, math_module=cmath):
+        arguments = (self.arguments,) if isinstance(self.arguments, str) else tuple(self.arguments)
+        expression = compile(self.expression, '<ufo function {0}>'.format(self.name), 'eval')
+        def f(*args):
+            return eval(expression, {'cmath': math_module}, dict(zip(arguments, args)))
+        return f
+
+
+def _fill_slot(slot, value):
+    fmt, name, conversion = slot
+    if conversion == 'real':
+        value = complex(value).real
+    else:
+        value = float(value)
+    return fmt % value
+
+
+class _NumpyCMath(object):
+    """
+    Stand-in for cmath in parameter expressions that works element-wise on
+    numpy arrays; like cmath, it returns complex results where needed
+    """
+    def __init__(self):
+        super(_NumpyCMath, self).__init__()
+        self.pi = np.pi
+        self.e = np.e
+        self.sqrt = np.emath.sqrt
+        self.log = np.emath.log
+        self.acos = np.emath.arccos
+        self.asin = np.emath.arcsin
+        self.atan = np.arctan
+        self.cos = np.cos
+        self.sin = np.sin
+        self.tan = np.tan
+        self.exp = np.exp
+
+_numpy_cmath = None if np is None else _NumpyCMath()
+
+
+class UFOModel(UFORecord):
+    """
+    Pure-data UFO model. The structural part (particles, couplings, vertices,
+    functions) is the same for every physics point of a template and is cached;
+    the parameters are parsed from parameters.py without executing it.
+    """
+    __slots__ = ('name', 'parameters', 'particles', 'couplings', 'vertices', 'ct_vertices', 'functions')
+
+    sm_pdg = [1, 2, 3, 4, 5, 6, 11, 12, 13, 13, 14, 15, 16, 21, 22, 23, 24, 25]
+
+    header = (
+        '######################################################################\n'
+        '## PARAM_CARD AUTOMATICALY GENERATED BY THE UFO  #####################\n'
+        '######################################################################'
+        )
+
+    def get_parameter(self, name):
+        for parameter in self.parameters:
+            if parameter.name == name: return parameter
+        raise KeyError('No parameter {0} in model {1}'.format(name, self.name))
+
+    def get_particle(self, pdg_code):
+        for particle in self.particles:
+            if particle.pdg_code == pdg_code: return particle
+        raise KeyError('No particle {0} in model {1}'.format(pdg_code, self.name))
+
+    def external_parameters(self):
+        return [ p for p in self.parameters if p.nature == 'external' ]
+
+    def get_namespace(self, math_module=cmath):
+        """
+        Namespace in which the parameter expressions are evaluated; mirrors the
+        `from function_library import *` of the UFO write_param_card.py.
+        math_module replaces cmath, e.g. by a numpy-backed module for
+        vectorized evaluation.
+        """
+        namespace = { 'cmath': math_module }
+        for function in self.functions:
+            namespace[function.name] = function.to_callable(math_module)
+        return namespace
+
+    def evaluate_parameters(self, overrides=None, math_module=cmath):
+        """
+        Evaluates all parameters in order of definition.
+        overrides optionally maps external parameter names to new values.
+        Returns a dict name -> value.
+        """
+        overrides = {} if overrides is None else overrides
+        namespace = self.get_namespace(math_module)
+        values = {}
+        for parameter in self.parameters:
+            if parameter.name in overrides:
+                value = overrides[parameter.name]
+            elif isinstance(parameter.value, str):
+                value = eval(parameter.value, namespace)
+            else:
+                value = parameter.value
+            namespace[parameter.name] = value
+            values[parameter.name] = value
+        return values
+
+    def evaluate_parameters_vectorized(self, overrides):
+        """
+        As evaluate_parameters, but overrides maps parameter names to arrays
+        (one entry per scan point). Parameters that depend on an overridden
+        parameter become arrays, all others stay scalars.
+        """
+        return self.evaluate_parameters(
+            dict((name, np.asarray(value, dtype=float)) for name, value in overrides.items()),
+            math_module = _numpy_cmath
+            )
+
+    @staticmethod
+    def order_param(obj1, obj2):
+        """
+        Order of parameters within a block; identical to (the quirks of)
+        ParamCardWriter.order_param in the UFO write_param_card.py
+        """
+        maxlen = min([len(obj1.lhacode), len(obj2.lhacode)])
+        for i in range(maxlen):
+            if obj1.lhacode[i] < obj2.lhacode[i]:
+                return -1
+            elif obj1.lhacode[i] == obj2.lhacode[i]:
+                return 0
+            else:
+                return 1
+        if len(obj1.lhacode) > len(obj2.lhacode):
+            return 1
+        elif len(obj1.lhacode) == len(obj2.lhacode):
+            return 0
+        else:
+            return -1
+
+    def get_lhablocks(self):
+        """
+        Returns the lha blocks in the order in which they appear in the param card,
+        with per block the external parameters in order
+        """
+        external = self.external_parameters()
+        lhablocks = sorted(set(p.lhablock for p in external))
+        for name in ['DECAY', 'MASS', 'SMINPUTS']:
+            if name in lhablocks:
+                lhablocks.remove(name)
+                lhablocks.insert(0, name)
+        return [
+            (lhablock, sorted(
+                [ p for p in external if p.lhablock == lhablock ],
+                key = functools.cmp_to_key(self.order_param)
+                ))
+            for lhablock in lhablocks
+            ]
+
+    def get_param_card_pieces(self):
+        """
+        Returns the generic param_card.dat as a list of pieces, equivalent to
+        ParamCardWriter(filename, generic=True) of the UFO write_param_card.py.
+        A piece is either a fixed string, or a (format, parameter name, conversion)
+        slot that is filled with the value of the parameter; conversion 'real'
+        takes the real part of the (possibly complex) value, 'float' requires a real value.
+        """
+        external_names = set(p.name for p in self.external_parameters())
+        parameters = dict((p.name, p) for p in self.parameters)
+        particles = [ p for p in self.particles if p.pdg_code > 0 ]
+
+        pieces = [ self.header ]
+        for lhablock, block_parameters in self.get_lhablocks():
+            pieces.append(
+                '\n###################################\n'
+                '## INFORMATION FOR {0}\n'
+                '###################################\n'
+                .format(lhablock.upper())
+                )
+            if lhablock != 'DECAY':
+                pieces.append('Block {0} \n'.format(lhablock))
+            for parameter in block_parameters:
+                lhacode = ' '.join([ '%3s' % key for key in parameter.lhacode ])
+                if lhablock != 'DECAY':
+                    pieces.extend([ '  %s ' % lhacode, ('%e', parameter.name, 'real'), ' # %s \n' % parameter.name ])
+                else:
+                    pieces.extend([ 'DECAY %s ' % lhacode, ('%e', parameter.name, 'real'), ' \n' ])
+            if lhablock in ['MASS', 'DECAY']:
+                pieces.extend(self._get_dep_param_pieces(lhablock, external_names, parameters, particles))
+        pieces.append(self._get_qnumber_block())
+        return pieces
+
+    def get_param_card(self, values=None):
+        """
+        Returns the contents of the generic param_card.dat.
+        values is the output of evaluate_parameters, and is computed if not given.
+        """
+        if values is None: values = self.evaluate_parameters()
+        return ''.join(
+            piece if isinstance(piece, str) else _fill_slot(piece, values[piece[1]])
+            for piece in self.get_param_card_pieces()
+            )
+
+    def _get_dep_param_pieces(self, lhablock, external_names, parameters, particles):
+        pieces = [
+            '##  Not dependent paramater.\n'
+            '## Those values should be edited following analytical the\n'
+            '## analytical expression. Some generator could simply ignore\n'
+            '## those values and use the analytical expression\n'
+            ]
+        if lhablock == 'MASS':
+            arg = 'mass'
+            prefix = ' '
+        else:
+            arg = 'width'
+            prefix = 'DECAY '
+        done = []
+        for particle in particles:
+            name = getattr(particle, arg)
+            if name in external_names: continue
+            done.append(particle.name)
+            parameter = parameters[name]
+            pieces.append('%s %s ' % (prefix, particle.pdg_code))
+            if isinstance(parameter.value, str):
+                pieces.append(('%f', name, 'real'))
+            else:
+                pieces.append('%f' % parameter.value)
+            pieces.append(' # %s : %s \n' % (particle.name, parameter.value))
+        # If more than one particle has the same mass/width it needs to be written here as well
+        for particle in particles:
+            if particle.name in done: continue
+            parameter = parameters[getattr(particle, arg)]
+            if parameter.lhacode[0] != particle.pdg_code:
+                pieces.extend([
+                    '%s %s ' % (prefix, particle.pdg_code),
+                    ('%f', parameter.name, 'float'),
+                    ' # %s : %s \n' % (particle.name, parameter.name),
+                    ])
+        return pieces
+
+    def _get_qnumber_block(self):
+        text = (
+            '#===========================================================\n'
+            '# QUANTUM NUMBERS OF NEW STATE(S) (NON SM PDG CODE)\n'
+            '#===========================================================\n'
+            '\n'
+            )
+        for particle in self.particles:
+            if particle.pdg_code in self.sm_pdg or particle.pdg_code < 0:
+                continue
+            text += (
+                'Block QNUMBERS %(pdg)d  # %(name)s\n'
+                '        1 %(charge)d  # 3 times electric charge\n'
+                '        2 %(spin)d  # number of spin states (2S+1)\n'
+                '        3 %(color)d  # colour rep (1: singlet, 3: triplet, 8: octet)\n'
+                '        4 %(antipart)d  # Particle/Antiparticle distinction (0=own anti)\n'
+                % {
+                    'pdg': particle.pdg_code,
+                    'name': particle.name,
+                    'charge': 3 * particle.charge,
+                    'spin': particle.spin,
+                    'color': particle.color,
+                    'antipart': particle.name != particle.antiname and 1 or 0
+                    }
+                )
+        return text
+
+    def write_param_card(self, filename, values=None):
+        logger.info('Writing {0}'.format(filename))
+        with open(filename, 'w') as f:
+            f.write(self.get_param_card(values))
+        return filename
+
+    def write_param_cards(self, filenames, overrides):
+        """
+        Writes one param card per scan point in a single pass.
+        overrides maps external parameter names to sequences with one value per
+        point (e.g. {'MY1': m_meds, 'MXd': m_ds}). The parameters are evaluated
+        for all points at once with numpy if available; the card is split in
+        fixed text and the few entries that differ between points, so only
+        the latter are formatted per point.
+        """
+        n_points = len(filenames)
+        for name, value in overrides.items():
+            if len(value) != n_points:
+                raise ValueError(
+                    'Got {0} values for parameter {1}, but {2} filenames'
+                    .format(len(value), name, n_points)
+                    )
+        if n_points == 0: return []
+
+        if np is None:
+            logger.warning('numpy is not installed; evaluating the parameters point by point')
+            values_per_point = [
+                self.evaluate_parameters(dict((name, value[i]) for name, value in overrides.items()))
+                for i in range(n_points)
+                ]
+            is_varying = lambda name: True
+            get_values = lambda name: [ values[name] for values in values_per_point ]
+            values = values_per_point[0]
+        else:
+            values = self.evaluate_parameters_vectorized(overrides)
+            is_varying = lambda name: np.ndim(values[name]) > 0
+            get_values = lambda name: np.broadcast_to(values[name], (n_points,)).tolist()
+
+        # Merge everything that is the same for all points into fixed strings
+        chunks = []
+        for piece in self.get_param_card_pieces():
+            if not isinstance(piece, str):
+                if is_varying(piece[1]):
+                    chunks.append([ _fill_slot(piece, value) for value in get_values(piece[1]) ])
+                    continue
+                piece = _fill_slot(piece, values[piece[1]])
+            if chunks and isinstance(chunks[-1], str):
+                chunks[-1] += piece
+            else:
+                chunks.append(piece)
+        logger.info(
+            'Writing {0} param cards ({1} varying entries per card)'
+            .format(n_points, sum(not isinstance(c, str) for c in chunks))
+            )
+
+        for i, filename in enumerate(filenames):
+            with open(filename, 'w') as f:
+                f.write(''.join(c if isinstance(c, str) else c[i] for c in chunks))
+        return filenames
+
+
+def parse_parameters(source):
+    """
+    Parses the Parameter(...) definitions of a UFO parameters.py without
+    executing it. Returns a list of UFOParameter in order of definition.
+    """
+    parameters = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Call):
+            continue
+        func = node.value.func
+        if not (isinstance(func, ast.Name) and func.id == 'Parameter'):
+            continue
+        kwargs = dict((kw.arg, ast.literal_eval(kw.value)) for kw in node.value.keywords)
+        parameters.append(UFOParameter(**kwargs))
+    return parameters
+
+
+def _names(objects):
+    return [ o.name for o in objects ]
+
+
+def _vertex_to_record(vertex):
+    return UFOVertex(
+        name = vertex.name,
+        particles = _names(vertex.particles),
+        color = list(vertex.color),
+        lorentz = _names(vertex.lorentz),
+        couplings = dict((key, c.name) for key, c in vertex.couplings.items()),
+        )
+
+
+def build_model(model_dir):
+    """
+    Executes the UFO modules of model_dir (in isolation) and converts them
+    to a UFOModel
+    """
+    logger.info('Building UFO model from {0}'.format(model_dir))
+    with isolated_model_import(model_dir) as model:
+        particles = model.import_module('particles')
+        couplings = model.import_module('couplings')
+        vertices = model.import_module('vertices')
+        function_library = model.import_module('function_library')
+        if osp.isfile(osp.join(model_dir, 'CT_vertices.py')):
+            ct_vertices = model.import_module('CT_vertices').all_CTvertices
+        else:
+            ct_vertices = []
+        return UFOModel(
+            name = osp.basename(osp.abspath(model_dir)),
+            parameters = [],
+            particles = [
+                UFOParticle(
+                    pdg_code = p.pdg_code, name = p.name, antiname = p.antiname,
+                    spin = p.spin, color = p.color, mass = p.mass.name, width = p.width.name,
+                    texname = p.texname, antitexname = p.antitexname, charge = p.charge,
+                    )
+                for p in particles.all_particles
+                ],
+            couplings = [
+                UFOCoupling(name = c.name, value = c.value, order = dict(c.order))
+                for c in couplings.all_couplings
+                ],
+            vertices = [ _vertex_to_record(v) for v in vertices.all_vertices ],
+            ct_vertices = [ _vertex_to_record(v) for v in ct_vertices ],
+            functions = [
+                UFOFunction(name = f.name, arguments = f.arguments, expression = f.expr)
+                for f in function_library.all_functions
+                ],
+            )
+
+
+def get_model_cache_dir():
+    return osp.join(svjgenprod.MG_MODEL_DIR, '.cache')
+
+
+def load_model(model_dir, cache_dir=None):
+    """
+    Returns the UFOModel for model_dir. The structural part is taken from a
+    pickle keyed by the hash of the model files (building it if needed); the
+    parameters are always parsed from the model_dir's parameters.py.
+    """
+    if cache_dir is None: cache_dir = get_model_cache_dir()
+    structure_hash = svjgenprod.utils.hash_directory(
+        model_dir, exclude = [ 'parameters.py', 'param_card.dat', '*.pyc', '__pycache__' ]
+        )
+    cache_file = osp.join(cache_dir, 'ufo_{0}.pkl'.format(structure_hash))
+
+    if osp.isfile(cache_file):
+        logger.debug('Loading cached UFO model {0}'.format(cache_file))
+        with open(cache_file, 'rb') as f:
+            model = pickle.load(f)
+    else:
+        model = build_model(model_dir)
+        if not osp.isdir(cache_dir): os.makedirs(cache_dir)
+        tmp_cache_file = svjgenprod.utils.make_inode_unique(cache_file + '.tmp')
+        with open(tmp_cache_file, 'wb') as f:
+            pickle.dump(model, f, protocol=2)
+        os.rename(tmp_cache_file, cache_file)
+        logger.info('Cached UFO model in {0}'.format(cache_file))
+
+    model.name = osp.basename(osp.abspath(model_dir))
+    with open(osp.join(model_dir, 'parameters.py'), 'r') as f:
+        model.parameters = parse_parameters(f.read())
+    return model
+
+
+def get_template_placeholders(template_model_dir):
+    """
+    Returns a dict placeholder -> list of parameter names, for the $placeholders
+    in the parameters.py of a template model dir,
+    e.g. {'mediator_mass': ['MY1'], 'dark_quark_mass': ['MXr', 'MXc', 'MXd']}
+    """
+    with open(osp.join(template_model_dir, 'parameters.py'), 'r') as f:
+        template = Template(f.read())
+    # Turn the placeholders into string literals so the file can be parsed
+    placeholders = dict(
+        (match[1] or match[2], "'${0}'".format(match[1] or match[2]))
+        for match in template.pattern.findall(template.template)
+        if match[1] or match[2]
+        )
+    ret = {}
+    for parameter in parse_parameters(template.substitute(placeholders)):
+        if isinstance(parameter.value, str) and parameter.value.startswith('$'):
+            ret.setdefault(parameter.value[1:], []).append(parameter.name)
+    return ret
@@ -3,7 +3,7 @@
 from __future__ import print_function
 
 import os.path as osp
-import logging, subprocess, os, shutil, re, pprint, csv
+import logging, subprocess, os, shutil, re, pprint, csv, hashlib, errno, fnmatch, json, fcntl
 from .termcolor import colored
 import svjgenprod
 
@@ -30,7 +30,26 @@ class switchdir(object):
         if not self.dry: os.chdir(self._backdir)
 
 
-def run_command(cmd, env=None, dry=False, shell=False):
+class file_lock(object):
+    """
+    Exclusive flock on lock_file for the duration of a with-block; serializes
+    operations on shared files and directories between processes on a node
+    """
+    def __init__(self, lock_file):
+        super(file_lock, self).__init__()
+        self.lock_file = lock_file
+
+    def __enter__(self):
+        create_directory(osp.dirname(osp.abspath(self.lock_file)))
+        self._f = open(self.lock_file, 'a')
+        fcntl.flock(self._f, fcntl.LOCK_EX)
+
+    def __exit__(self, type, value, traceback):
+        fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+
+
+def run_command(cmd, env=None, dry=False, shell=False, cwd=None):
     logger.warning('Issuing command: {0}'.format(' '.join(cmd)))
     if dry: return
 
@@ -43,7 +62,8 @@ def run_command(cmd, env=None, dry=False, shell=False):
         stderr=subprocess.STDOUT,
         env=env,
         universal_newlines=True,
-        shell=shell
+        shell=shell,
+        cwd=cwd
         )
 
     for stdout_line in iter(process.stdout.readline, ""):
@@ -57,7 +77,7 @@ def run_command(cmd, env=None, dry=False, shell=False):
         logger.info('Command exited with status 0 - all good')
     else:
         logger.error('Exit status {0} for command: {1}'.format(returncode, cmd))
-        raise subprocess.CalledProcessError(cmd, returncode)
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 
 def run_multiple_commands(cmds, env=None, dry=False):
@@ -72,7 +92,8 @@ def run_multiple_commands(cmds, env=None, dry=False):
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         env=env,
-        # universal_newlines=True,
+        # Text mode, so str can be written to stdin in both Python 2 and 3
+        universal_newlines=True,
         bufsize=1,
         close_fds=True
         )
@@ -104,7 +125,7 @@ def run_multiple_commands(cmds, env=None, dry=False):
     if (returncode == 0):
         logger.info('Command exited with status 0 - all good')
     else:
-        raise subprocess.CalledProcessError(cmd, returncode)
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 
 def create_directory(dir, force=False, dry=False, must_not_exist=False):
@@ -145,6 +166,58 @@ def make_inode_unique(file):
     return file.format(i_attempt=i_attempt)
 
 
+def _is_excluded(name, exclude):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in exclude)
+
+
+def hash_directory(directory, exclude=None):
+    """
+    Returns a sha1 hex digest of the relative paths and contents of all files in directory
+    """
+    exclude = [] if exclude is None else exclude
+    sha = hashlib.sha1()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not _is_excluded(d, exclude))
+        for name in sorted(files):
+            if _is_excluded(name, exclude): continue
+            path = osp.join(root, name)
+            sha.update(osp.relpath(path, directory).encode('utf-8'))
+            with open(path, 'rb') as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+def link_tree(src, dst, exclude=None, dry=False):
+    """
+    Recreates the directory structure of src in dst, hardlinking the files
+    instead of copying them. Falls back to copying if hardlinking is not
+    possible (e.g. src and dst on different devices).
+    Files or directories whose basename matches a pattern in exclude are skipped.
+    """
+    exclude = [] if exclude is None else exclude
+    logger.info('Hardlinking {0} ==> {1}'.format(src, dst))
+    if dry: return
+    n_linked = 0
+    n_copied = 0
+    for root, dirs, files in os.walk(src):
+        dirs[:] = [ d for d in dirs if not _is_excluded(d, exclude) ]
+        dst_root = osp.join(dst, osp.relpath(root, src))
+        if not osp.isdir(dst_root): os.makedirs(dst_root)
+        for name in files:
+            if _is_excluded(name, exclude): continue
+            src_file = osp.join(root, name)
+            dst_file = osp.join(dst_root, name)
+            if osp.lexists(dst_file): os.remove(dst_file)
+            try:
+                os.link(src_file, dst_file)
+                n_linked += 1
+            except OSError as e:
+                if not e.errno in [ errno.EXDEV, errno.EPERM, errno.EMLINK ]: raise
+                shutil.copy2(src_file, dst_file)
+                n_copied += 1
+    logger.info('Hardlinked {0} files, copied {1} files'.format(n_linked, n_copied))
+
+
 def check_proxy():
     # cmd = 'voms-proxy-info -exists -valid 168:00' # Check if there is an existing proxy for a full week
     try:
@@ -256,6 +329,88 @@ def compile_cmssw_src(cmssw_src, arch):
     logger.info('Done compiling {0} with scram arch {1}'.format(cmssw_src, arch))
 
 
+# Environment changes of `scramv1 runtime`, per CMSSW src directory
+_CMSSW_ENV_CACHE = {}
+
+# Variables that describe the shell rather than the release
+_SHELL_ENV_VARS = [ 'PWD', 'OLDPWD', 'SHLVL', '_' ]
+
+def _capture_cmssw_environment(cmssw_src, arch=None):
+    """
+    Returns the full environment (dict) after `scramv1 runtime` in cmssw_src
+    """
+    logger.info('Capturing CMSSW environment of {0}'.format(cmssw_src))
+    cmds = [ 'source /cvmfs/cms.cern.ch/cmsset_default.sh' ]
+    if not(arch is None): cmds.append('export SCRAM_ARCH={0}'.format(arch))
+    cmds.extend([
+        'cd {0}'.format(cmssw_src),
+        'eval `scramv1 runtime -sh`',
+        'env -0',
+        ])
+    output = subprocess.check_output([ 'bash', '-c', ' && '.join(cmds) ])
+    if not isinstance(output, str): output = output.decode('utf-8', 'replace')
+    return dict(item.split('=', 1) for item in output.split('\0') if '=' in item)
+
+
+def _matches_current_environment(cmssw_env):
+    """
+    Checks whether the variables touched by scram had the same values as now when
+    cmssw_env was captured; values like PATH are absolute, and built on the
+    values of the environment scram ran in
+    """
+    base = cmssw_env.get('base')
+    if base is None: return False
+    return all(os.environ.get(key) == value for key, value in base.items())
+
+
+def get_cmssw_environment(cmssw_src, arch=None, use_cache_file=True):
+    """
+    Returns the environment (dict) of `cmsenv` in cmssw_src, so commands can be
+    run in the release without starting a shell and calling scramv1 each time.
+    `scramv1 runtime` only runs once per release and base environment: the
+    variables it sets and unsets are kept in memory and in a json file in the
+    CMSSW directory, together with the values they had before, and are applied
+    to the current os.environ. If any of those variables has a different value
+    now, the environment is captured again.
+    """
+    cmssw_src = osp.abspath(cmssw_src)
+    cache_file = osp.join(osp.dirname(cmssw_src), '.svjgenprod_runtime_env.json')
+    cmssw_env = _CMSSW_ENV_CACHE.get(cmssw_src)
+    if not(cmssw_env is None) and not _matches_current_environment(cmssw_env):
+        cmssw_env = None
+    if cmssw_env is None and use_cache_file and osp.isfile(cache_file):
+        with open(cache_file, 'r') as f:
+            cmssw_env = json.load(f)
+        if _matches_current_environment(cmssw_env):
+            logger.info('Using CMSSW environment from {0}'.format(cache_file))
+        else:
+            logger.info('Environment changed since {0} was written'.format(cache_file))
+            cmssw_env = None
+    if cmssw_env is None:
+        env = _capture_cmssw_environment(cmssw_src, arch)
+        changed = dict(
+            (key, value) for key, value in env.items()
+            if os.environ.get(key) != value and not key in _SHELL_ENV_VARS
+            )
+        removed = [ key for key in os.environ if not key in env and not key in _SHELL_ENV_VARS ]
+        cmssw_env = {
+            'changed' : changed,
+            'removed' : sorted(removed),
+            'base'    : dict((key, os.environ.get(key)) for key in list(changed) + removed),
+            }
+        if use_cache_file:
+            tmp_file = '{0}.tmp{1}'.format(cache_file, os.getpid())
+            with open(tmp_file, 'w') as f:
+                json.dump(cmssw_env, f, indent=2, sort_keys=True)
+            os.rename(tmp_file, cache_file)
+    _CMSSW_ENV_CACHE[cmssw_src] = cmssw_env
+    env = os.environ.copy()
+    env.update(cmssw_env['changed'])
+    for key in cmssw_env['removed']:
+        env.pop(key, None)
+    return env
+
+
 def compile_cmssw(workdir, version, arch):
     """
     As compile_cmssw_src but takes separated arguments
@@ -306,19 +461,54 @@ def tarball_head(outfile=None):
         run_command(['git', 'archive', '-o', outfile, 'HEAD'])
 
 
+def iter_lines_reversed(filename, blocksize=64*1024):
+    """
+    Yields the lines of a file from last to first, reading blocks from the end
+    of the file, so summaries at the end of long logs are found without reading
+    the whole file. Lines are yielded as bytes without the newline.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            read_size = min(blocksize, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            # The first line may continue in the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                yield line
+        yield remainder
+
+
+MG_CROSSSECTION_REGEX = re.compile(br'Cross-section :\s+(\d*\.?\d+(?:[eE][-+]?\d+)?)(?:\s+\+-\s+(\d*\.?\d+(?:[eE][-+]?\d+)?))?')
+
+def get_mg_crosssection_and_error_from_logfile(log_file):
+    """
+    Gets the madgraph cross section and its uncertainty (None if not printed)
+    from the log file that was created when creating a gridpack.
+    The log is scanned from the end, where the final summary is.
+    """
+    for line in iter_lines_reversed(log_file):
+        match = MG_CROSSSECTION_REGEX.search(line)
+        if match: break
+    else:
+        raise ValueError(
+            'Could not determine cross section from log_file {0}'.format(log_file)
+            )
+    xs = float(match.group(1))
+    xs_error = None if match.group(2) is None else float(match.group(2))
+    logger.info('Found cross section %s +- %s from log_file %s', xs, xs_error, log_file)
+    return xs, xs_error
+
+
 def get_mg_crosssection_from_logfile(log_file):
     """
     Gets the madgraph cross section from the log file that was created when creating a gridpack
     """
-    with open(log_file) as f:
-        match = re.search(r'(?<=Cross-section :   )(\d*.\d+)', f.read())
-        if not match:
-            raise ValueError(
-                'Could not determine cross section from log_file {0}'.format(log_file)
-                )
-    xs = match.group(1)
-    logger.info('Found cross section %s from log_file %s', xs, log_file)
-    return float(xs)
+    return get_mg_crosssection_and_error_from_logfile(log_file)[0]
 
 def copy_to_output(file, change_name=None, dry=False):
     """
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import logging, sqlite3, time
+
+import svjgenprod
+logger = logging.getLogger('root')
+
+
+# The MadGraph cross section only depends on the parameters that enter the
+# gridpack, so records are keyed on SampleSpec.gridpack_key
+CREATE_TABLE = (
+    'CREATE TABLE IF NOT EXISTS xsecs ('
+    ' gridpack_key TEXT PRIMARY KEY,'
+    ' process_type TEXT,'
+    ' year INTEGER,'
+    ' m_med INTEGER,'
+    ' m_d INTEGER,'
+    ' xsec REAL,'
+    ' xsec_error REAL,'
+    ' source TEXT,'
+    ' timestamp REAL'
+    ')'
+    )
+
+
+def connect(db_file=None):
+    if db_file is None: db_file = svjgenprod.SVJ_XSEC_DB
+    svjgenprod.utils.create_directory(osp.dirname(osp.abspath(db_file)))
+    # Generous timeout: several jobs may write to the same database
+    connection = sqlite3.connect(db_file, timeout=60.)
+    connection.execute(CREATE_TABLE)
+    return connection
+
+
+def get_gridpack_fields(spec):
+    """
+    Returns (gridpack_key, process_type, year, m_med, m_d) of a SampleSpec or a
+    Config; a Config only needs the parameters that enter the gridpack (so no
+    n_f, which gridpack configs usually do not have)
+    """
+    if isinstance(spec, svjgenprod.SampleSpec):
+        return spec.gridpack_key, spec.process_type, spec.year, spec.m_med, spec.m_d
+    return (
+        spec.get_gridpack_key(), str(spec['process_type']),
+        int(spec['year']), int(spec['m_med']), int(spec['m_d'])
+        )
+
+
+def store_xsec(spec, xsec, xsec_error=None, source='', db_file=None):
+    """
+    Inserts or updates the cross section (pb) of the gridpack of spec
+    (a SampleSpec or Config)
+    """
+    fields = get_gridpack_fields(spec)
+    logger.info(
+        'Storing cross section {0} +- {1} pb for {2} in {3}'
+        .format(xsec, xsec_error, fields[0], db_file or svjgenprod.SVJ_XSEC_DB)
+        )
+    connection = connect(db_file)
+    try:
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO xsecs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                fields + (xsec, xsec_error, source, time.time())
+                )
+    finally:
+        connection.close()
+
+
+def get_xsec(spec, db_file=None):
+    """
+    Returns (xsec, xsec_error) for spec (a SampleSpec or Config), or None if
+    it is not in the database
+    """
+    gridpack_key = get_gridpack_fields(spec)[0]
+    if db_file is None: db_file = svjgenprod.SVJ_XSEC_DB
+    if not osp.isfile(db_file): return None
+    connection = connect(db_file)
+    try:
+        row = connection.execute(
+            'SELECT xsec, xsec_error FROM xsecs WHERE gridpack_key = ?',
+            (gridpack_key,)
+            ).fetchone()
+    finally:
+        connection.close()
+    if row is None: return None
+    logger.debug('Found xs = {0} +- {1} for {2} in {3}'.format(row[0], row[1], gridpack_key, db_file))
+    return row[0], row[1]
+
+
+def store_xsec_from_logfile(spec, log_file, db_file=None):
+    """
+    Reads the cross section from a gridpack log file and stores it
+    """
+    xsec, xsec_error = svjgenprod.utils.get_mg_crosssection_and_error_from_logfile(log_file)
+    store_xsec(spec, xsec, xsec_error, source=osp.abspath(log_file), db_file=db_file)
+    return xsec, xsec_error
+
+
+def all_xsecs(db_file=None):
+    """
+    Returns all records as a list of dicts, sorted by gridpack key
+    """
+    connection = connect(db_file)
+    try:
+        cursor = connection.execute('SELECT * FROM xsecs ORDER BY gridpack_key')
+        columns = [ d[0] for d in cursor.description ]
+        return [ dict(zip(columns, row)) for row in cursor ]
+    finally:
+        connection.close()
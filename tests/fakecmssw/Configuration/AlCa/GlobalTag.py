@@ -0,0 +1,3 @@
+def GlobalTag(essource, globaltag, conditions=None):
+    essource.globaltag = globaltag
+    return essource
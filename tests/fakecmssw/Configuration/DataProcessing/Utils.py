@@ -0,0 +1,2 @@
+def addMonitoring(process):
+    return process
@@ -0,0 +1,5 @@
+import FWCore.ParameterSet.Config as cms
+
+RAWSIMEventContent = cms.PSet(outputCommands = cms.untracked.vstring('drop *', 'keep *_generator_*_*', 'keep *_g4SimHits_*_*'))
+PREMIXRAWEventContent = cms.PSet(outputCommands = cms.untracked.vstring('drop *', 'keep FEDRawDataCollection_rawDataCollector_*_*'))
+NANOAODSIMEventContent = cms.PSet(outputCommands = cms.untracked.vstring('drop *', 'keep nanoaodFlatTable_*Table_*_*'))
@@ -0,0 +1,4 @@
+import FWCore.ParameterSet.Config as cms
+
+mixData = cms.EDProducer('PreMixingModule', input = cms.PSet(fileNames = cms.untracked.vstring()))
+pdatamix = cms.Sequence(mixData)
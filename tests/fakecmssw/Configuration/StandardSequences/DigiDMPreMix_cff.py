@@ -0,0 +1,4 @@
+import FWCore.ParameterSet.Config as cms
+
+mix = cms.EDProducer('MixingModule')
+pdigi = cms.Sequence(cms.SequencePlaceholder('randomEngineStateProducer') * mix)
@@ -0,0 +1,4 @@
+import FWCore.ParameterSet.Config as cms
+
+rawDataCollector = cms.EDProducer('RawDataCollectorByLabel')
+DigiToRaw = cms.Sequence(rawDataCollector)
@@ -0,0 +1,3 @@
+import FWCore.ParameterSet.Config as cms
+
+endOfProcess = cms.EDProducer('EndOfProcess')
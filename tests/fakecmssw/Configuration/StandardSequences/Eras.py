@@ -0,0 +1,5 @@
+class _Eras(object):
+    def __getattr__(self, name):
+        return name
+
+eras = _Eras()
@@ -0,0 +1,3 @@
+import FWCore.ParameterSet.Config as cms
+
+GlobalTag = cms.ESSource('PoolDBESSource', globaltag = cms.string(''))
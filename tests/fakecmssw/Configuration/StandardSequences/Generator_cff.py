@@ -0,0 +1,25 @@
+import FWCore.ParameterSet.Config as cms
+
+VtxSmeared = cms.EDProducer('BetafuncEvtVtxGenerator')
+generatorSmeared = cms.EDProducer('GeneratorSmearedProducer')
+genParticles = cms.EDProducer('GenParticleProducer')
+genParticlesForJets = cms.EDProducer('InputGenJetsParticleSelector', ignoreParticleIDs = cms.vuint32(1000022, 1000012))
+genParticlesForJetsNoNu = cms.EDProducer('InputGenJetsParticleSelector', ignoreParticleIDs = cms.vuint32(1000022, 12, 14, 16))
+genParticlesForJetsNoMuNoNu = cms.EDProducer('InputGenJetsParticleSelector', ignoreParticleIDs = cms.vuint32(1000022, 12, 13, 14, 16))
+genCandidatesForMET = cms.EDProducer('InputGenJetsParticleSelector', ignoreParticleIDs = cms.vuint32(1000022, 12, 14, 16))
+genParticlesForMETAllVisible = cms.EDProducer('InputGenJetsParticleSelector', ignoreParticleIDs = cms.vuint32(1000022, 12, 14, 16))
+ak4GenJets = cms.EDProducer('FastjetJetProducer')
+ak8GenJets = cms.EDProducer('FastjetJetProducer')
+ak4GenJetsNoNu = cms.EDProducer('FastjetJetProducer')
+genMetTrue = cms.EDProducer('GenMETProducer')
+genstepfilter = cms.EDFilter('GenFilterEfficiencyProducer', triggerConditions = cms.vstring())
+
+genJetParticles = cms.Sequence(genParticlesForJets)
+recoGenJets = cms.Sequence(ak4GenJets + ak8GenJets)
+recoAllGenJetsNoNu = cms.Sequence(ak4GenJetsNoNu)
+genMETParticles = cms.Sequence(genCandidatesForMET + genParticlesForMETAllVisible)
+recoGenMET = cms.Sequence(genMetTrue)
+genJetMET = cms.Sequence(genJetParticles * recoGenJets + genMETParticles * recoGenMET)
+VertexSmearing = cms.Sequence(VtxSmeared)
+GeneInfo = cms.Sequence(genParticles)
+pgen = cms.Sequence(cms.SequencePlaceholder('randomEngineStateProducer') + VertexSmearing + generatorSmeared + GeneInfo + genJetMET)
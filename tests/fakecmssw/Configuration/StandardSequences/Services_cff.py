@@ -0,0 +1,11 @@
+import FWCore.ParameterSet.Config as cms
+
+RandomNumberGeneratorService = cms.Service('RandomNumberGeneratorService',
+    generator = cms.PSet(initialSeed = cms.untracked.uint32(123456789), engineName = cms.untracked.string('HepJamesRandom')),
+    VtxSmeared = cms.PSet(initialSeed = cms.untracked.uint32(98765432), engineName = cms.untracked.string('HepJamesRandom')),
+    g4SimHits = cms.PSet(initialSeed = cms.untracked.uint32(11), engineName = cms.untracked.string('HepJamesRandom')),
+    mix = cms.PSet(initialSeed = cms.untracked.uint32(12345), engineName = cms.untracked.string('HepJamesRandom')),
+    mixData = cms.PSet(initialSeed = cms.untracked.uint32(12345), engineName = cms.untracked.string('HepJamesRandom')),
+    simMuonDTDigis = cms.PSet(initialSeed = cms.untracked.uint32(1234567), engineName = cms.untracked.string('TRandom3')),
+    saveFileName = cms.untracked.string(''),
+    )
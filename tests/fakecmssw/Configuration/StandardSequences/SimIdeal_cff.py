@@ -0,0 +1,4 @@
+import FWCore.ParameterSet.Config as cms
+
+g4SimHits = cms.EDProducer('OscarMTProducer')
+psim = cms.Sequence(cms.SequencePlaceholder('randomEngineStateProducer') * g4SimHits)
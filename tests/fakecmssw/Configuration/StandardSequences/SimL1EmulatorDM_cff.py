@@ -0,0 +1,4 @@
+import FWCore.ParameterSet.Config as cms
+
+simGtDigis = cms.EDProducer('L1TGlobalProducer')
+SimL1Emulator = cms.Sequence(simGtDigis)
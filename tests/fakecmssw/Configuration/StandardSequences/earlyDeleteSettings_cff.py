@@ -0,0 +1,2 @@
+def customiseEarlyDelete(process):
+    return process
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal stand-in for FWCore.ParameterSet.Config, with just enough of the
+python configuration API to execute saved cmsDriver cfgs plus the blocks
+svjgenprod appends to them, and to inspect the resulting process:
+
+- parameters are plain python values (vstrings are lists);
+- modules and sequences compose with + and * into ordered lists;
+- Sequence/Path.replace and re-assigning a process label update all
+  sequences and paths that use the object, as in CMSSW;
+- process.load imports a (fake) cff and adds copies of its objects.
+"""
+import copy, importlib
+
+
+def _value(*args):
+    return args[0] if len(args) == 1 else list(args)
+
+def _list(*args):
+    if len(args) == 1 and isinstance(args[0], (list, tuple)): return list(args[0])
+    return list(args)
+
+int32 = uint32 = int64 = uint64 = double = bool = string = _value
+vstring = vint32 = vuint32 = vdouble = VInputTag = _list
+
+def InputTag(*args):
+    return ':'.join(str(a) for a in args)
+
+ESInputTag = InputTag
+
+
+class PSet(object):
+    def __init__(self, *args, **kwargs):
+        for key, value in kwargs.items(): setattr(self, key, value)
+
+    def clone(self, **kwargs):
+        new = copy.deepcopy(self)
+        for key, value in kwargs.items(): setattr(new, key, value)
+        return new
+
+
+class untracked(object):
+    PSet = PSet
+    int32 = uint32 = int64 = uint64 = double = bool = string = staticmethod(_value)
+    vstring = vint32 = vuint32 = vdouble = VInputTag = staticmethod(_list)
+    InputTag = staticmethod(InputTag)
+
+
+class _Node(object):
+    """Something that can be placed in a sequence"""
+    def __add__(self, other):
+        return _Expression(_items(self) + _items(other))
+    __mul__ = __add__
+
+    def label(self):
+        return getattr(self, '_label', None)
+
+
+def _items(node):
+    if isinstance(node, _Expression): return list(node.items)
+    return [ node ]
+
+
+class _Expression(_Node):
+    def __init__(self, items):
+        self.items = items
+
+
+class _Module(PSet, _Node):
+    def __init__(self, type_, *args, **kwargs):
+        super(_Module, self).__init__(*args, **kwargs)
+        self.type_ = type_
+
+class EDProducer(_Module): pass
+class EDFilter(_Module): pass
+class EDAnalyzer(_Module): pass
+class OutputModule(_Module): pass
+class Source(_Module): pass
+class Service(_Module): pass
+class ESSource(_Module): pass
+class ESProducer(_Module): pass
+class ESPrefer(_Module): pass
+
+
+class SequencePlaceholder(_Node):
+    def __init__(self, name):
+        self.name = name
+
+
+class Sequence(_Node):
+    def __init__(self, *args):
+        self.items = []
+        for arg in args: self.items.extend(_items(arg))
+
+    def _get_seq(self):
+        return _Expression(list(self.items))
+
+    def _set_seq(self, expression):
+        self.items = _items(expression)
+
+    _seq = property(_get_seq, _set_seq)
+
+    def __iadd__(self, other):
+        self.items.extend(_items(other))
+        return self
+
+    def insert(self, index, node):
+        self.items.insert(index, node)
+
+    def replace(self, original, replacement):
+        """Replaces original by replacement here and in all nested sequences"""
+        for i, item in enumerate(self.items):
+            if item is original:
+                self.items[i] = replacement
+            elif isinstance(item, Sequence):
+                item.replace(original, replacement)
+
+    def remove(self, node):
+        self.items = [ item for item in self.items if not(item is node) ]
+        for item in self.items:
+            if isinstance(item, Sequence): item.remove(node)
+
+    def modules(self):
+        """Flattened list of the modules, in execution order"""
+        modules = []
+        for item in self.items:
+            if isinstance(item, Sequence):
+                modules.extend(item.modules())
+            elif isinstance(item, _Module):
+                modules.append(item)
+        return modules
+
+    def contains(self, node):
+        return any(item is node or (isinstance(item, Sequence) and item.contains(node)) for item in self.items)
+
+class Task(Sequence): pass
+class Path(Sequence): pass
+class EndPath(Sequence): pass
+
+
+class Schedule(list):
+    def __init__(self, *args, **kwargs):
+        super(Schedule, self).__init__(args)
+
+    def associate(self, *tasks):
+        pass
+
+
+class Process(object):
+    def __init__(self, name, *modifiers):
+        object.__setattr__(self, '_labels', [])
+        object.__setattr__(self, 'name_', name)
+
+    def __setattr__(self, name, value):
+        old = getattr(self, name, None)
+        if isinstance(old, _Node) and not(old is value):
+            # Like CMSSW, re-assigning a label replaces it everywhere it is used
+            for label in self._labels:
+                other = getattr(self, label)
+                if isinstance(other, Sequence): other.replace(old, value)
+        if isinstance(value, _Node) and getattr(value, '_label', None) is None:
+            value._label = name
+        if not name in self._labels: self._labels.append(name)
+        object.__setattr__(self, name, value)
+
+    def _of_type(self, Type):
+        return dict(
+            (label, getattr(self, label)) for label in self._labels
+            if type(getattr(self, label)) is Type
+            )
+
+    @property
+    def paths(self):
+        return self._of_type(Path)
+
+    @property
+    def endpaths(self):
+        return self._of_type(EndPath)
+
+    @property
+    def outputModules(self):
+        return self._of_type(OutputModule)
+
+    def load(self, name):
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            return
+        objects = dict(
+            (label, value) for label, value in vars(module).items()
+            if isinstance(value, (PSet, _Node, Schedule)) and not label.startswith('_')
+            )
+        # Copy all objects together, so references between them are kept
+        for label, value in copy.deepcopy(objects).items():
+            setattr(self, label, value)
@@ -0,0 +1,3 @@
+import FWCore.ParameterSet.Config as cms
+
+genFilterSummary = cms.EDAnalyzer('GenFilterInfoSummary')
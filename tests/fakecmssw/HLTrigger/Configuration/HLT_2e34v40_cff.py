@@ -0,0 +1,5 @@
+import FWCore.ParameterSet.Config as cms
+
+hltTriggerType = cms.EDFilter('HLTTriggerTypeFilter')
+HLTriggerFirstPath = cms.Path(hltTriggerType)
+HLTSchedule = cms.Schedule(HLTriggerFirstPath)
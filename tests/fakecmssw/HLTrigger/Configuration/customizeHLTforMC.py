@@ -0,0 +1,2 @@
+def customizeHLTforMC(process):
+    return process
@@ -0,0 +1,14 @@
+class RandomNumberServiceHelper(object):
+    def __init__(self, randService):
+        self._randService = randService
+
+    def _engines(self):
+        return [ pset for pset in vars(self._randService).values() if hasattr(pset, 'initialSeed') ]
+
+    def resetSeeds(self, value):
+        """Resets all seeds to the given value"""
+        for pset in self._engines():
+            pset.initialSeed = value
+
+    def populate(self, *args):
+        pass
@@ -0,0 +1,18 @@
+import FWCore.ParameterSet.Config as cms
+
+mergedGenParticles = cms.EDProducer('MergedGenParticleProducer')
+genParticles2HepMC = cms.EDProducer('GenParticles2HepMCConverter')
+genParticles2HepMCHiggsVtx = cms.EDProducer('GenParticles2HepMCConverter')
+particleLevel = cms.EDProducer('ParticleLevelProducer')
+tautagger = cms.EDProducer('GenJetTauTaggerProducer')
+rivetProducerHTXS = cms.EDProducer('HTXSRivetProducer')
+rivetLeptonTable = cms.EDProducer('SimpleCandidateFlatTableProducer')
+rivetMetTable = cms.EDProducer('SimpleCandidateFlatTableProducer')
+HTXSCategoryTable = cms.EDProducer('SimpleHTXSFlatTableProducer')
+jetTable = cms.EDProducer('SimpleCandidateFlatTableProducer')
+particleLevelSequence = cms.Sequence(mergedGenParticles + genParticles2HepMC + particleLevel + tautagger + genParticles2HepMCHiggsVtx + rivetProducerHTXS)
+particleLevelTables = cms.Sequence(rivetLeptonTable + rivetMetTable + HTXSCategoryTable)
+nanoSequenceMC = cms.Sequence(particleLevelSequence + jetTable + particleLevelTables)
+
+def nanoAOD_customizeMC(process):
+    return process
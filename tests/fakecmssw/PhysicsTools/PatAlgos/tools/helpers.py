@@ -0,0 +1,2 @@
+def associatePatAlgosToolsTask(process):
+    pass
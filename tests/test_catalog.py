@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import os, shutil, tempfile, unittest
+
+import svjgenprod
+from svjgenprod import catalog
+
+
+@unittest.skipIf(catalog.np is None, 'needs numpy')
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.catalog_file = osp.join(self.tmpdir, 'catalog.npz')
+        spec = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 0.2)
+        self.specs = [ spec, spec.replace(alpha_d='peak'), spec.replace(m_med=2000, r_inv=0.5) ]
+        catalog.add_points(self.specs, self.catalog_file)
+        self.table = catalog.read_catalog(self.catalog_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_select_alpha_d(self):
+        for alpha_d in [ 0.2, '0.2', '0.20', u'0.2' ]:
+            self.assertEqual(catalog.select(self.table, alpha_d=alpha_d).sum(), 2, alpha_d)
+        self.assertEqual(catalog.select(self.table, alpha_d='peak').sum(), 1)
+        self.assertEqual(catalog.select(self.table, alpha_d=[0.2, 'peak']).sum(), 3)
+        self.assertEqual(catalog.select(self.table, alpha_d=0.3).sum(), 0)
+
+    def test_select_numeric(self):
+        self.assertEqual(catalog.select(self.table, m_med='3000').sum(), 2)
+        self.assertEqual(catalog.select(self.table, m_med=[2000, 3000.], r_inv='0.5').sum(), 1)
+        self.assertEqual(catalog.select(self.table, stage='point').sum(), 3)
+
+    def test_update_replaces_and_missing(self):
+        catalog.record_artifact(self.specs[0], 'AOD_step2', '/store/a.root', self.catalog_file, n_events=10)
+        catalog.record_artifact(self.specs[0], 'AOD_step2', '/store/a.root', self.catalog_file, n_events=20)
+        table = catalog.read_catalog(self.catalog_file)
+        self.assertEqual(table.size, 4)
+        self.assertEqual(table['n_events'][catalog.select(table, stage='AOD_step2')].tolist(), [ 20 ])
+        missing = catalog.missing(table, 'AOD_step2', alpha_d=0.2)
+        self.assertEqual(missing['m_med'].tolist(), [ 2000 ])
+
+    def test_compact(self):
+        catalog.record_artifact(self.specs[0], 'AOD_step2', '/store/a.root', self.catalog_file, n_events=10)
+        catalog.record_artifact(self.specs[1], 'AOD_step2', '/store/b.root', self.catalog_file, n_events=10)
+        catalog.record_artifact(self.specs[0], 'AOD_step2', '/store/a.root', self.catalog_file, n_events=20)
+        # Every update only writes a fragment
+        self.assertFalse(osp.isfile(self.catalog_file))
+        self.assertEqual(len(catalog.list_fragments(self.catalog_file)), 4)
+        before = catalog.read_catalog(self.catalog_file)
+        table = catalog.compact_catalog(self.catalog_file)
+        self.assertEqual(catalog.list_fragments(self.catalog_file), [])
+        self.assertTrue(osp.isfile(self.catalog_file))
+        after = catalog.read_catalog(self.catalog_file)
+        for column in [ 'point_key', 'stage', 'path', 'n_events', 'timestamp' ]:
+            self.assertEqual(after[column].tolist(), before[column].tolist())
+            self.assertEqual(after[column].tolist(), table[column].tolist())
+        self.assertEqual(after.dtype, catalog.empty_table().dtype)
+        self.assertEqual(after['path'].tolist()[-2:], [ '/store/b.root', '/store/a.root' ])
+        self.assertEqual(after['n_events'].tolist()[-1], 20)
+        # Paths are stored only as wide as needed
+        with catalog.np.load(self.catalog_file) as npz:
+            self.assertEqual(npz['catalog'].dtype['path'], catalog.np.dtype('U13'))
+
+    def test_record_without_n_f(self):
+        # Gridpack and LHE configs have no n_f
+        config = svjgenprod.Config(process_type='s-channel', year=2018, m_med=1500, m_d=10, r_inv=0.3, alpha_d='peak')
+        lhe_file = osp.join(self.tmpdir, 'events.lhe')
+        with open(lhe_file, 'w') as f:
+            f.write('<LesHouchesEvents>\n</LesHouchesEvents>\n')
+        tarball = osp.join(self.tmpdir, 'SVJ_s_2018_mZprime-1500_slc7_amd64_gcc700_CMSSW_10_6_0_tarball.tar.xz')
+        lhemaker = svjgenprod.LHEMaker(config, tarball, 10)
+        lhemaker.catalog_file = self.catalog_file
+        lhemaker.record_in_catalog(lhe_file)
+        table = catalog.read_catalog(self.catalog_file)
+        row = table[catalog.select(table, stage='lhe')]
+        self.assertEqual(row['path'].tolist(), [ lhe_file ])
+        self.assertEqual(row['n_f'].tolist(), [ -1 ])
+        self.assertEqual(row['point_key'].tolist(), [ config.to_spec().digest() ])
+        self.assertEqual(catalog.select(table, n_f=None, stage='lhe').sum(), 1)
+        self.assertEqual(catalog.missing(table, 'lhe', m_med=1500).size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests of the py2/py3-compatible core: Config, utils, the condor jdl file and
+the LHE pid replacement. Run with `python -m unittest discover -s tests` under
+both Python 2 and 3.
+"""
+from __future__ import print_function
+
+import os.path as osp
+import os, shutil, subprocess, tempfile, gzip, unittest
+
+import svjgenprod
+
+CONFIG_FILE = """
+[default]
+process_type = s-channel
+year = 2017
+m_med = 3000
+m_d = 20
+n_f = 2
+r_inv = 0.3
+alpha_d = 0.2
+
+[t-channel]
+process_type = t-channel
+year = 2018
+m_med = 1500
+m_d = 10
+n_f = 4
+r_inv = 0.5
+alpha_d = 0.1
+"""
+
+LHE = b"""<LesHouchesEvents version="3.0">
+<init>
+ 2212 2212 6.500000e+03 6.500000e+03 0 0 247000 247000 -4 1
+</init>
+<event>
+ 3 1 +1.0e+00 1.0e+02 7.8e-03 1.2e-01
+       21 -1    0    0  503  502 +0.0e+00 +0.0e+00 +1.5e+03 1.5e+03 0.0e+00 0.0e+00 -1.0e+00
+  5000521  1    1    2    0    0 +1.0e+01 +0.0e+00 +7.0e+02 7.0e+02 2.0e+01 0.0e+00 -1.0e+00
+ -5000521  1    1    2    0    0 -1.0e+01 +0.0e+00 -7.0e+02 7.0e+02 2.0e+01 0.0e+00 1.0e+00
+</event>
+<event>
+ 2 1 +1.0e+00 1.0e+02 7.8e-03 1.2e-01
+  5000521  1    1    2    0    0 +1.0e+01 +0.0e+00 +7.0e+02 7.0e+02 2.0e+01 0.0e+00 -1.0e+00
+       21  1    1    2    0    0 -1.0e+01 +0.0e+00 -7.0e+02 7.0e+02 0.0e+00 0.0e+00 1.0e+00
+</event>
+</LesHouchesEvents>
+"""
+
+TARBALL = 'SVJ_s_2017_mZprime-3000_mDark-20_rinv-0.3_alpha-peak_slc7_amd64_gcc700_CMSSW_10_6_0_tarball.tar.xz'
+
+
+class TmpDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, basename, contents, mode='w'):
+        path = osp.join(self.tmpdir, basename)
+        with open(path, mode) as f:
+            f.write(contents)
+        return path
+
+
+class TestConfig(TmpDirTestCase):
+
+    def test_from_file(self):
+        config_file = self.write('config.cfg', CONFIG_FILE)
+        config = svjgenprod.Config.from_file(config_file)
+        self.assertEqual(config['process_type'], 's-channel')
+        self.assertEqual(config['year'], 2017)
+        self.assertEqual(config['m_med'], 3000)
+        self.assertEqual(config['m_d'], 20)
+        self.assertEqual(config['n_f'], 2)
+        for key in [ 'year', 'm_med', 'm_d', 'n_f' ]:
+            self.assertTrue(isinstance(config[key], int), key)
+        self.assertEqual(config['r_inv'], 0.3)
+        self.assertEqual(config['alpha_d'], 0.2)
+
+    def test_from_file_section(self):
+        config_file = self.write('config.cfg', CONFIG_FILE)
+        config = svjgenprod.Config.from_file(config_file, section='t-channel')
+        self.assertEqual(config['process_type'], 't-channel')
+        self.assertEqual(config['year'], 2018)
+        self.assertEqual(config['n_f'], 4)
+        self.assertEqual(config['r_inv'], 0.5)
+
+    def test_load_returns_copies(self):
+        config_file = self.write('config.cfg', CONFIG_FILE)
+        config = svjgenprod.Config.load(config_file)
+        config['m_med'] = 1
+        self.assertEqual(svjgenprod.Config.load(config_file)['m_med'], 3000)
+
+
+class TestSampleSpec(unittest.TestCase):
+
+    def test_canonical_types(self):
+        spec = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 0.2)
+        equal_specs = [
+            svjgenprod.SampleSpec(u's-channel', 2017.0, '3000', 20, 2.0, '0.3', '0.2'),
+            svjgenprod.SampleSpec('s-channel', '2017', 3000.0, '20', '2', 0.30, 0.20),
+            ]
+        for other in equal_specs:
+            self.assertEqual(other, spec)
+            self.assertEqual(hash(other), hash(spec))
+            self.assertEqual(other.digest(), spec.digest())
+            self.assertEqual(other.model_name, spec.model_name)
+            self.assertEqual(other.gridpack_key, spec.gridpack_key)
+        for name in [ 'year', 'm_med', 'm_d', 'n_f' ]:
+            self.assertTrue(isinstance(getattr(equal_specs[0], name), int), name)
+        self.assertTrue(isinstance(equal_specs[0].r_inv, float))
+        self.assertTrue(isinstance(equal_specs[0].alpha_d, float))
+
+    def test_optional_n_f(self):
+        config = svjgenprod.Config(process_type='s-channel', year=2017, m_med=3000, m_d=20, r_inv=0.3, alpha_d='peak')
+        spec = config.to_spec()
+        self.assertEqual(spec.n_f, None)
+        self.assertEqual(spec.to_config(), config)
+        self.assertNotEqual(spec, spec.replace(n_f=2))
+        self.assertEqual(spec.gridpack_key, spec.replace(n_f=2).gridpack_key)
+
+    def test_named_alpha_d(self):
+        spec = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, u'peak')
+        self.assertEqual(spec.alpha_d, 'peak')
+        self.assertEqual(spec, spec.replace(alpha_d='peak'))
+
+    def test_invalid_values(self):
+        with self.assertRaises(TypeError):
+            svjgenprod.SampleSpec('s-channel', 2017, 3000.5, 20, 2, 0.3, 'peak')
+        with self.assertRaises(ValueError):
+            svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 'x', 'peak')
+
+
+class TestXsecDB(TmpDirTestCase):
+
+    def test_config_without_n_f(self):
+        db_file = osp.join(self.tmpdir, 'xsecs.sqlite')
+        config = svjgenprod.Config(process_type='s-channel', year=2017, m_med=3000, m_d=20, r_inv=0.3, alpha_d='peak')
+        svjgenprod.xsecdb.store_xsec(config, 1.5, 0.1, db_file=db_file)
+        # Shared by all points with the same gridpack parameters
+        spec = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 4, 0.5, 0.2)
+        self.assertEqual(svjgenprod.xsecdb.get_xsec(spec, db_file=db_file), (1.5, 0.1))
+        self.assertEqual(svjgenprod.xsecdb.get_xsec(config, db_file=db_file), (1.5, 0.1))
+        record, = svjgenprod.xsecdb.all_xsecs(db_file)
+        self.assertEqual(record['gridpack_key'], spec.gridpack_key)
+        self.assertEqual(record['m_med'], 3000)
+
+
+class TestRunCommand(TmpDirTestCase):
+
+    def test_run_command(self):
+        svjgenprod.utils.run_command([ 'touch', 'out.txt' ], cwd=self.tmpdir)
+        self.assertTrue(osp.isfile(osp.join(self.tmpdir, 'out.txt')))
+
+    def test_run_command_shell(self):
+        out_file = osp.join(self.tmpdir, 'out.txt')
+        svjgenprod.utils.run_command([ 'echo', 'hello', '>', out_file ], shell=True)
+        with open(out_file) as f:
+            self.assertEqual(f.read(), 'hello\n')
+
+    def test_run_command_dry(self):
+        svjgenprod.utils.run_command([ 'touch', 'out.txt' ], cwd=self.tmpdir, dry=True)
+        self.assertFalse(osp.exists(osp.join(self.tmpdir, 'out.txt')))
+
+    def test_run_command_fails(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            svjgenprod.utils.run_command([ 'false' ])
+
+    def test_run_multiple_commands(self):
+        out_file = osp.join(self.tmpdir, 'out.txt')
+        svjgenprod.utils.run_multiple_commands([
+            'cd {0}'.format(self.tmpdir),
+            'export SVJ_TEST=hello',
+            [ 'echo', '$SVJ_TEST', '>', 'out.txt' ],
+            ])
+        with open(out_file) as f:
+            self.assertEqual(f.read(), 'hello\n')
+
+    def test_run_multiple_commands_stops_on_error(self):
+        out_file = osp.join(self.tmpdir, 'out.txt')
+        with self.assertRaises(subprocess.CalledProcessError):
+            svjgenprod.utils.run_multiple_commands([ 'false', 'touch {0}'.format(out_file) ])
+        self.assertFalse(osp.exists(out_file))
+
+
+class TestCMSSWEnvironment(TmpDirTestCase):
+    """
+    Replaces the `scramv1 runtime` call by a function that adds a directory
+    to PATH, sets SVJ_TEST_SET and unsets SVJ_TEST_UNSET
+    """
+
+    def setUp(self):
+        super(TestCMSSWEnvironment, self).setUp()
+        self.cmssw_src = osp.join(self.tmpdir, 'CMSSW_10_6_0', 'src')
+        os.makedirs(self.cmssw_src)
+        self.captured = []
+        self.environ = os.environ.copy()
+        self.capture = svjgenprod.utils._capture_cmssw_environment
+        svjgenprod.utils._capture_cmssw_environment = self.fake_capture
+        os.environ['SVJ_TEST_UNSET'] = '1'
+
+    def tearDown(self):
+        svjgenprod.utils._capture_cmssw_environment = self.capture
+        svjgenprod.utils._CMSSW_ENV_CACHE.clear()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        super(TestCMSSWEnvironment, self).tearDown()
+
+    def fake_capture(self, cmssw_src, arch=None):
+        self.captured.append(cmssw_src)
+        env = os.environ.copy()
+        env['PATH'] = '/cmssw/bin:' + env['PATH']
+        env['SVJ_TEST_SET'] = '1'
+        del env['SVJ_TEST_UNSET']
+        return env
+
+    def test_set_and_unset(self):
+        env = svjgenprod.utils.get_cmssw_environment(self.cmssw_src)
+        self.assertEqual(env['PATH'], '/cmssw/bin:' + os.environ['PATH'])
+        self.assertEqual(env['SVJ_TEST_SET'], '1')
+        self.assertFalse('SVJ_TEST_UNSET' in env)
+        self.assertEqual(svjgenprod.utils.get_cmssw_environment(self.cmssw_src), env)
+        self.assertEqual(len(self.captured), 1)
+
+    def test_cache_file(self):
+        env = svjgenprod.utils.get_cmssw_environment(self.cmssw_src)
+        svjgenprod.utils._CMSSW_ENV_CACHE.clear()
+        self.assertEqual(svjgenprod.utils.get_cmssw_environment(self.cmssw_src), env)
+        self.assertEqual(len(self.captured), 1)
+
+    def test_changed_base_environment(self):
+        svjgenprod.utils.get_cmssw_environment(self.cmssw_src)
+        os.environ['PATH'] = '/other/bin:' + os.environ['PATH']
+        for clear_memory_cache in [ False, True ]:
+            if clear_memory_cache: svjgenprod.utils._CMSSW_ENV_CACHE.clear()
+            env = svjgenprod.utils.get_cmssw_environment(self.cmssw_src)
+            self.assertEqual(env['PATH'], '/cmssw/bin:' + os.environ['PATH'])
+        self.assertEqual(len(self.captured), 2)
+        # A variable that scram unsets, set again in the base environment
+        os.environ['SVJ_TEST_UNSET'] = '2'
+        self.assertFalse('SVJ_TEST_UNSET' in svjgenprod.utils.get_cmssw_environment(self.cmssw_src))
+        self.assertEqual(len(self.captured), 3)
+
+
+class TestJDLFile(TmpDirTestCase):
+
+    def setUp(self):
+        super(TestJDLFile, self).setUp()
+        os.environ.setdefault('USER', 'svjtest')
+
+    def parse(self, jdl):
+        """
+        Returns the options and the queue line of a parsed jdl file
+        """
+        lines = jdl.split('\n')
+        options = dict(line.split(' = ', 1) for line in lines[:-1])
+        return options, lines[-1]
+
+    def test_parse(self):
+        jdl = svjgenprod.condor.jdlfile.JDLStandard(
+            'run.sh', osp.join(self.tmpdir, 'job.py'), 3, 100,
+            infiles='local.lhe, root://cmseos.fnal.gov//store/user/a/remote.lhe'
+            )
+        options, queue = self.parse(jdl.parse())
+        self.assertEqual(options['universe'], 'vanilla')
+        self.assertEqual(options['executable'], 'run.sh')
+        self.assertEqual(options['output'], 'job_$(Cluster)_$(Process).stdout')
+        self.assertEqual(
+            options['transfer_input_files'].split(','),
+            [ osp.join(self.tmpdir, 'job.py'), osp.abspath('local.lhe') ]
+            )
+        self.assertTrue('SVJ_NEVENTS=\'100\'' in options['environment'])
+        self.assertTrue(
+            'SVJ_INFILES=\'local.lhe,root://cmseos.fnal.gov//store/user/a/remote.lhe\''
+            in options['environment']
+            )
+        self.assertEqual(queue, 'queue 1 arguments in 1001, 1002, 1003')
+
+    def test_seeds(self):
+        jdl = svjgenprod.condor.jdlfile.JDLStandard('run.sh', 'job.py', 2, 100)
+        jdl.seeds = [ 7, 13 ]
+        options, queue = self.parse(jdl.parse())
+        self.assertEqual(queue, 'queue 1 arguments in 7, 13')
+        jdl.seeds = [ 7 ]
+        with self.assertRaises(ValueError):
+            jdl.parse()
+
+    def test_shard_seeds(self):
+        jdl = svjgenprod.condor.jdlfile.JDLStandard('run.sh', 'job.py', 2, 100)
+        jdl.seeds = [ 7, 13 ]
+        jdl.shard_seeds = [ [ 1, 2 ], [ 3, 4 ] ]
+        self.assertTrue(jdl.parse().endswith('queue arguments from (\n7 1,2\n13 3,4\n)'))
+        jdl.shard_seeds = [ [ 1, 2 ] ]
+        with self.assertRaises(ValueError):
+            jdl.parse()
+
+    def test_to_file(self):
+        jdl = svjgenprod.condor.jdlfile.JDLStandard('run.sh', 'job.py', 1, 100)
+        jdl_file = osp.join(self.tmpdir, 'submit.jdl')
+        jdl.to_file(jdl_file)
+        with open(jdl_file) as f:
+            self.assertEqual(f.read(), jdl.parse())
+
+
+class LHEMakerTestCase(TmpDirTestCase):
+
+    def get_lhemaker(self):
+        config = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 'peak').to_config()
+        return svjgenprod.LHEMaker(config, osp.join(self.tmpdir, TARBALL), 10)
+
+
+class TestReplacePids(LHEMakerTestCase):
+
+    def test_replace_pids(self):
+        lhe_file = self.write('events.lhe', LHE, 'wb')
+        lhemaker = self.get_lhemaker()
+        self.assertEqual(lhemaker.process_type, 's-channel')
+        out_file = lhemaker.replace_pids(lhe_file)
+        self.assertEqual(out_file, lhe_file)
+        self.assertFalse(osp.exists(lhe_file + '.tmp'))
+        with open(out_file, 'rb') as f:
+            self.assertEqual(f.read(), LHE.replace(b'5000521', b'4900101'))
+
+    def test_replace_pids_compressed(self):
+        lhe_file = self.write('events.lhe', LHE, 'wb')
+        lhemaker = self.get_lhemaker()
+        lhemaker.lhe_compression = 'gzip'
+        out_file = lhemaker.replace_pids(lhe_file)
+        self.assertEqual(out_file, lhe_file + '.gz')
+        self.assertFalse(osp.exists(lhe_file))
+        f = gzip.open(out_file, 'rb')
+        try:
+            self.assertEqual(f.read(), LHE.replace(b'5000521', b'4900101'))
+        finally:
+            f.close()
+
+
+class TestExtractTarball(LHEMakerTestCase):
+
+    def test_extract_checks_index_of_given_tarball(self):
+        lhemaker = self.get_lhemaker()
+        copied_tarball = osp.join(self.tmpdir, 'copy', TARBALL)
+        os.makedirs(osp.dirname(copied_tarball))
+        self.write(osp.join('copy', TARBALL), '')
+        self.write(osp.join('copy', TARBALL + '.index'), 'mgbasedir/\nprocess/\n')
+        with self.assertRaises(RuntimeError):
+            lhemaker.extract_tarball(copied_tarball, dst=osp.join(self.tmpdir, 'extracted'))
+
+    def test_copy_tarball_copies_index(self):
+        self.write(TARBALL, '')
+        self.write(TARBALL + '.index', 'runcmsgrid.sh\n')
+        copied_tarball = osp.join(self.tmpdir, 'copy', TARBALL)
+        self.get_lhemaker().copy_tarball(copied_tarball)
+        self.assertEqual(svjgenprod.compression.read_tarball_index(copied_tarball), [ 'runcmsgrid.sh' ])
+
+
+if __name__ == '__main__':
+    unittest.main()
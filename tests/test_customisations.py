@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Runs saved cmsDriver cfgs with the customisation block of the runners appended,
+against the minimal FWCore stand-in in tests/fakecmssw, and checks the
+resulting paths, sequences and seeds
+"""
+from __future__ import print_function
+
+import os.path as osp
+import sys, shutil, tempfile, unittest
+
+import svjgenprod
+from svjgenprod import fullsimrunners
+
+TESTS_DIR = osp.dirname(osp.abspath(__file__))
+FIXTURES_DIR = osp.join(TESTS_DIR, 'fixtures')
+
+
+def setUpModule():
+    sys.path.insert(0, osp.join(TESTS_DIR, 'fakecmssw'))
+
+def tearDownModule():
+    sys.path.remove(osp.join(TESTS_DIR, 'fakecmssw'))
+
+
+def make_runner(Runner, year=2017):
+    config = svjgenprod.SampleSpec('s-channel', year, 3000, 20, 2, 0.3, 'peak').to_config()
+    return Runner(config, '/tmp/svj/in.root', 10)
+
+
+def run_cfg(fixture, *blocks):
+    """
+    Executes the fixture cfg with the blocks appended and returns the process
+    """
+    cfg_file = osp.join(FIXTURES_DIR, fixture)
+    with open(cfg_file, 'r') as f:
+        source = f.read()
+    source += ''.join(blocks)
+    namespace = { '__name__' : '__cfg__' }
+    exec(compile(source, cfg_file, 'exec'), namespace)
+    return namespace['process']
+
+
+def labels(modules):
+    return [ m.label() for m in modules ]
+
+
+def seeds(process):
+    service = process.RandomNumberGeneratorService
+    return dict(
+        (name, pset.initialSeed) for name, pset in vars(service).items()
+        if hasattr(pset, 'initialSeed')
+        )
+
+
+class TestGenSimCustomisations(unittest.TestCase):
+
+    def check_gensim(self, Runner, year):
+        runner = make_runner(Runner, year)
+        runner.seed = 4321
+        process = run_cfg('gensim_{0}_cfg.py'.format(year), runner.apply_customisations(dry=True))
+
+        # Filters run right after the generator, in every path
+        self.assertEqual(sorted(process.paths.keys()), [ 'generation_step', 'simulation_step' ])
+        for name, path in process.paths.items():
+            modules = labels(path.modules())
+            self.assertEqual(modules[:3], [ 'generator', 'darkhadronZ2filter', 'darkquarkFilter' ], name)
+            self.assertEqual(modules.count('generator'), 1, name)
+        for name, path in process.endpaths.items():
+            self.assertFalse('generator' in labels(path.modules()), name)
+
+        self.assertEqual(process.options.SkipEvent, [ 'ProductNotFound' ])
+        self.assertEqual(set(seeds(process).values()), set([ 4321 ]))
+
+        # Dark hadrons out of the gen jets and MET
+        for name in [ 'genParticlesForJetsNoMuNoNu', 'genParticlesForJetsNoNu', 'genCandidatesForMET', 'genParticlesForMETAllVisible' ]:
+            self.assertTrue(set([51, 52, 53]).issubset(getattr(process, name).ignoreParticleIDs), name)
+        self.assertTrue(process.recoGenJets.contains(process.recoAllGenJetsNoNu))
+        self.assertTrue(process.genJetParticles.contains(process.genParticlesForJetsNoNu))
+        for command in [ 'keep *_genParticlesForJets_*_*', 'keep *_genParticlesForJetsNoNu_*_*' ]:
+            self.assertTrue(command in process.RAWSIMoutput.outputCommands)
+        self.assertEqual(process.maxEvents.input, 10)
+
+    def test_gensim_2017(self):
+        self.check_gensim(fullsimrunners.FullSimRunnerGenSim2017, 2017)
+
+    def test_gensim_2018(self):
+        self.check_gensim(fullsimrunners.FullSimRunnerGenSim2018, 2018)
+
+    def test_block_is_appended(self):
+        runner = make_runner(fullsimrunners.FullSimRunnerGenSim2017)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            runner.cfg_file = osp.join(tmpdir, 'cfg.py')
+            fixture = osp.join(FIXTURES_DIR, 'gensim_2017_cfg.py')
+            shutil.copyfile(fixture, runner.cfg_file)
+            block = runner.apply_customisations()
+            with open(fixture) as f, open(runner.cfg_file) as g:
+                self.assertEqual(g.read(), f.read() + block)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestAODCustomisations(unittest.TestCase):
+
+    def test_aod(self):
+        runner = make_runner(fullsimrunners.FullSimRunnerAOD2017)
+        process = run_cfg('aod_2017_cfg.py', runner.apply_customisations(dry=True))
+        self.assertEqual(set(seeds(process).values()), set([ runner.seed ]))
+        self.assertEqual(len(process.mixData.input.fileNames), 2)
+        self.assertEqual(labels(process.datamixing_step.modules()), [ 'mixData' ])
+
+    def test_shard(self):
+        runner = make_runner(fullsimrunners.FullSimRunnerAOD2017)
+        process = run_cfg(
+            'aod_2017_cfg.py',
+            runner.apply_customisations(dry=True),
+            svjgenprod.fullsimbase.get_customisation_block([
+                runner.get_shard_customisation(5, 3, 4242, '/tmp/svj/out_shard1.root')
+                ])
+            )
+        self.assertEqual(process.source.skipEvents, 5)
+        self.assertEqual(process.maxEvents.input, 3)
+        self.assertEqual(process.PREMIXRAWoutput.fileName, 'file:/tmp/svj/out_shard1.root')
+        self.assertEqual(set(seeds(process).values()), set([ 4242 ]))
+
+
+class TestNanoAODCustomisations(unittest.TestCase):
+
+    def test_nanoaod(self):
+        runner = make_runner(fullsimrunners.FullSimRunnerNanoAOD2017)
+        process = run_cfg('nanoaod_2017_cfg.py', runner.apply_customisations(dry=True))
+        # The new sequences replace the old ones everywhere they are used
+        modules = labels(process.nanoAOD_step.modules())
+        self.assertEqual(modules, labels(process.nanoSequenceMC.modules()))
+        self.assertFalse('rivetProducerHTXS' in modules)
+        self.assertFalse('HTXSCategoryTable' in modules)
+        for name in [ 'mergedGenParticles', 'particleLevel', 'tautagger', 'rivetLeptonTable', 'rivetMetTable', 'jetTable' ]:
+            self.assertTrue(name in modules, name)
+        self.assertEqual(set(seeds(process).values()), set([ runner.seed ]))
+
+
+if __name__ == '__main__':
+    unittest.main()
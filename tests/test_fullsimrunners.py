@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import os, shutil, tempfile, gzip, unittest
+
+import svjgenprod
+from svjgenprod import fullsimrunners
+
+
+def make_runner(Runner, in_file='/tmp/svj/in.root'):
+    config = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 'peak').to_config()
+    return Runner(config, in_file, 10)
+
+
+class TestFullSimRunners(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_n_threads(self):
+        runner = make_runner(fullsimrunners.FullSimRunnerAOD2017)
+        self.assertFalse('--nThreads' in ' '.join(runner.get_threaded_cmsdriver_cmd()))
+        runner.n_cores = 4
+        self.assertEqual(runner.get_threaded_cmsdriver_cmd()[-1], '--nThreads 4')
+        self.assertEqual(runner.get_threaded_cmsdriver_cmd()[:-1], runner.get_cmsdriver_cmd())
+        runner.n_shards = 2
+        self.assertEqual(runner.get_threaded_cmsdriver_cmd()[-1], '--nThreads 2')
+        runner.n_shards = 8
+        self.assertEqual(runner.get_threaded_cmsdriver_cmd(), runner.get_cmsdriver_cmd())
+
+    def test_decompress_in_shared_workdir(self):
+        in_file = osp.join(self.tmpdir, 'events.lhe.gz')
+        f = gzip.open(in_file, 'wb')
+        try:
+            f.write(b'<LesHouchesEvents>\n</LesHouchesEvents>\n')
+        finally:
+            f.close()
+        for i in range(2):
+            # Both runners use the same workdir, as with unique_workdirs=False
+            runner = make_runner(fullsimrunners.FullSimRunnerGenSim2017, in_file)
+            runner.workdir = osp.join(self.tmpdir, 'workdir')
+            runner.decompress_in_file()
+            self.assertEqual(runner.in_file, osp.join(runner.workdir, 'events.lhe'))
+            with open(runner.in_file, 'rb') as f:
+                self.assertEqual(f.read(), b'<LesHouchesEvents>\n</LesHouchesEvents>\n')
+        self.assertEqual(
+            sorted(os.listdir(runner.workdir)),
+            sorted([ 'events.lhe', osp.basename(runner.get_lock_file()) ])
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
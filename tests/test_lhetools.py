@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import gzip, shutil, tempfile, unittest
+
+import svjgenprod
+from svjgenprod import lhetools
+
+
+LHE_HEADER = '''<LesHouchesEvents version="3.0">
+<header>
+<MGVersion>2.6.5</MGVersion>
+</header>
+<init>
+2212 2212 6.500000e+03 6.500000e+03 0 0 247000 247000 -4 1
+1.2500000e+00 5.0000000e-02 2.0000000e+00 1
+</init>
+'''
+
+LHE_FOOTER = '</LesHouchesEvents>\n'
+
+PARTICLE_LINE = ' {pid:8d} {status:2d} 0 0 0 0 +0.0000000000e+00 +0.0000000000e+00 +1.0000000000e+02 {mass:.10e} {mass:.10e} 0.0000e+00 9.0000e+00\n'
+
+
+def make_event(weight, particles, extra=''):
+    """
+    particles is a list of (pid, mass) tuples
+    """
+    lines = [ '<event>\n', ' {0:2d} 1 {1:+.7e} 1.0e+03 7.5e-03 1.0e-01\n'.format(len(particles), weight) ]
+    for pid, mass in particles:
+        lines.append(PARTICLE_LINE.format(pid=pid, status=1, mass=mass))
+    lines.append(extra)
+    lines.append('</event>\n')
+    return ''.join(lines)
+
+
+# Event 1: mediator of 3000 GeV and two dark quarks
+# Event 2: mediator of 2990 GeV, a reweighting block, and four dark quarks
+# Event 3: no mediator and no dark quarks
+# The mean weight equals XSECUP, as for 'average' event normalization
+EVENTS = [
+    make_event(1.0, [ (21, 0.), (21, 0.), (4900023, 3000.), (4900101, 20.), (-4900101, 20.) ]),
+    make_event(
+        1.5,
+        [ (2, 0.), (-2, 0.), (4900023, 2990.), (4900101, 20.), (-4900101, 20.), (4900101, 20.), (-4900101, 20.) ],
+        extra='<mgrwt>\n<rscale> 0 0.1E+04</rscale>\n</mgrwt>\n'
+        ),
+    make_event(1.25, [ (21, 0.), (21, 0.), (1, 0.), (-1, 0.) ]),
+    ]
+
+
+def write_lhe(lhe_file, events=EVENTS):
+    with svjgenprod.compression.open_file(lhe_file, 'wb') as f:
+        f.write((LHE_HEADER + ''.join(events) + LHE_FOOTER).encode())
+    return lhe_file
+
+
+class LHETestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_events(self, lhe_file):
+        with svjgenprod.compression.open_file(lhe_file, 'rb') as f:
+            contents = f.read()
+        return contents[contents.find(b'<event'):contents.rfind(b'</event>\n')+len(b'</event>\n')]
+
+
+class TestMergeSplit(LHETestCase):
+
+    def test_split_merge_round_trip(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        chunks = lhetools.split_lhe(lhe_file, 2)
+        self.assertEqual(chunks, [ osp.join(self.tmpdir, 'events_chunk{0}.lhe'.format(i)) for i in range(2) ])
+        self.assertEqual([ lhetools.scan_lhe(c).n_events for c in chunks ], [ 2, 1 ])
+        self.assertEqual(b''.join(self.read_events(c) for c in chunks), ''.join(EVENTS).encode())
+
+        merged = lhetools.merge_lhe(chunks, osp.join(self.tmpdir, 'merged.lhe'))
+        original_scan = lhetools.scan_lhe(lhe_file)
+        merged_scan = lhetools.scan_lhe(merged)
+        self.assertEqual(merged_scan.n_events, 3)
+        self.assertEqual(merged_scan.header, original_scan.header)
+        self.assertEqual(self.read_events(merged), ''.join(EVENTS).encode())
+        for merged_process, original_process in zip(merged_scan.init.processes, original_scan.init.processes):
+            for merged_value, original_value in zip(merged_process, original_process):
+                self.assertAlmostEqual(merged_value, original_value)
+
+    def test_split_wrong_number_of_out_files(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        with self.assertRaises(ValueError):
+            lhetools.split_lhe(lhe_file, 2, out_files=[ osp.join(self.tmpdir, 'chunk.lhe') ])
+
+
+class TestValidateLHE(LHETestCase):
+
+    def write_truncated(self, lhe_file, n_bytes):
+        contents = (LHE_HEADER + ''.join(EVENTS) + LHE_FOOTER).encode()
+        with svjgenprod.compression.open_file(lhe_file, 'wb') as f:
+            f.write(contents[:n_bytes])
+        return lhe_file
+
+    def test_valid(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        self.assertEqual(lhetools.validate_lhe(lhe_file), 3)
+        self.assertEqual(lhetools.validate_lhe(lhe_file, 3), 3)
+        self.assertEqual(lhetools.count_lhe_events(lhe_file), (3, 3, True))
+        # Tags spanning two blocks of a compressed file are counted once
+        gz_file = write_lhe(osp.join(self.tmpdir, 'events.lhe.gz'))
+        for blocksize in [ 1, 7, 64 ]:
+            self.assertEqual(lhetools.count_lhe_events(gz_file, blocksize), (3, 3, True))
+
+    def test_wrong_event_count(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        with self.assertRaises(RuntimeError):
+            lhetools.validate_lhe(lhe_file, 4)
+
+    def test_truncated(self):
+        n_bytes = len(LHE_HEADER) + len(EVENTS[0]) + 30
+        for basename in [ 'events.lhe', 'events.lhe.gz' ]:
+            lhe_file = self.write_truncated(osp.join(self.tmpdir, basename), n_bytes)
+            self.assertEqual(lhetools.count_lhe_events(lhe_file), (2, 1, False))
+            with self.assertRaises(RuntimeError):
+                lhetools.validate_lhe(lhe_file)
+        # Only the closing tag missing
+        lhe_file = self.write_truncated(osp.join(self.tmpdir, 'events.lhe'), -len(LHE_FOOTER))
+        with self.assertRaises(RuntimeError):
+            lhetools.validate_lhe(lhe_file, 3)
+
+    def test_missing_and_empty(self):
+        with self.assertRaises(RuntimeError):
+            lhetools.validate_lhe(osp.join(self.tmpdir, 'missing.lhe'))
+        lhe_file = self.write_truncated(osp.join(self.tmpdir, 'empty.lhe'), 0)
+        with self.assertRaises(RuntimeError):
+            lhetools.validate_lhe(lhe_file)
+
+
+class TestCompressedLHE(LHETestCase):
+
+    def check_same_events(self, lhe_file, compressed_file):
+        scan = lhetools.scan_lhe(lhe_file)
+        compressed_scan = lhetools.scan_lhe(compressed_file)
+        self.assertEqual(compressed_scan.offsets, scan.offsets)
+        self.assertEqual(compressed_scan.weights, scan.weights)
+        self.assertEqual(self.read_events(compressed_file), self.read_events(lhe_file))
+
+    def test_pipefile_gzip(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        gz_file = osp.join(self.tmpdir, 'events_pipe.lhe.gz')
+        with svjgenprod.compression.PipeFile([ 'gzip', '-c' ], gz_file, 'wb') as out:
+            with open(lhe_file, 'rb') as f:
+                out.write(f.read())
+        f = gzip.open(gz_file, 'rb')
+        try:
+            contents = f.read()
+        finally:
+            f.close()
+        with open(lhe_file, 'rb') as f:
+            self.assertEqual(contents, f.read())
+        with svjgenprod.compression.PipeFile([ 'gzip', '-d', '-c' ], gz_file) as f:
+            self.assertEqual(list(f), contents.splitlines(True))
+        with svjgenprod.compression.PipeFile([ 'gzip', '-d', '-c' ], gz_file) as f:
+            f.seek(10)
+            self.assertEqual(f.read(5), contents[10:15])
+            with self.assertRaises(IOError):
+                f.seek(0)
+
+    def test_gzip(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        gz_file = write_lhe(osp.join(self.tmpdir, 'events_gz.lhe.gz'))
+        self.check_same_events(lhe_file, gz_file)
+        self.assertEqual(lhetools.validate_lhe(gz_file, 3), 3)
+        chunks = lhetools.split_lhe(gz_file, 2)
+        self.assertEqual(chunks, [ osp.join(self.tmpdir, 'events_gz_chunk{0}.lhe.gz'.format(i)) for i in range(2) ])
+        self.assertEqual(b''.join(self.read_events(c) for c in chunks), self.read_events(lhe_file))
+
+    @unittest.skipIf(svjgenprod.compression.find_executable('zstd') is None, 'needs zstd')
+    def test_zstd(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        zst_file = write_lhe(osp.join(self.tmpdir, 'events_zst.lhe.zst'))
+        self.check_same_events(lhe_file, zst_file)
+        decompressed = svjgenprod.compression.decompress_file(zst_file)
+        with open(decompressed, 'rb') as f1, open(lhe_file, 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+
+@unittest.skipIf(lhetools.np is None, 'needs numpy')
+class TestLHEIndex(LHETestCase):
+
+    def setUp(self):
+        super(TestLHEIndex, self).setUp()
+        self.lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        lhetools.build_index(self.lhe_file)
+
+    def test_offsets_on_event_tags(self):
+        offsets = lhetools.load_index(self.lhe_file)
+        self.assertEqual(len(offsets), len(EVENTS) + 1)
+        with open(self.lhe_file, 'rb') as f:
+            contents = f.read()
+        for offset in offsets[:-1]:
+            self.assertTrue(contents[int(offset):].startswith(b'<event>'))
+        self.assertTrue(contents[int(offsets[-1]):].startswith(b'</LesHouchesEvents>'))
+
+    def test_reader(self):
+        with lhetools.LHEIndexedReader(self.lhe_file) as reader:
+            self.assertEqual(reader.n_events, 3)
+            self.assertEqual(reader.get_events_bytes(1, 3), ''.join(EVENTS[1:]).encode())
+            self.assertEqual(list(reader.iter_events()), [ e.encode() for e in EVENTS ])
+            scan = reader.scan()
+            out_file = reader.write_range(osp.join(self.tmpdir, 'range.lhe'), 1, 2)
+        full_scan = lhetools.scan_lhe(self.lhe_file)
+        self.assertEqual(scan.offsets, full_scan.offsets)
+        self.assertEqual(scan.weights, full_scan.weights)
+        self.assertEqual(scan.header, full_scan.header)
+        self.assertEqual(self.read_events(out_file), EVENTS[1].encode())
+        with lhetools.LHEIndexedReader(self.lhe_file) as reader:
+            with self.assertRaises(IndexError):
+                reader.get_events_bytes(2, 4)
+
+    def test_stale_index(self):
+        write_lhe(self.lhe_file, EVENTS[:1])
+        with self.assertRaises(ValueError):
+            lhetools.LHEIndexedReader(self.lhe_file)
+
+
+@unittest.skipIf(lhetools.np is None, 'needs numpy')
+class TestSummarizeLHE(LHETestCase):
+
+    def check_summary(self, summary):
+        self.assertEqual(summary['n_events'], 3)
+        self.assertAlmostEqual(summary['weight_sum'], 3.75)
+        self.assertAlmostEqual(summary['xsec'], 1.25)
+        self.assertEqual(summary['n_events_with_mediator'], 2)
+        self.assertAlmostEqual(summary['mediator_mass']['mean'], 2995.)
+        self.assertEqual(summary['dark_quark_multiplicity'], [ 1, 0, 1, 0, 1 ])
+
+    def test_summarize(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe'))
+        self.check_summary(lhetools.summarize_lhe(lhe_file))
+        arrays = lhetools.np.load(lhetools.get_summary_files(lhe_file)[1])
+        self.assertEqual(arrays['n_dark_quarks'].tolist(), [ 2, 4, 0 ])
+        self.assertEqual(arrays['mediator_mass'][:2].tolist(), [ 3000., 2990. ])
+        self.assertTrue(lhetools.np.isnan(arrays['mediator_mass'][2]))
+
+    def test_summarize_compressed(self):
+        lhe_file = write_lhe(osp.join(self.tmpdir, 'events.lhe.gz'))
+        self.check_summary(lhetools.summarize_lhe(lhe_file, write=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
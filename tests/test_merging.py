@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import os, shutil, stat, tempfile, unittest
+
+import svjgenprod
+
+
+# Stub tools: a "root file" is a text file with one line per event. Paths of
+# the form root://stub//store/... are mapped to $STUB_SE_DIR/store/...
+STUB_EDMCOPYPICKMERGE = r'''#!/bin/bash
+output=${1#outputFile=}
+inputs=${2#inputFiles=}
+echo "$inputs" >> "$STUB_LOG"
+> "$output"
+for input in ${inputs//,/ }; do
+    input=${input#file:}
+    input=${input/root:\/\/stub\//$STUB_SE_DIR}
+    cat "$input" >> "$output"
+done
+if [ -n "$STUB_DROP_EVENT" ]; then sed -i '$ d' "$output"; fi
+'''
+
+STUB_EDMFILEUTIL = r'''#!/bin/bash
+input=${1/root:\/\/stub\//$STUB_SE_DIR}
+echo "$1 (1 runs, 1 lumis, $(wc -l < "$input") events, 100 bytes)"
+'''
+
+
+class FakeSEManager(object):
+    """
+    Stands in for SEManager; the SE is the local directory se_dir
+    """
+    def __init__(self, se_dir):
+        self.se_dir = se_dir
+        self.removed = []
+
+    def local(self, path):
+        return path.replace('root://stub/', self.se_dir)
+
+    def list_directory(self, directory):
+        local_dir = self.local(directory)
+        return [
+            (directory.rstrip('/') + '/' + f, os.stat(osp.join(local_dir, f)).st_size)
+            for f in os.listdir(local_dir)
+            ]
+
+    def copy_to_se(self, src, dst, create_parent_directory=True):
+        shutil.copyfile(src, self.local(dst))
+
+    def get_size(self, path):
+        return os.stat(self.local(path)).st_size
+
+    def remove(self, path):
+        self.removed.append(path)
+        os.remove(self.local(path))
+
+
+class TestMerging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        bin_dir = osp.join(self.tmpdir, 'bin')
+        os.makedirs(bin_dir)
+        for name, contents in [ ('edmCopyPickMerge', STUB_EDMCOPYPICKMERGE), ('edmFileUtil', STUB_EDMFILEUTIL) ]:
+            path = osp.join(bin_dir, name)
+            with open(path, 'w') as f:
+                f.write(contents)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.se_dir = osp.join(self.tmpdir, 'se')
+        self.log = osp.join(self.tmpdir, 'stub.log')
+        self.env = dict(
+            os.environ,
+            PATH = bin_dir + os.pathsep + os.environ['PATH'],
+            STUB_SE_DIR = self.se_dir,
+            STUB_LOG = self.log,
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_files(self, directory, n_files, n_events=10):
+        os.makedirs(directory)
+        for i in range(n_files):
+            with open(osp.join(directory, 'N{0}_{1:04d}_seed{2}.root'.format(n_events, i, 1001+i)), 'w') as f:
+                f.write(''.join('event {0} {1}\n'.format(i, j) for j in range(n_events)))
+
+    def make_runner(self, directory, target_size=250):
+        runner = svjgenprod.merging.MergeRunner(directory, target_size_gb=target_size/1024.**3)
+        runner.workdir_parent = osp.join(self.tmpdir, 'work')
+        runner.env = self.env
+        return runner
+
+    def read_events(self, directory):
+        events = []
+        for f in os.listdir(directory):
+            with open(osp.join(directory, f)) as f:
+                events.extend(f.readlines())
+        return sorted(events)
+
+    def test_merge_cmd_paths(self):
+        cmd = svjgenprod.merging.get_merge_cmd(
+            [ 'a.root', 'root://cmseos.fnal.gov//store/user/a/x.root', '/store/user/a/y.root' ],
+            'out.root'
+            )
+        self.assertEqual(
+            cmd[2],
+            'inputFiles=file:{0},root://cmseos.fnal.gov//store/user/a/x.root,/store/user/a/y.root'
+            .format(osp.abspath('a.root'))
+            )
+
+    def test_group_files(self):
+        groups = svjgenprod.merging.group_files([ ('a', 100), ('b', 100), ('c', 100), ('d', 500), ('e', 10) ], 250)
+        self.assertEqual([ [ p for p, s in g ] for g in groups ], [ ['a', 'b'], ['c'], ['d'], ['e'] ])
+
+    def test_merge_local(self):
+        directory = osp.join(self.tmpdir, 'out')
+        self.make_files(directory, 5)
+        events = self.read_events(directory)
+        merged = self.make_runner(directory).run()
+        # Files are ~140 bytes: groups of 1+1 files up to 250 bytes, the last one stays
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(sorted(os.listdir(directory)), sorted([ osp.basename(m) for m in merged ] + [ 'N10_0004_seed1005.root' ]))
+        self.assertEqual(self.read_events(directory), events)
+
+    def test_event_count_mismatch_keeps_inputs(self):
+        directory = osp.join(self.tmpdir, 'out')
+        self.make_files(directory, 2)
+        before = sorted(os.listdir(directory))
+        self.env['STUB_DROP_EVENT'] = '1'
+        with self.assertRaises(RuntimeError):
+            self.make_runner(directory, target_size=1000).run()
+        self.assertEqual(sorted(os.listdir(directory)), before)
+
+    def test_merge_remote(self):
+        self.make_files(osp.join(self.se_dir, 'store/user/a/out'), 3)
+        events = self.read_events(osp.join(self.se_dir, 'store/user/a/out'))
+        runner = self.make_runner('root://stub//store/user/a/out', target_size=1000)
+        runner.semanager = FakeSEManager(self.se_dir)
+        merged = runner.run()
+        self.assertEqual(len(merged), 1)
+        self.assertTrue(merged[0].startswith('root://stub//store/user/a/out/merged_'))
+        self.assertEqual(len(runner.semanager.removed), 3)
+        self.assertEqual(self.read_events(osp.join(self.se_dir, 'store/user/a/out')), events)
+        # Remote inputs are passed to the merge tool as urls, without file:
+        with open(self.log) as f:
+            self.assertFalse('file:' in f.read())
+
+    def test_failed_remote_copy_keeps_inputs(self):
+        self.make_files(osp.join(self.se_dir, 'store/user/a/out'), 2)
+        runner = self.make_runner('root://stub//store/user/a/out', target_size=1000)
+        runner.semanager = FakeSEManager(self.se_dir)
+        runner.semanager.get_size = lambda path: 0
+        with self.assertRaises(RuntimeError):
+            runner.run()
+        self.assertEqual(runner.semanager.removed, [])
+
+    def test_merged_names_include_directory(self):
+        runner = self.make_runner('unused')
+        self.assertNotEqual(
+            runner.get_merged_basename([ '/a/N10_seed1.root', '/a/N10_seed2.root' ]),
+            runner.get_merged_basename([ '/b/N10_seed1.root', '/b/N10_seed2.root' ])
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import os, shutil, tempfile, time, unittest
+
+import svjgenprod
+from svjgenprod.pileup import PileupCache
+
+
+class TestPileupCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Room for two of the 1 kB files
+        self.cache = PileupCache(self.tmpdir, max_size_gb=2.5*1024/1024.**3, verify_checksum=False)
+
+    def tearDown(self):
+        self.cache.unpin_all()
+        shutil.rmtree(self.tmpdir)
+
+    def add(self, lfn, age):
+        path = self.cache.get_path(lfn)
+        svjgenprod.utils.create_directory(osp.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'x' * 1024)
+        t = time.time() - age
+        os.utime(path, (t, t))
+        return path
+
+    def test_evict_lru(self):
+        oldest = self.add('/store/pu/a.root', 30)
+        self.add('/store/pu/b.root', 20)
+        self.add('/store/pu/c.root', 10)
+        self.cache.evict()
+        self.assertFalse(osp.exists(oldest))
+        self.assertEqual(len(self.cache._cached_files()), 2)
+
+    def test_pinned_files_are_not_evicted(self):
+        for i, lfn in enumerate([ '/store/pu/a.root', '/store/pu/b.root', '/store/pu/c.root' ]):
+            self.add(lfn, 30 - 10*i)
+        entries, misses = self.cache.rewrite_filelist([ '/store/pu/a.root', '/store/pu/d.root' ])
+        self.assertEqual(entries, [ 'file:' + self.cache.get_path('/store/pu/a.root'), '/store/pu/d.root' ])
+        self.assertEqual(misses, [ '/store/pu/d.root' ])
+        # a was just used; make it the oldest again, so only the pin protects it
+        os.utime(self.cache.get_path('/store/pu/a.root'), (0, 0))
+        self.cache.evict()
+        self.assertTrue(osp.exists(self.cache.get_path('/store/pu/a.root')))
+        self.assertFalse(osp.exists(self.cache.get_path('/store/pu/b.root')))
+        self.cache.unpin_all()
+        self.add('/store/pu/d.root', 0)
+        self.cache.evict()
+        self.assertFalse(osp.exists(self.cache.get_path('/store/pu/a.root')))
+
+    def test_pinned_by_other_cache(self):
+        path = self.add('/store/pu/a.root', 30)
+        self.add('/store/pu/b.root', 20)
+        self.add('/store/pu/c.root', 10)
+        other = PileupCache(self.tmpdir, verify_checksum=False)
+        self.assertEqual(other.pin('/store/pu/a.root'), path)
+        try:
+            self.cache.evict()
+            self.assertTrue(osp.exists(path))
+        finally:
+            other.unpin_all()
+
+    def test_fetch_locks_are_bounded(self):
+        lock_files = set(self.cache.get_fetch_lock_file('/store/pu/{0}.root'.format(i)) for i in range(1000))
+        self.assertEqual(len(lock_files), PileupCache.n_fetch_locks)
+        for lock_file in lock_files:
+            self.assertEqual(osp.dirname(lock_file), osp.join(self.tmpdir, PileupCache.fetch_lock_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os.path as osp
+import shutil, tempfile, unittest
+
+import svjgenprod
+from svjgenprod import seeds
+
+
+class TestSeeds(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_file = osp.join(self.tmpdir, 'seeds.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_allocate_seeds(self):
+        first = seeds.allocate_seeds('sample', 'GEN_SIM', 3, db_file=self.db_file)
+        second = seeds.allocate_seeds('sample', 'GEN_SIM', 3, n_shards=2, db_file=self.db_file)
+        self.assertEqual([ len(s) for s in first ], [ 1, 1, 1 ])
+        self.assertEqual([ len(s) for s in second ], [ 2, 2, 2 ])
+        all_seeds = sum(first + second, [])
+        self.assertEqual(len(set(all_seeds)), 9)
+        records = seeds.get_seeds('sample', 'GEN_SIM', db_file=self.db_file)
+        self.assertEqual(sorted(r['seed'] for r in records), sorted(all_seeds))
+        self.assertEqual(sorted(set(r['submission'] for r in records)), [ 0, 1 ])
+
+    def test_shard_seeds_in_ledger(self):
+        config = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 'peak').to_config()
+        runner = svjgenprod.fullsimrunners.FullSimRunnerAOD2017(config, '/tmp/svj/in.root', 10)
+        runner.seed_key = 'sample'
+        ledger = svjgenprod.SVJ_SEED_LEDGER
+        svjgenprod.SVJ_SEED_LEDGER = self.db_file
+        try:
+            shard_seeds = runner.get_shard_seeds(4)
+            self.assertEqual(len(shard_seeds), 4)
+            self.assertEqual(len(runner.get_shard_seeds(1)), 1)
+        finally:
+            svjgenprod.SVJ_SEED_LEDGER = ledger
+        records = seeds.get_seeds('sample', db_file=self.db_file)
+        self.assertEqual([ r['stage'] for r in records ], [ 'AOD_step1' ] * 5)
+        self.assertEqual([ r['shard'] for r in records[:4] ], [ 0, 1, 2, 3 ])
+        self.assertEqual([ r['seed'] for r in records[:4] ], shard_seeds)
+
+    def test_shard_seeds_without_n_f(self):
+        config = svjgenprod.Config(process_type='s-channel', year=2017, m_med=3000, m_d=20, r_inv=0.3, alpha_d='peak')
+        runner = svjgenprod.fullsimrunners.FullSimRunnerAOD2017(config, '/tmp/svj/in.root', 10)
+        runner.n_shards = 2
+        ledger = svjgenprod.SVJ_SEED_LEDGER
+        svjgenprod.SVJ_SEED_LEDGER = self.db_file
+        try:
+            shard_seeds = runner.get_shard_seeds(2)
+        finally:
+            svjgenprod.SVJ_SEED_LEDGER = ledger
+        records = seeds.get_seeds(config.to_spec().digest(), db_file=self.db_file)
+        self.assertEqual([ r['seed'] for r in records ], shard_seeds)
+
+    def test_batch_jobs_get_distinct_shard_seeds(self):
+        # Two batch jobs, each with its own fresh ledger on the worker node
+        config = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 'peak').to_config()
+        ledger = svjgenprod.SVJ_SEED_LEDGER
+        batch_mode = svjgenprod.BATCH_MODE
+        svjgenprod.BATCH_MODE = True
+        shard_seeds = []
+        try:
+            for job_seed in [ 11, 12 ]:
+                svjgenprod.SVJ_SEED_LEDGER = osp.join(self.tmpdir, 'node{0}.sqlite'.format(job_seed))
+                runner = svjgenprod.fullsimrunners.FullSimRunnerAOD2017(config, '/tmp/svj/in.root', 10)
+                runner.seed = job_seed
+                shard_seeds.append(runner.get_shard_seeds(4))
+                self.assertEqual(runner.get_shard_seeds(4), shard_seeds[-1])
+        finally:
+            svjgenprod.SVJ_SEED_LEDGER = ledger
+            svjgenprod.BATCH_MODE = batch_mode
+        self.assertEqual(len(set(sum(shard_seeds, []))), 8)
+
+    def test_submitted_shard_seeds(self):
+        # As svjgenprod-batch --nshards does at submission
+        job_seeds = seeds.allocate_seeds('sample', 'AOD_step1', 2, n_shards=3, db_file=self.db_file)
+        config = svjgenprod.SampleSpec('s-channel', 2017, 3000, 20, 2, 0.3, 'peak').to_config()
+        for shard_seeds in job_seeds:
+            runner = svjgenprod.fullsimrunners.FullSimRunnerAOD2017(config, '/tmp/svj/in.root', 10)
+            runner.shard_seeds = shard_seeds
+            self.assertEqual(runner.get_shard_seeds(3), shard_seeds)
+            with self.assertRaises(ValueError):
+                runner.get_shard_seeds(4)
+
+
+if __name__ == '__main__':
+    unittest.main()